@@ -0,0 +1,121 @@
+"""
+Admission control for chat turns - bounds how many agent turns run at once
+"""
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn cannot be admitted (server busy or user over limit)."""
+
+    def __init__(self, reason: str, retry_after: float = 1.0) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Global + per-user concurrency limiter with a bounded wait queue.
+
+    - At most `max_concurrent` turns run at once across the process.
+    - At most `max_per_user` turns (running or queued) per user.
+    - At most `max_queue` turns wait for a free slot; anything beyond is rejected immediately.
+    - A queued turn waits at most `queue_timeout` seconds before being rejected.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_per_user: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.max_concurrent = max_concurrent if max_concurrent is not None else int(os.getenv("MAX_CONCURRENT_TURNS", 8))
+        self.max_per_user = max_per_user if max_per_user is not None else int(os.getenv("MAX_TURNS_PER_USER", 2))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("MAX_QUEUED_TURNS", 16))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("TURN_QUEUE_TIMEOUT", 10))
+        self._active = 0
+        self._waiting = 0
+        self._per_user: Dict[str, int] = {}
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the condition binds to the running event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "users": len(self._per_user),
+        }
+
+    async def acquire(self, user_key: str) -> None:
+        """Reserve a turn slot for `user_key` or raise AdmissionRejected."""
+        cond = self._condition()
+        async with cond:
+            # Checked under the lock: taking it can yield, and the count is only updated here
+            if self._per_user.get(user_key, 0) >= self.max_per_user:
+                raise AdmissionRejected("Too many requests in progress for this user", retry_after=2.0)
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    raise AdmissionRejected("Assistant is busy, please retry shortly")
+                self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self._active < self.max_concurrent),
+                        timeout=self.queue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._release_user(user_key)
+                    raise AdmissionRejected("Assistant is busy, please retry shortly")
+                except BaseException:
+                    self._release_user(user_key)
+                    raise
+                finally:
+                    self._waiting -= 1
+            else:
+                self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            self._active += 1
+
+    async def release(self, user_key: str) -> None:
+        cond = self._condition()
+        async with cond:
+            self._active -= 1
+            self._release_user(user_key)
+            cond.notify()
+
+    def _release_user(self, user_key: str) -> None:
+        count = self._per_user.get(user_key, 0) - 1
+        if count > 0:
+            self._per_user[user_key] = count
+        else:
+            self._per_user.pop(user_key, None)
+
+    @asynccontextmanager
+    async def admit(self, user_key: str):
+        """
+        Usage:
+            async with admission.admit(user_key):
+                ...
+        """
+        await self.acquire(user_key)
+        try:
+            yield
+        finally:
+            await self.release(user_key)
+
+
+# Per-request wall-clock budget for a whole agent turn (seconds)
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", 120))
+
+# Shared by the HTTP and Socket.IO entry points so both count against the same limits
+admission = AdmissionController()
@@ -0,0 +1,154 @@
+"""
+Agent worker pool - runs queued chat turns (TURN_EXECUTION=queue) outside the socket process
+
+Usage:
+    python agent_worker.py --processes 2 --concurrency 4
+
+Each process warms up its own assistant (Redis, MCP session, provider SDK) and runs
+`--concurrency` consumers on the agent:turns stream. Results are published to the turn's
+event stream, which the Socket.IO / HTTP tier relays to the caller.
+
+Status and tool progress events are published as they happen. The answer text is not
+streamed token by token: TeluguVermiFarmsClient.chat returns the complete answer (its LLM
+calls are not streaming), and only then is it published as chunk events, so queue mode relays
+the final answer at the end of the turn, like the in-process socket and /chat/stream paths.
+"""
+import os
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from runtime import runtime
+from turn_queue import TurnQueue, split_chunks
+from turn_registry import TurnRegistry
+from admission import TURN_DEADLINE_SECONDS
+from turn_deadline import Deadline, ENDPOINT_DEADLINE_SECONDS
+from usage_tracker import BudgetExceeded
+
+# A turn idle longer than this (the longest endpoint budget plus slack) is assumed to belong
+# to a dead worker and is re-delivered
+CLAIM_IDLE_MS = int(os.getenv("TURN_CLAIM_IDLE_MS",
+                              int((max(TURN_DEADLINE_SECONDS, *ENDPOINT_DEADLINE_SECONDS.values()) + 30) * 1000)))
+
+
+async def run_turn(queue: TurnQueue, turn_id: str, payload: dict) -> None:
+    message = payload.get("message", "")
+    conversation_id = payload.get("conversationId") or None
+    assistant = runtime.assistant
+    await queue.publish(turn_id, "status", status="thinking")
+    # The deadline of the endpoint that queued the turn; a redelivered turn whose caller already
+    # gave up gets a fresh budget so that a retry finds it finished
+    deadline = Deadline(payload["deadline"]) if payload.get("deadline") else None
+    if deadline is None or deadline.expired:
+        deadline = Deadline.after(TURN_DEADLINE_SECONDS)
+
+    async def progress(event):
+        # Tool progress goes to the relay like any other turn event
+        await queue.publish(turn_id, event["type"], **{k: v for k, v in event.items() if k != "type"})
+
+    try:
+        history = assistant.get_history(conversation_id)
+        response = await asyncio.wait_for(
+            assistant.chat(history, message, payload.get("userToken", ""), conversation_id=conversation_id, on_event=progress,
+                           user_id=payload.get("userId"), request_id=payload.get("requestId") or turn_id, deadline=deadline),
+            timeout=deadline.remaining(),
+        )
+    except asyncio.TimeoutError:
+        await queue.publish(turn_id, "error", code="timeout", message="The assistant took too long to respond. Please try again.")
+        return
+    except BudgetExceeded as e:
+        await queue.publish(turn_id, "error", code="budget", message=str(e))
+        return
+    if not response:
+        await queue.publish(turn_id, "error", code="empty", message="No response from assistant")
+        return
+    # The whole answer is known only now (see the module docstring); the relay re-batches these
+    for chunk in split_chunks(response):
+        await queue.publish(turn_id, "chunk", chunk=chunk)
+    await queue.publish(turn_id, "complete", fullResponse=response)
+
+
+async def handle_entry(queue: TurnQueue, turns: TurnRegistry, consumer: str, entry, reclaimed: bool = False) -> None:
+    entry_id, turn_id, payload = entry
+    if await queue.is_done(turn_id):
+        # Redelivery of a turn another worker already finished
+        await queue.ack(entry_id)
+        return
+    if reclaimed:
+        # Previous worker died mid-turn; the turn resumes from its last checkpoint (tool loop state keyed by turn id)
+        await queue.publish(turn_id, "status", status="restarted")
+    key = payload.get("conversationId") or f"turn:{turn_id}"
+    task = await turns.start(consumer, key, run_turn(queue, turn_id, payload), turn_id=turn_id)
+    # asyncio.wait (not await) so a cancel of this one turn doesn't look like worker shutdown;
+    # if the worker itself is stopped here the entry stays pending and is reclaimed later
+    await asyncio.wait({task})
+    if task.cancelled():
+        print(f"🛑 Turn {turn_id} cancelled")
+        await queue.publish(turn_id, "error", code="cancelled", message="Turn cancelled")
+    elif task.exception() is not None:
+        print(f"❌ Turn {turn_id} failed: {task.exception()}")
+        await queue.publish(turn_id, "error", code="internal", message="An internal error occurred. Please try again later.")
+    await queue.mark_done(turn_id)
+    await queue.ack(entry_id)
+
+
+async def consume(queue: TurnQueue, turns: TurnRegistry, consumer: str) -> None:
+    while True:
+        try:
+            entries = await queue.reclaim(consumer, CLAIM_IDLE_MS, count=1)
+            reclaimed = bool(entries)
+            if reclaimed:
+                print(f"♻️ {consumer} reclaimed turn {entries[0][1]}")
+            else:
+                entries = await queue.read(consumer, count=1)
+            for entry in entries:
+                await handle_entry(queue, turns, consumer, entry, reclaimed=reclaimed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Consumer {consumer} error: {e}")
+            await asyncio.sleep(1)
+
+
+async def serve(concurrency: int) -> None:
+    queue = TurnQueue()
+    await queue.ensure_group()
+    turns = TurnRegistry(redis_url=os.getenv("TURN_QUEUE_REDIS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0")
+    await turns.start_listener()
+    # History in Redis is shared with the web tier and other workers; never wipe it from here
+    runtime.reset_history = False
+    await runtime.start()
+    # Don't take turns until warmup is done so none of them pays cold-start costs
+    await runtime.wait_ready()
+    base = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"🛠️ Agent worker {base} consuming with concurrency {concurrency}")
+    try:
+        await asyncio.gather(*(consume(queue, turns, f"{base}-{i}") for i in range(concurrency)))
+    finally:
+        await turns.stop_listener()
+        await runtime.stop()
+        await queue.close()
+
+
+def _process_main(concurrency: int) -> None:
+    asyncio.run(serve(concurrency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queued agent turns")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("AGENT_WORKER_PROCESSES", 1)))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("AGENT_WORKER_CONCURRENCY", 4)))
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+        return
+    procs = [multiprocessing.Process(target=_process_main, args=(args.concurrency,)) for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
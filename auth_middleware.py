@@ -1,14 +1,22 @@
-from fastapi import HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import os
-from typing import Optional
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 # JWT configuration - must match server configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
 
 security = HTTPBearer()
 
+# Verified tokens, keyed by SHA-256 of the token, so repeat requests skip signature checks
+TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024))
+# Lifetime for tokens that carry no `exp` claim
+TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300))
+
 class JWTPayload:
     def __init__(self, userId: int, email: str, name: str, userCode: str):
         self.userId = userId
@@ -16,10 +24,59 @@ class JWTPayload:
         self.name = name
         self.userCode = userCode
 
+    def to_dict(self) -> dict:
+        return {'userId': self.userId, 'email': self.email, 'name': self.name, 'userCode': self.userCode}
+
+class VerifiedTokenCache:
+    """LRU of verified tokens; an entry is served only until the token's own expiry."""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[JWTPayload, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Hash so raw bearer tokens aren't held as dict keys
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[JWTPayload]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: JWTPayload, exp: Optional[float]) -> None:
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (user, float(exp) if exp else time.time() + TOKEN_CACHE_TTL)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+token_cache = VerifiedTokenCache()
+
 def verify_access_token(token: str) -> JWTPayload:
     """
     Verify JWT access token and return user payload
     """
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         # Decode and verify JWT token
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
@@ -31,6 +88,7 @@ def verify_access_token(token: str) -> JWTPayload:
             name=payload.get('name'),
             userCode=payload.get('userCode')
         )
+        token_cache.put(token, user_data, payload.get('exp'))
         
         return user_data
     except jwt.ExpiredSignatureError:
@@ -49,7 +107,7 @@ def verify_access_token(token: str) -> JWTPayload:
             detail="Authentication failed"
         )
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = security) -> JWTPayload:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> JWTPayload:
     """
     Dependency to get current authenticated user from JWT token
     Usage: user = Depends(get_current_user)
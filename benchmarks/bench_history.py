@@ -0,0 +1,123 @@
+"""
+Stored chat history benchmark: old JSON entries vs. canonical msgpack entries.
+
+Builds a 60-message conversation (the RedisClient cap) with text turns, OpenAI tool calls
+and Gemini tool results, stores it both ways and reports Redis memory per conversation and
+the CPU cost of one history read (decode, plus the debug print the old read path did).
+
+Usage:
+    python benchmarks/bench_history.py [--reads 2000] [--orders 10] [--redis redis://localhost:6379/15]
+
+Without a reachable Redis only the serialized sizes and decode times are reported.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastmcp.client.client import CallToolResult  # noqa: E402
+from mcp.types import TextContent  # noqa: E402
+from redis_client import decode_message, encode_message  # noqa: E402
+
+
+def fake_orders(n: int) -> dict:
+    return {"success": True, "data": [{
+        "id": i, "order_unique_id": f"ORD-2025-{i:05d}", "status": 1 + i % 5,
+        "customer_name": f"Customer {i}", "customer_mobile": "98480" + f"{i:05d}",
+        "delivery_date": "2025-11-02T00:00:00.000Z", "total_amount": 1250.5 + i,
+        "items": [{"product_id": 3, "name": "Vermicompost 25kg", "quantity": 2, "price": 450}],
+    } for i in range(n)]}
+
+
+def tool_result(payload: dict) -> CallToolResult:
+    text = json.dumps(payload, separators=(",", ":"))
+    return CallToolResult(content=[TextContent(type="text", text=text)], structured_content=payload,
+                          meta={"io.modelcontextprotocol/serverInfo": {"name": "TeluguVermiFarmsAdmin", "version": "2"}},
+                          data=payload)
+
+
+def conversation(orders: int, canonical: bool) -> list[dict]:
+    """60 messages; `canonical` selects the new tool-result text over the old CallToolResult repr."""
+    payload = fake_orders(orders)
+    result = tool_result(payload)
+    content = json.dumps(payload, ensure_ascii=False) if canonical else str(result)
+    try:
+        structured = json.loads(content)
+    except ValueError:
+        structured = {"content": content}
+    messages: list[dict] = []
+    while len(messages) < 60:
+        messages.append({"role": "user", "content": "Show me the pending orders for this week"})
+        messages.append({"role": "assistant", "function_call": {"name": "admin_agent__fetch_orders", "args": {"status": 1, "limit": orders}}})
+        messages.append({"role": "tool", "name": "admin_agent__fetch_orders", "content": content, "structured_response": structured})
+        messages.append({"role": "assistant", "content": "Here are the pending orders for this week: ..." * 3})
+        messages.append({"role": "assistant", "content": "", "tool_calls": [{"id": "call_abc", "type": "function", "function": {"name": "admin_agent__get_orders_count", "arguments": "{\"status\": 1}"}}]})
+        messages.append({"role": "tool", "tool_call_id": "call_abc", "content": content})
+    return messages[-60:]
+
+
+def old_read(entries: list[bytes]) -> list[dict]:
+    messages = [json.loads(m) for m in entries]
+    print("All messages in Redis:", messages)
+    return messages
+
+
+def new_read(entries: list[bytes]) -> list[dict]:
+    return [decode_message(m) for m in entries]
+
+
+def time_reads(read, entries: list[bytes], reads: int) -> float:
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        start = time.perf_counter()
+        for _ in range(reads):
+            read(entries)
+            sink.seek(0)
+            sink.truncate()
+        return (time.perf_counter() - start) / reads * 1000
+
+
+def redis_bytes(url: str, key: str, entries: list[bytes]) -> int | None:
+    try:
+        import redis
+        client = redis.from_url(url)
+        client.delete(key)
+        client.rpush(key, *entries)
+        used = client.memory_usage(key, samples=0)
+        client.delete(key)
+        return used
+    except Exception as e:
+        print(f"(Redis unavailable: {e})")
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=10, help="orders per tool result")
+    parser.add_argument("--redis", default=os.getenv("BENCH_REDIS_URL", "redis://localhost:6379/15"))
+    args = parser.parse_args()
+
+    old_entries = [json.dumps(m).encode() for m in conversation(args.orders, canonical=False)]
+    new_entries = [encode_message(m) for m in conversation(args.orders, canonical=True)]
+
+    rows = []
+    for label, entries, read in (("json (old)", old_entries, old_read), ("msgpack (new)", new_entries, new_read)):
+        rows.append((label, sum(len(e) for e in entries), redis_bytes(args.redis, f"bench:history:{label}", entries),
+                     time_reads(read, entries, args.reads)))
+
+    print(f"{'format':<15} {'payload bytes':>14} {'redis bytes':>12} {'read ms':>9}")
+    for label, size, used, ms in rows:
+        print(f"{label:<15} {size:>14,} {used if used is not None else '-':>12} {ms:>9.3f}")
+    (_, old_size, old_used, old_ms), (_, new_size, new_used, new_ms) = rows
+    print(f"\npayload -{(1 - new_size / old_size) * 100:.0f}%  read CPU -{(1 - new_ms / old_ms) * 100:.0f}%"
+          + (f"  redis memory -{(1 - new_used / old_used) * 100:.0f}%" if old_used and new_used else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Per-tool-call overhead: SSE transport to a separate mcp-server.py process vs. inproc://.
+
+Starts mcp-server.py on a free local port (SSE, as start.sh does), then calls the
+backend-free `get_api_info` tool through MCPOrchestrator over both transports, sequentially
+and with --concurrency calls in flight, and reports latency percentiles and throughput.
+
+Usage:
+    python benchmarks/bench_mcp_transport.py [--calls 500] [--concurrency 8] [--tool get_api_info]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mcp_orchestrator import MCPOrchestrator, DEFAULT_INPROC_SERVER  # noqa: E402
+
+SERVE = (
+    "import importlib.util, sys\n"
+    "spec = importlib.util.spec_from_file_location('mcp_server', sys.argv[1])\n"
+    "module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)\n"
+    "module.mcp.run(transport='sse', host='127.0.0.1', port=int(sys.argv[2]), show_banner=False)\n"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"MCP server did not start on port {port}")
+
+
+async def measure(url: str, tool: str, calls: int, concurrency: int) -> dict:
+    orchestrator = await MCPOrchestrator(url).connect()
+    try:
+        client = await orchestrator.get_client("admin_agent")
+        for _ in range(20):  # warm up
+            await client.call_tool(tool, {})
+        latencies = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await client.call_tool(tool, {})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        async def worker(n: int) -> None:
+            for _ in range(n):
+                await client.call_tool(tool, {})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(calls // concurrency) for _ in range(concurrency)))
+        throughput = (calls // concurrency) * concurrency / (time.perf_counter() - start)
+    finally:
+        await orchestrator.close()
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "throughput": throughput,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tool", default="get_api_info", help="tool to call (should not need the backend)")
+    args = parser.parse_args()
+
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-W", "ignore", "-c", SERVE, DEFAULT_INPROC_SERVER, str(port)],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        results = {
+            "sse": await measure(f"http://127.0.0.1:{port}/sse", args.tool, args.calls, args.concurrency),
+            "inproc": await measure("inproc://", args.tool, args.calls, args.concurrency),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    print(f"\n{args.calls} sequential calls of {args.tool}, then {args.concurrency} concurrent callers")
+    print(f"{'transport':<10} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'calls/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['mean']:>9.3f} {r['p50']:>8.3f} {r['p95']:>8.3f} {r['throughput']:>9.0f}")
+    saved = results["sse"]["mean"] - results["inproc"]["mean"]
+    print(f"\ninproc saves {saved:.3f} ms per call ({saved / results['sse']['mean'] * 100:.0f}% of the SSE round trip)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+resolve_products lookup latency on a synthetic catalogue.
+
+Builds the ProductIndex over --products generated products (realistic names like
+"Premium Vermicompost 25kg") and resolves misspelled / partial queries against it,
+reporting build time and per-query latency percentiles.
+
+Usage:
+    python benchmarks/bench_product_resolve.py [--products 2000] [--queries 5000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_index import ProductIndex  # noqa: E402
+
+BASES = ["Vermicompost", "Vermiwash", "Neem Cake", "Cocopeat", "Earthworms", "Bone Meal", "Seaweed Extract",
+         "Humic Acid", "Potting Mix", "Cow Manure", "Mustard Cake", "Trichoderma", "Panchagavya", "Jeevamrutham"]
+PREFIXES = ["", "Premium ", "Organic ", "Enriched ", "Garden ", "Farm Grade "]
+SIZES = ["1kg", "5kg", "10kg", "25kg", "50kg", "1L", "5L"]
+
+
+def catalogue(n: int, rnd: random.Random) -> list:
+    return [{
+        "id": i,
+        "name": f"{rnd.choice(PREFIXES)}{rnd.choice(BASES)} {rnd.choice(SIZES)}",
+        "description": f"{rnd.choice(BASES)} for {rnd.choice(['gardens', 'farms', 'nurseries', 'terrace gardens'])}",
+        "price_per_kg": rnd.randint(5, 500),
+    } for i in range(1, n + 1)]
+
+
+def misspell(name: str, rnd: random.Random) -> str:
+    words = name.lower().split()
+    word = rnd.randrange(len(words))
+    if len(words[word]) > 4:
+        pos = rnd.randrange(1, len(words[word]) - 1)
+        words[word] = words[word][:pos] + words[word][pos + 1:]  # drop a letter
+    if len(words) > 2 and rnd.random() < 0.5:
+        words.pop(0)  # partial name
+    return " ".join(words)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    products = catalogue(args.products, rnd)
+    index = ProductIndex()
+    start = time.perf_counter()
+    index.build(products)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [(misspell(p["name"], rnd), p["name"]) for p in rnd.choices(products, k=args.queries)]
+    latencies, top1 = [], 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        matches = index.search(query, limit=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top1 += bool(matches) and matches[0]["product"]["name"] == expected
+    latencies.sort()
+
+    print(f"\n{args.products} products indexed in {build_ms:.1f} ms ({index.stats()['trigrams']} trigrams)")
+    print(f"{args.queries} misspelled/partial queries:")
+    print(f"  mean {statistics.mean(latencies):.3f} ms   p50 {latencies[len(latencies) // 2]:.3f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+    print(f"  top-1 name match {top1 / len(queries) * 100:.0f}% (names repeat across sizes/prefixes, so ties are expected)")
+
+
+if __name__ == "__main__":
+    main()
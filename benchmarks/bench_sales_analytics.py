@@ -0,0 +1,79 @@
+"""
+sales_analytics query latency over a synthetic order history.
+
+Loads --orders generated orders (with --lines line items each) into an OrderIndex, builds the
+SalesData columns, then times typical questions (revenue by product, average order value by
+month, busiest day, ...) and an incremental refresh after a few orders change.
+
+Usage:
+    python benchmarks/bench_sales_analytics.py [--orders 20000] [--lines 3] [--runs 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_index import OrderIndex  # noqa: E402
+from sales_analytics import SalesData  # noqa: E402
+
+QUERIES = {
+    "revenue by product": dict(group_by="product"),
+    "revenue by product, one month": dict(group_by="product", date_from="2025-10-01", date_to="2025-10-31"),
+    "average order value by month": dict(aggregate="mean", group_by="month"),
+    "busiest day": dict(measure="orders", group_by="day", sort="value", top_k=1),
+    "orders per product": dict(measure="orders", group_by="product"),
+    "top customers": dict(group_by="customer", top_k=5),
+    "quantity by week": dict(measure="quantity", group_by="week"),
+}
+
+
+def history(n: int, lines: int, rnd: random.Random) -> list:
+    return [{
+        "id": i, "order_unique_id": f"ORD-2025-{i:06d}", "status": rnd.randint(1, 5),
+        "customer_name": f"Customer {rnd.randrange(n // 20 + 1)}",
+        "created_at": f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T10:00:00Z",
+        "updated_at": "2025-12-31T00:00:00Z",
+        "items": [{"product_id": p, "product_name": f"Product {p}", "quantity": rnd.randint(1, 20),
+                   "price": rnd.randint(20, 900)} for p in rnd.sample(range(60), lines)],
+    } for i in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    orders = history(args.orders, args.lines, rnd)
+    index = OrderIndex()
+    index.upsert(orders)
+    data = SalesData()
+    start = time.perf_counter()
+    data.refresh(index)
+    print(f"\n{args.orders} orders / {args.orders * args.lines} lines loaded into columns in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for name, kwargs in QUERIES.items():
+        latencies = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            data.query(**kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"  {name:<32} p50 {statistics.median(latencies):7.3f} ms   max {max(latencies):7.3f} ms")
+
+    for order in rnd.sample(orders, 50):
+        order["status"], order["updated_at"] = 5, "2026-01-01T00:00:00Z"
+    index.upsert(orders)
+    start = time.perf_counter()
+    changed = data.refresh(index)
+    print(f"incremental refresh of {changed} changed orders: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Throughput benchmark for chat turns over Socket.IO vs. number of uvicorn workers.
+
+For each worker count it starts `uvicorn benchmarks.scaling_app:app --workers N`, opens
+`--clients` websocket connections (each acting like a BE server connection) and keeps one
+chat:send in flight per client for `--duration` seconds. Reports completed turns/sec and
+latency percentiles.
+
+Usage:
+    python benchmarks/bench_socket_scaling.py --workers 1 2 4 --clients 64 --duration 20
+
+Multi-worker mode needs the Redis client manager so emits reach sids owned by other workers:
+    SOCKETIO_MANAGER=redis REDIS_URL=redis://localhost:6379/0 RESET_HISTORY_ON_RESTART=false \\
+        python benchmarks/bench_socket_scaling.py --workers 1 2 4 8
+
+`--check-cross-worker` instead starts two single-worker servers on adjacent ports sharing
+the Redis manager and checks that an emit made on one reaches a sid connected to the other,
+and that a chat:send on one supersedes (cancels) the same conversation's turn on the other:
+    SOCKETIO_MANAGER=redis REDIS_URL=redis://localhost:6379/15 \\
+        python benchmarks/bench_socket_scaling.py --check-cross-worker
+
+Clients use the websocket transport only; with HTTP long-polling, multi-worker deployments
+also need sticky sessions at the load balancer. Run on a machine with at least as many cores
+as the largest worker count - on a single core the extra workers only add contention.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def client_loop(url: str, client_id: int, stop_at: float, latencies: list) -> None:
+    sio = socketio.AsyncClient()
+    pending: dict = {}
+
+    @sio.on('chat:complete')
+    async def on_complete(data):
+        fut = pending.pop(data.get('conversationId'), None)
+        if fut and not fut.done():
+            fut.set_result(True)
+
+    @sio.on('chat:error')
+    async def on_error(data):
+        fut = pending.pop(data.get('conversationId'), None)
+        if fut and not fut.done():
+            fut.set_result(False)
+
+    await sio.connect(url, transports=['websocket'])
+    turn = 0
+    try:
+        while time.perf_counter() < stop_at:
+            turn += 1
+            conversation_id = f"bench-{client_id}-{turn}"
+            fut = asyncio.get_running_loop().create_future()
+            pending[conversation_id] = fut
+            started = time.perf_counter()
+            await sio.emit('chat:send', {'message': 'how many orders are pending', 'conversationId': conversation_id, 'userId': client_id})
+            try:
+                ok = await asyncio.wait_for(fut, timeout=30)
+            except asyncio.TimeoutError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+    finally:
+        await sio.disconnect()
+
+
+async def drive(url: str, clients: int, duration: float) -> tuple[float, list]:
+    latencies: list = []
+    started = time.perf_counter()
+    stop_at = started + duration
+    await asyncio.gather(*(client_loop(url, i, stop_at, latencies) for i in range(clients)))
+    return time.perf_counter() - started, latencies
+
+
+class Probe:
+    """Socket.IO client that records every event it receives."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.sio = socketio.AsyncClient()
+        self.events: list = []
+        self.sio.on('*', self._record)
+
+    async def _record(self, event, data=None):
+        self.events.append((event, data))
+
+    async def __aenter__(self) -> "Probe":
+        await self.sio.connect(self.url, transports=['websocket'])
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.sio.disconnect()
+
+    @property
+    def sid(self) -> str:
+        return self.sio.get_sid('/')
+
+    def got(self, event: str, conversation_id: str = None) -> bool:
+        return any(e == event and (conversation_id is None or (d or {}).get('conversationId') == conversation_id)
+                   for e, d in self.events)
+
+    async def wait_for(self, event: str, conversation_id: str = None, timeout: float = 10) -> bool:
+        stop_at = time.perf_counter() + timeout
+        while not self.got(event, conversation_id):
+            if time.perf_counter() > stop_at:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+
+async def check_cross_worker(url_a: str, url_b: str, turn_seconds: float) -> list:
+    """Failed checks (empty when both workers cooperate through the Redis manager)."""
+    failures = []
+    async with Probe(url_a) as a, Probe(url_b) as b:
+        await a.sio.emit('chat:send', {'message': 'warm up', 'conversationId': 'xw-plain'})
+        if not await a.wait_for('chat:complete', 'xw-plain', timeout=turn_seconds + 10):
+            failures.append("a plain turn on worker A did not complete")
+
+        await b.sio.emit('bench:relay', {'to': a.sid, 'event': 'bench:ping', 'data': {'from': b.sid}})
+        if not await a.wait_for('bench:ping', timeout=5):
+            failures.append("an emit on worker B did not reach the sid connected to worker A")
+
+        # Same conversation on both workers: B's newer turn must cancel A's in-flight one
+        await a.sio.emit('chat:send', {'message': 'first', 'conversationId': 'xw-cancel'})
+        await asyncio.sleep(min(0.5, turn_seconds / 3))
+        await b.sio.emit('chat:send', {'message': 'second', 'conversationId': 'xw-cancel'})
+        if not await b.wait_for('chat:complete', 'xw-cancel', timeout=turn_seconds + 10):
+            failures.append("the superseding turn on worker B did not complete")
+        # A's turn would have finished before B's; give it a margin anyway
+        await asyncio.sleep(1)
+        if a.got('chat:complete', 'xw-cancel'):
+            failures.append("the turn on worker A was not cancelled by the newer turn on worker B")
+    return failures
+
+
+def start_server(port: int, workers: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.scaling_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(port: int, timeout: float = 30) -> None:
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1)
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise RuntimeError("server did not become ready")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--check-cross-worker", action="store_true",
+                        help="check emit/cancel across two workers sharing the Redis manager instead of benchmarking")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("MAX_CONCURRENT_TURNS", "10000")
+    env.setdefault("MAX_TURNS_PER_USER", "10000")
+    # Bench clients connect without a token
+    env.setdefault("SOCKET_AUTH", "off")
+
+    if args.check_cross_worker:
+        if env.get("SOCKETIO_MANAGER", "").lower() != "redis":
+            sys.exit("--check-cross-worker needs SOCKETIO_MANAGER=redis (and REDIS_URL)")
+        env.setdefault("RESET_HISTORY_ON_RESTART", "false")
+        # Long enough for the second message to arrive while the first turn is still running
+        env.setdefault("BENCH_TURN_IO_MS", "2000")
+        turn_seconds = float(env["BENCH_TURN_IO_MS"]) / 1000
+        procs = [start_server(args.port, 1, env), start_server(args.port + 1, 1, env)]
+        try:
+            wait_until_up(args.port)
+            wait_until_up(args.port + 1)
+            failures = asyncio.run(check_cross_worker(
+                f"http://127.0.0.1:{args.port}", f"http://127.0.0.1:{args.port + 1}", turn_seconds))
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait()
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            sys.exit(1)
+        print("✅ Cross-worker emit and supersede-cancel work through the Redis manager")
+        return
+
+    print(f"{'workers':>7} {'turns':>7} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for workers in args.workers:
+        proc = start_server(args.port, workers, env)
+        try:
+            wait_until_up(args.port)
+            elapsed, latencies = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.clients, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait()
+        if not latencies:
+            print(f"{workers:>7} {0:>7} {'-':>9} {'-':>8} {'-':>8}")
+            continue
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{workers:>7} {len(latencies):>7} {len(latencies) / elapsed:>9.1f} "
+              f"{statistics.median(latencies) * 1000:>8.0f} {p95 * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start benchmark for `server:socket_app`.
+
+Imports the ASGI app in fresh interpreters (like a restart / autoscale event) and reports
+wall-clock import time plus which provider SDKs ended up loaded.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--provider gemini|openai] [--importtime]
+
+--importtime additionally prints the 15 most expensive modules from `python -X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import server\n"
+    "server.socket_app\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "sdks = [m for m in ('openai', 'google.generativeai') if m in sys.modules]\n"
+    "print(f'{elapsed:.4f}', ','.join(sdks) or '-')\n"
+)
+
+
+def run_once(env: dict) -> tuple[float, str]:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    elapsed, sdks = out.split(" ", 1)
+    return float(elapsed), sdks
+
+
+def top_imports(env: dict, limit: int = 15) -> list[tuple[int, str]]:
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import server; server.socket_app"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--provider", default=os.getenv("LLM_PROVIDER", "gemini"))
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    env = dict(os.environ, LLM_PROVIDER=args.provider)
+    env.setdefault("OPEN_AI_API_KEY", "bench-placeholder")
+
+    timings = []
+    sdks = "-"
+    for _ in range(args.runs):
+        elapsed, sdks = run_once(env)
+        timings.append(elapsed)
+
+    print(f"server:socket_app cold import ({args.provider}, {args.runs} runs)")
+    print(f"  median {statistics.median(timings) * 1000:.1f} ms | min {min(timings) * 1000:.1f} ms | max {max(timings) * 1000:.1f} ms")
+    print(f"  provider SDKs loaded at import: {sdks}")
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative us):")
+        for cumulative, name in top_imports(env):
+            print(f"  {cumulative:>10}  {name}")
+
+
+if __name__ == "__main__":
+    main()
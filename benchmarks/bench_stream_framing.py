@@ -0,0 +1,134 @@
+"""
+chat:stream framing benchmark: one event per word vs. StreamEmitter batching.
+
+Streams a long Markdown answer (an orders table) through each strategy and encodes every
+event the way python-socketio puts it on a WebSocket (Socket.IO packet + Engine.IO "4"
+prefix + WebSocket frame header, binary attachments as separate frames). Reports frames,
+bytes on the wire, encode throughput and wall-clock delivery time.
+
+Two sources are simulated:
+  whole   - the full answer is available at once (inline turns today)
+  trickle - text arrives in ~4-char tokens every --token-ms (LLM / worker streaming)
+
+Usage:
+    python benchmarks/bench_stream_framing.py [--rows 60] [--token-ms 2] [--window-ms 40]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio import packet  # noqa: E402
+from stream_emitter import StreamEmitter  # noqa: E402
+
+
+def markdown_answer(rows: int) -> str:
+    lines = ["Here are the latest orders:", "",
+             "| Order ID | Customer | Mobile | Status | Delivery | Items | Amount |",
+             "|---|---|---|---|---|---|---|"]
+    for i in range(rows):
+        lines.append(f"| ORD-2025-{i:05d} | Customer {i} | 98480{i:05d} | {['Pending', 'Confirmed', 'Shipped'][i % 3]} "
+                     f"| 2025-11-{1 + i % 28:02d} | Vermicompost 25kg x {1 + i % 4} | ₹{1250 + i * 35:,} |")
+    lines += ["", f"Total: **{rows}** orders."]
+    return "\n".join(lines)
+
+
+def ws_frame_bytes(payload_len: int) -> int:
+    # Server->client WebSocket frames are unmasked: 2 byte header, +2 past 125 bytes, +8 past 64 KiB
+    return payload_len + (2 if payload_len <= 125 else 4 if payload_len < 65536 else 10)
+
+
+class Wire:
+    """Encodes events like python-socketio and tallies what would go on the socket."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+        self.encode_seconds = 0.0
+
+    async def send(self, frame: dict) -> None:
+        start = time.perf_counter()
+        encoded = packet.Packet(packet.EVENT, data=["chat:stream", frame], namespace="/").encode()
+        parts = encoded if isinstance(encoded, list) else [encoded]
+        for part in parts:
+            size = len(part) if isinstance(part, bytes) else len(("4" + part).encode())
+            self.bytes += ws_frame_bytes(size)
+        self.encode_seconds += time.perf_counter() - start
+        self.frames += 1
+
+
+def tokens(text: str, size: int = 4) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def per_word(answer: str, wire: Wire, token_ms: float, trickle: bool, sleep_ms: float) -> None:
+    """Old behaviour: one {'chunk','index','conversationId'} event per word."""
+    if trickle:
+        # Emit each word as soon as its tokens have arrived
+        pending, index = "", 0
+        for tok in tokens(answer):
+            await asyncio.sleep(token_ms / 1000)
+            pending += tok
+            *words, pending = pending.split(" ")
+            for word in words:
+                await wire.send({"chunk": word + " ", "index": index, "conversationId": "conv-123"})
+                index += 1
+        if pending:
+            await wire.send({"chunk": pending, "index": index, "conversationId": "conv-123"})
+        return
+    for i, word in enumerate(answer.split(" ")):
+        await wire.send({"chunk": word + " ", "index": i, "conversationId": "conv-123"})
+        if sleep_ms:
+            await asyncio.sleep(sleep_ms / 1000)
+
+
+async def batched(answer: str, wire: Wire, token_ms: float, trickle: bool, window_ms: float, compress: bool) -> None:
+    emitter = StreamEmitter(wire.send, "conv-123", window_ms=window_ms, compress=compress)
+    if trickle:
+        for tok in tokens(answer):
+            await asyncio.sleep(token_ms / 1000)
+            await emitter.write(tok)
+    else:
+        await emitter.write(answer)
+    await emitter.close()
+
+
+async def run(label: str, coro_factory) -> tuple:
+    wire = Wire()
+    start = time.perf_counter()
+    await coro_factory(wire)
+    wall = time.perf_counter() - start
+    fps = wire.frames / wire.encode_seconds if wire.encode_seconds else float("inf")
+    return label, wire.frames, wire.bytes, fps, wall
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--token-ms", type=float, default=2.0, help="delay between ~4-char tokens in trickle mode")
+    parser.add_argument("--window-ms", type=float, default=40.0)
+    parser.add_argument("--word-sleep-ms", type=float, default=10.0, help="per-word sleep of the old inline loop")
+    args = parser.parse_args()
+
+    answer = markdown_answer(args.rows)
+    print(f"Answer: {len(answer):,} chars, {len(answer.split(' ')):,} words\n")
+
+    for mode in ("whole", "trickle"):
+        trickle = mode == "trickle"
+        results = [
+            await run("per-word", lambda w: per_word(answer, w, args.token_ms, trickle, args.word_sleep_ms)),
+            await run(f"batched {args.window_ms:g}ms", lambda w: batched(answer, w, args.token_ms, trickle, args.window_ms, False)),
+            await run("batched+deflate", lambda w: batched(answer, w, args.token_ms, trickle, args.window_ms, True)),
+        ]
+        print(f"[{mode}]")
+        print(f"{'strategy':<18} {'frames':>7} {'wire bytes':>11} {'encode frames/s':>16} {'wall s':>8}")
+        for label, frames, size, fps, wall in results:
+            print(f"{label:<18} {frames:>7,} {size:>11,} {fps:>16,.0f} {wall:>8.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
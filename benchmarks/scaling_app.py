@@ -0,0 +1,50 @@
+"""
+ASGI app used by bench_socket_scaling.py - the real Socket.IO stack with a simulated agent turn.
+
+The simulated turn burns CPU (JSON round trips, like history/tool payload handling) and then
+awaits a fixed "LLM latency", so throughput is bounded by the socket/agent process itself.
+
+Tuning env vars: BENCH_TURN_CPU_MS (default 20), BENCH_TURN_IO_MS (default 200).
+
+`bench:relay` {to, event, data} emits `event` to another sid, which may be connected to a
+different worker; the cross-worker check uses it to test the Redis client manager.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+from runtime import runtime  # noqa: E402
+
+CPU_MS = float(os.getenv("BENCH_TURN_CPU_MS", 20))
+IO_MS = float(os.getenv("BENCH_TURN_IO_MS", 200))
+_PAYLOAD = {"orders": [{"id": i, "customer": f"Customer {i}", "items": [{"productId": 1, "quantity": 5}]} for i in range(50)]}
+
+
+async def simulated_chat(history, message, user_token="", conversation_id=None, **kwargs):
+    deadline = time.perf_counter() + CPU_MS / 1000
+    while time.perf_counter() < deadline:
+        json.loads(json.dumps(_PAYLOAD))
+    await asyncio.sleep(IO_MS / 1000)
+    return "Here are the **orders** you asked for, formatted as a short markdown answer."
+
+
+assistant = runtime.assistant
+assistant.chat = simulated_chat
+assistant.get_history = lambda conversation_id=None: []
+# Skip Redis/MCP warmup; the benchmark only exercises the socket + turn path
+for check in runtime.checks:
+    runtime.checks[check] = True
+
+
+
+@server.sio.on('bench:relay')
+async def relay(sid, data):
+    await server.sio.emit(data['event'], data.get('data'), room=data['to'])
+
+
+app = server.socket_app
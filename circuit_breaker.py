@@ -0,0 +1,90 @@
+"""
+Circuit breaker - stop calling a failing dependency for a while instead of waiting on it every time
+"""
+import time
+import threading
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} circuit is open; retrying in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, allow() is False so
+    callers fail fast (or fall back). After `reset_timeout` seconds one trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 10.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def check(self) -> None:
+        """allow() that raises CircuitOpenError instead of returning False."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def retry_in(self) -> float:
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> bool:
+        """Returns True when this success closed a circuit that had been open (i.e. recovery)."""
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+        if recovered:
+            print(f"✅ {self.name} circuit closed (dependency recovered)")
+        return recovered
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            reopen = self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold)
+            if reopen:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+        if reopen:
+            print(f"⚡ {self.name} circuit opened after {self.failures} failure(s): {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in(), 1),
+            "last_error": self.last_error,
+        }
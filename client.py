@@ -1,14 +1,25 @@
 import json
 import os
 import asyncio
+import time
 from datetime import datetime
-from typing import Any, List
-from openai import OpenAI
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List, Optional
 from dotenv import load_dotenv
 from mcp_orchestrator import MCPOrchestrator
 from system_prompt import system_prompt
-from redis_client import RedisClient, CHAT_KEY
-from google import generativeai as genai
+from redis_client import RESET_HISTORY_ON_RESTART
+from history_store import create_history_store
+from llm_providers import ProviderRegistry, configured_provider_name
+from model_router import ModelRouter, ModelRoute
+from fast_path import FastPath, tool_result_payload
+from tool_prefetch import ToolPrefetcher, PrefetchSession
+from transcript_cache import TranscriptCache
+from rate_governor import RateGovernor, estimate_tokens, is_rate_limit_error
+from usage_tracker import UsageTracker, TurnUsage, call_usage
+from turn_checkpoint import CheckpointStore, TurnCheckpoint
+from turn_deadline import Deadline, TOOL_MIN_SECONDS
+from admission import TURN_DEADLINE_SECONDS
 load_dotenv()
 
 def _gemini_result_text(result: Any) -> str:
@@ -49,18 +60,149 @@ def _gemini_result_text(result: Any) -> str:
         pass
     return ""
 
+def _gemini_history_content(msg: dict) -> Any:
+    """Gemini `contents` item for one stored history message (None if it has no Gemini form)."""
+    role = msg.get("role")
+    if role in ("user", "assistant"):
+        # If this is an assistant function_call record without content, skip textual echo
+        if role == "assistant" and msg.get("function_call") and not msg.get("content"):
+            return None
+        text = msg.get("content", "")
+        if not isinstance(text, str):
+            try:
+                text = json.dumps(text, ensure_ascii=False)
+            except Exception:
+                text = str(text)
+        if not text:
+            return None
+        if role == "assistant":
+            return {"role": "model", "parts": [{"text": text}]}
+        return {"role": "user", "parts": [{"text": text}]}
+    if role == "tool":
+        # Map stored tool result back into Gemini function_response part
+        tool_name = msg.get("name") or msg.get("tool_name")
+        tool_content = msg.get("structured_response")
+        if tool_content is None:
+            raw_tool_content = msg.get("content", "")
+            try:
+                tool_content = json.loads(raw_tool_content)
+            except Exception:
+                tool_content = {"content": raw_tool_content}
+        return {
+            "role": "user",
+            "parts": [{
+                "function_response": {
+                    "name": tool_name,
+                    "response": tool_content
+                }
+            }]
+        }
+    return None
+
+def _tool_result_content(result: Any) -> str:
+    """One canonical text form of a tool result: its JSON payload (repr only if it has none).
+    Results the MCP server flagged as errors are prefixed with "Error: "."""
+    payload = tool_result_payload(result)
+    if payload is not None:
+        content = json.dumps(payload, ensure_ascii=False)
+    else:
+        texts = [getattr(block, "text", None) for block in getattr(result, "content", None) or []]
+        texts = [t for t in texts if t]
+        content = "\n".join(texts) if texts else str(result)
+    if getattr(result, "is_error", False) is True or getattr(result, "isError", False) is True:
+        return f"Error: {content}"
+    return content
+
+def _is_tool_error(content: Any) -> bool:
+    """Whether a tool message's content reports a failure: an "Error:" text (call raised or
+    the MCP result was flagged), or a JSON payload with an `error` key, the tools' error shape."""
+    text = str(content or "")
+    if text.startswith("Error:"):
+        return True
+    if not text.startswith("{"):
+        return False
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and (bool(payload.get("error")) or payload.get("isError") is True)
+
+def _tool_call_dict(tc: Any) -> dict:
+    """OpenAI tool call as the plain dict sent back in `messages` (and stored in history)."""
+    return {
+        "id": tc.id,
+        "type": tc.type,
+        "function": {
+            "name": tc.function.name,
+            "arguments": tc.function.arguments
+        }
+    }
+
+def _tool_meta(conversation_id: Optional[str], deadline: Optional[Deadline]) -> Optional[dict]:
+    """_meta sent with a tool call: the conversation id scopes the MCP server's dedupe of repeated
+    write calls; the deadline caps its backend calls at the time this turn has left"""
+    meta = {}
+    if conversation_id:
+        meta["conversationId"] = conversation_id
+    if deadline is not None:
+        meta["deadline"] = deadline.at
+    return meta or None
+
+def _plain(value: Any) -> Any:
+    """Gemini SDK map/repeated values (function call args) as plain dicts and lists."""
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "items"):
+        return {k: _plain(v) for k, v in value.items()}
+    try:
+        return [_plain(v) for v in value]
+    except TypeError:
+        return value
+
+# Sent when the turn's deadline is close: the next LLM call must answer instead of calling tools
+WRAP_UP_INSTRUCTION = ("Time for this request is almost up. Do not request any more actions. Answer now with the "
+                       "information you already have, and tell the user plainly which parts could not be completed.")
+# Stands in for the result of a tool call the deadline left no time to run
+TOOL_SKIPPED_CONTENT = ("System Notification: This action was not carried out because the request ran out of time. "
+                        "Do not say it was done.")
+
+# Receives turn progress events such as {"type": "tool", "tool": "fetch_orders", "phase": "start"}
+EventSink = Optional[Callable[[dict], Awaitable[None]]]
+
+async def _emit(on_event: EventSink, event: dict) -> None:
+    if on_event is None:
+        return
+    try:
+        await on_event(event)
+    except Exception as e:
+        # A slow or broken listener must not fail the turn
+        print(f"⚠️ Turn event listener failed: {e}")
+
 class TeluguVermiFarmsClient:
     def __init__(self) -> None:
-        self.client = OpenAI(api_key=os.getenv("OPEN_AI_API_KEY"))
+        # Provider SDKs (openai / google.generativeai) are imported on first use only
+        self.providers = ProviderRegistry()
+        self.router = ModelRouter()
+        self.fast_path = FastPath()
+        self.prefetcher = ToolPrefetcher()
+        # Per provider/model request and token budgets; calls wait for headroom instead of hitting 429s
+        self.governor = RateGovernor()
+        # Token/cost accounting per turn, conversation and user (Redis), plus optional budgets
+        self.usage = UsageTracker()
+        # Tool-loop state per request id, so a retried turn resumes instead of starting over
+        self.checkpoints = CheckpointStore()
         self.conversation_history = []
         self.mcp_orchestrator = MCPOrchestrator()
         self.MAX_ITERATIONS = 10
-        self.redis_client = RedisClient()
-        # Clear all stored chat messages at startup for a fresh session
-        try:
-            self.redis_client.client.delete(CHAT_KEY)
-        except Exception:
-            pass
+        # Redis with in-memory failover, or memory only (HISTORY_BACKEND=memory)
+        self.history = create_history_store()
+        # Provider-native history per conversation, extended as messages are persisted
+        self.transcripts = TranscriptCache({
+            "openai": lambda msg: msg,
+            "gemini": _gemini_history_content,
+        })
+        # Provider tool declarations derived from the (cached) MCP tool specs
+        self._tools_cache: dict[str, tuple[int, Any]] = {}
         self.AVAILABLE_MODELS = [
             "gemini-2.5-flash",
             "gemini-2.5-pro",
@@ -69,14 +211,69 @@ class TeluguVermiFarmsClient:
             "gemini-flash-latest"
         ]
 
-    def get_history(self) -> list[dict]:
-        """Fetch last messages from Redis for the agent."""
+    # ---- Startup warmup (driven by runtime.AgentRuntime) ----
+
+    def warm_redis(self, reset_history: bool = RESET_HISTORY_ON_RESTART) -> None:
+        """Open a pooled Redis connection and (unless disabled) clear stored chat messages for a fresh session.
+        Multi-worker deployments set RESET_HISTORY_ON_RESTART=false so one worker restarting
+        doesn't wipe conversations the other workers are serving.
+        """
+        self.history.ping()
+        if reset_history:
+            self.history.clear_history()
+
+    async def warm_mcp(self) -> int:
+        """Connect the shared MCP session and pre-fetch tool specs. Returns the tool count."""
+        orchestrator = await self.mcp_orchestrator.ensure_connected()
+        tools_specs = await orchestrator.get_all_tools_specs()
+        self.get_tools_from_specs(tools_specs)
+        self.get_gemini_tools_from_specs(tools_specs)
+        return len(tools_specs)
+
+    def warm_providers(self) -> None:
+        """Import and configure the configured provider's SDK once instead of on the first turn."""
+        self.providers.configured()
+
+    async def shutdown(self) -> None:
+        await self.mcp_orchestrator.close()
+
+    @property
+    def client(self):
+        """OpenAI async client (loaded on first access)."""
+        return self.providers.get("openai").client
+
+    @asynccontextmanager
+    async def _orchestrator_session(self):
+        """Yield the shared, long-lived MCP orchestrator (reconnecting if the session dropped)."""
+        yield await self.mcp_orchestrator.ensure_connected()
+
+    def get_history(self, conversation_id: str = None) -> list[dict]:
+        """Fetch last messages from Redis for the agent (scoped to a conversation when given).
+        Only messages written since this process last read or wrote the conversation are fetched.
+        """
         try:
-            return self.redis_client.get_last_messages() or []
+            return self.transcripts.history(conversation_id, self.history)
         except Exception:
             return []
 
+    def _persist_message(self, msg: dict, conversation_id: str = None) -> None:
+        """Append a message to the conversation's stored history and its cached transcripts."""
+        version = self.history.add_message(msg, conversation_id)
+        self.transcripts.append(conversation_id, msg, version)
+
+    def _cached_tools(self, kind: str, tools_specs: list[dict[str, Any]], build):
+        # Specs are cached per MCP session, so the same list object means the same declarations
+        cached = self._tools_cache.get(kind)
+        if cached and cached[0] == id(tools_specs):
+            return cached[1]
+        tools = build(tools_specs)
+        self._tools_cache[kind] = (id(tools_specs), tools)
+        return tools
+
     def get_tools_from_specs(self, tools_specs: list[dict[str, Any]]):
+        return self._cached_tools("openai", tools_specs, self._build_openai_tools)
+
+    def _build_openai_tools(self, tools_specs: list[dict[str, Any]]):
         return [
             {
                 "type": "function",
@@ -132,6 +329,9 @@ class TeluguVermiFarmsClient:
 
     def get_gemini_tools_from_specs(self, tools_specs: list[dict[str, Any]]):
         """Map MCP tool specs to Gemini function declarations format, stripping unsupported fields (e.g., 'title')."""
+        return self._cached_tools("gemini", tools_specs, self._build_gemini_tools)
+
+    def _build_gemini_tools(self, tools_specs: list[dict[str, Any]]):
         function_declarations = []
         for spec in tools_specs:
             params = spec.get("inputSchema", {"type": "object", "properties": {}})
@@ -150,21 +350,39 @@ class TeluguVermiFarmsClient:
         # Gemini expects tools as a list, each with function_declarations
         return [{"function_declarations": function_declarations}]
 
-    async def _generate_content_with_fallback(self, contents: List[Any], tools: List[Any]) -> Any:
-        """Attempts to generate content using a list of prioritized models."""
-        
-        # Prioritize env var model if set
-        models = list(self.AVAILABLE_MODELS)
-        env_model = os.getenv("GEMINI_MODEL")
-        if env_model and env_model not in models:
-            models.insert(0, env_model)
+    async def _generate_content_with_fallback(self, contents: List[Any], tools: List[Any], route: ModelRoute = None,
+                                              usage: TurnUsage = None, deadline: Deadline = None, tool_config: dict = None) -> Any:
+        """Attempts to generate content using a list of prioritized models.
+        With a route, starts at the routed tier and only falls through to stronger models.
+        With a deadline, no model is tried once it has passed.
+        """
+        if route is not None:
+            models = route.candidates()
+        else:
+            # Prioritize env var model if set
+            models = list(self.AVAILABLE_MODELS)
+            env_model = os.getenv("GEMINI_MODEL")
+            if env_model and env_model not in models:
+                models.insert(0, env_model)
             
         last_error = None
+        estimate = estimate_tokens(contents, tools)
+        extra = {"tool_config": tool_config} if tool_config else {}
         for model_name in models:
+            if deadline is not None and deadline.expired:
+                print(f"⏱️ Turn deadline passed; not trying {model_name}")
+                break
             try:
                 # print(f"Trying model: {model_name}")
-                model = genai.GenerativeModel(model_name, tools=tools)
-                result = await asyncio.to_thread(model.generate_content, contents)
+                model = self.providers.get("gemini").model(model_name, tools=tools)
+
+                async def generate():
+                    # Native async call (not a worker thread) so task cancellation reaches the HTTP request
+                    return await model.generate_content_async(contents, **extra), None
+
+                result = await self._governed_call("gemini", model_name, estimate, generate, usage, deadline)
+                if route is not None:
+                    route.model = model_name
                 return result
             except Exception as e:
                 print(f"⚠️ Model {model_name} failed: {e}")
@@ -174,10 +392,91 @@ class TeluguVermiFarmsClient:
         print(f"❌ All models failed. Last error: {last_error}")
         return None
 
-    
-    async def _call_tool_safely(self, orchestrator: MCPOrchestrator, tool_name: str, args: dict, call_id: str):
-        """Safely call a tool and return the result message."""
+    async def _governed_call(self, provider: str, model_name: str, estimated_tokens: int, call, usage: TurnUsage = None,
+                             deadline: Deadline = None):
+        """Run one LLM call under the rate governor. `call` returns (response, headers or None).
+        A rate-limit error pauses this model and retries it (paced) rather than failing over at once;
+        RateLimitWait is raised when the model won't have headroom within RATE_MAX_WAIT_SECONDS or
+        before the turn's deadline, so the caller moves on to the next model instead of waiting.
+        The call is cancelled (asyncio.TimeoutError) when the turn's deadline passes.
+        """
+        for attempt in range(self.governor.max_retries + 1):
+            reservation = await self.governor.acquire(provider, model_name, estimated_tokens,
+                                                      max_wait=deadline.remaining() if deadline else None)
+            started = time.perf_counter()
+            try:
+                response, headers = await asyncio.wait_for(call(), deadline.remaining() if deadline else None)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.governor.on_rate_limited(reservation, e)
+                if attempt >= self.governor.max_retries:
+                    raise
+                continue
+            self.governor.settle(reservation, response, headers)
+            if usage is not None:
+                usage.add_call(call_usage(provider, model_name, response, (time.perf_counter() - started) * 1000))
+            return response
+
+    async def _openai_completion(self, route: ModelRoute, usage: TurnUsage = None, deadline: Deadline = None, **kwargs) -> Any:
+        """chat.completions.create on the routed model, falling through to stronger models on failure
+        (but not past the turn's deadline)."""
+        last_error = None
+        # OpenAI counts max_tokens against the tokens-per-minute limit up front
+        estimate = estimate_tokens(kwargs.get("messages"), kwargs.get("tools")) + kwargs.get("max_tokens", 0)
+        for model_name in route.candidates():
+            if deadline is not None and deadline.expired:
+                print(f"⏱️ Turn deadline passed; not trying {model_name}")
+                break
+            try:
+                async def create():
+                    # Raw response so the rate-limit headers can be read
+                    raw = await self.client.chat.completions.with_raw_response.create(model=model_name, **kwargs)
+                    return raw.parse(), raw.headers
+
+                response = await self._governed_call("openai", model_name, estimate, create, usage, deadline)
+                route.model = model_name
+                return response
+            except Exception as e:
+                print(f"⚠️ Model {model_name} failed: {e}")
+                last_error = e
+        raise last_error or RuntimeError("No OpenAI models configured")
+
+    def _escalate_on_tool_errors(self, route: ModelRoute, tool_messages: List[dict]) -> None:
+        """A failed tool call usually means bad arguments; let a stronger model handle the recovery."""
+        if route is None:
+            return
+        if any(_is_tool_error(m.get("content")) for m in tool_messages):
+            route.escalate("tool call failed")
+
+    async def _call_tool_safely(self, orchestrator: MCPOrchestrator, tool_name: str, args: dict, call_id: str,
+                                prefetch: PrefetchSession = None, on_event: EventSink = None,
+                                conversation_id: str = None, deadline: Deadline = None):
+        """Safely call a tool and return the result message (served from a matching prefetch if any)."""
+        display_name = tool_name.split("__", 1)[-1]
+        started = time.perf_counter()
+        await _emit(on_event, {"type": "tool", "tool": display_name, "phase": "start"})
+        message = await self._call_tool_message(orchestrator, tool_name, args, call_id, prefetch, conversation_id, deadline)
+        await _emit(on_event, {
+            "type": "tool",
+            "tool": display_name,
+            "phase": "done",
+            "ok": not (_is_tool_error(message.get("content")) or str(message.get("content", "")).startswith("System Notification:")),
+            "ms": round((time.perf_counter() - started) * 1000),
+        })
+        return message
+
+    async def _call_tool_message(self, orchestrator: MCPOrchestrator, tool_name: str, args: dict, call_id: str,
+                                 prefetch: PrefetchSession = None, conversation_id: str = None, deadline: Deadline = None):
         try:
+            result = await prefetch.take(tool_name, args) if prefetch else None
+            if result is not None:
+                return {
+                    "role": "tool",
+                    "tool_call_id": call_id,
+                    "content": _tool_result_content(result)
+                }
+
             # Extract server and bare tool name if namespaced
             if "__" in tool_name:
                 server_name, bare_tool_name = tool_name.split("__", 1)
@@ -185,13 +484,16 @@ class TeluguVermiFarmsClient:
                 server_name = "admin_agent"
                 bare_tool_name = tool_name
             
+            if deadline is not None and deadline.remaining() < TOOL_MIN_SECONDS:
+                return {"role": "tool", "tool_call_id": call_id, "content": TOOL_SKIPPED_CONTENT}
             client = await orchestrator.get_client(server_name)
-            result = await client.call_tool(bare_tool_name, args)
+            result = await client.call_tool(bare_tool_name, args, meta=_tool_meta(conversation_id, deadline),
+                                            timeout=deadline.remaining() if deadline else None)
             
             return {
                 "role": "tool",
                 "tool_call_id": call_id,
-                "content": str(result)
+                "content": _tool_result_content(result)
             }
         except Exception as e:
             error_msg = str(e)
@@ -208,168 +510,217 @@ class TeluguVermiFarmsClient:
                 "content": f"Error: {error_msg}"
             }
 
-    async def _execute_tool_calls(self, orchestrator: MCPOrchestrator, tool_calls: List[Any]):
-        """Execute multiple tool calls in parallel and return results."""
-        tasks = []
-        for tc in tool_calls:
-            tool_name = tc.function.name
-            args = json.loads(tc.function.arguments or "{}")
-            task = self._call_tool_safely(orchestrator, tool_name, args, tc.id)
-            tasks.append(task)
-        return await asyncio.gather(*tasks)
-
-    async def chat(self, history: List[dict], message: str, user_token: str = ""):
+    async def _execute_tool_calls(self, orchestrator: MCPOrchestrator, tool_calls: List[dict], prefetch: PrefetchSession = None,
+                                  on_event: EventSink = None, conversation_id: str = None, checkpoint: TurnCheckpoint = None,
+                                  deadline: Deadline = None):
+        """Execute multiple tool calls (OpenAI tool call dicts) in parallel and return results.
+        Calls whose result is already in the checkpoint are not run again; new results are checkpointed as they complete.
+        """
+        async def run(tc: dict):
+            done = checkpoint.result(tc["id"]) if checkpoint else None
+            if done is not None:
+                return done
+            args = json.loads(tc["function"]["arguments"] or "{}")
+            message = await self._call_tool_safely(orchestrator, tc["function"]["name"], args, tc["id"], prefetch, on_event,
+                                                   conversation_id, deadline)
+            if checkpoint and message["content"] != TOOL_SKIPPED_CONTENT:
+                checkpoint.add_result(tc["id"], message)
+            return message
+
+        return await asyncio.gather(*(run(tc) for tc in tool_calls))
+
+    async def _try_fast_path(self, message: str, conversation_id: str = None, deadline: Deadline = None):
+        """Answer simple count/lookup intents with one direct tool call and a template (no LLM).
+        Returns None whenever the match or the tool payload isn't clear-cut, so the LLM takes over.
+        """
+        intent = self.fast_path.match(message)
+        if intent is None:
+            return None
+        started = time.perf_counter()
+        try:
+            async with self._orchestrator_session() as orchestrator:
+                client = await orchestrator.get_client("admin_agent")
+                result = await client.call_tool(intent.tool, intent.args, timeout=deadline.remaining() if deadline else None)
+            answer = self.fast_path.render(intent, tool_result_payload(result))
+        except Exception as e:
+            print(f"⚡ Fast path {intent.name} failed, falling back to LLM: {e}")
+            return None
+        if not answer:
+            print(f"⚡ Fast path {intent.name} unsure of payload, falling back to LLM")
+            return None
+        print(f"⚡ Fast path {intent.name} answered in {(time.perf_counter() - started) * 1000:.1f} ms")
+        try:
+            self._persist_message({"role": "user", "content": message}, conversation_id)
+            self._persist_message({"role": "assistant", "content": answer}, conversation_id)
+        except Exception:
+            pass
+        return answer
+
+    async def chat(self, history: List[dict], message: str, user_token: str = "", conversation_id: str = None,
+                   on_event: EventSink = None, user_id: Any = None, request_id: str = None, deadline: Deadline = None):
         """
         Unified chat interface that selects the provider based on LLM_PROVIDER env var.
+        `on_event` receives tool progress events while the turn runs. Token usage is recorded
+        against `user_id` and the conversation; raises BudgetExceeded for users over budget
+        when BUDGET_ACTION=reject. With a `request_id` the tool loop is checkpointed, and a
+        retry of the same request resumes from (or returns the answer of) the earlier attempt.
+        `deadline` bounds the whole turn (TURN_DEADLINE_SECONDS from now if not given): LLM and
+        tool calls get the time left, and a turn running out of it answers with what it has.
         """
-        llm_provider = os.getenv("LLM_PROVIDER", "gemini").lower()
-        print(f"Using LLM Provider: {llm_provider}")
-        
-        if llm_provider == "openai":
-            return await self.chat_with_assistant_openai(history, message, user_token)
-        else:
-            return await self.chat_with_assistant_gemini(history, message, user_token)
+        deadline = deadline or Deadline.after(TURN_DEADLINE_SECONDS)
+        fast_answer = await self._try_fast_path(message, conversation_id, deadline)
+        if fast_answer:
+            return fast_answer
 
-    async def chat_with_assistant_openai(self, history: List[dict], message: str, user_token: str = ""):
+        llm_provider = configured_provider_name()
+        print(f"Using LLM Provider: {llm_provider}")
+        if request_id and user_id is not None:
+            request_id = f"{user_id}:{request_id}"  # one user can't pick up another's turn
+        checkpoint = self.checkpoints.begin(request_id, "openai" if llm_provider == "openai" else "gemini",
+                                            message, conversation_id)
+        if checkpoint.answer is not None:
+            print(f"♻️ Request {request_id} was already answered; returning the stored answer")
+            return checkpoint.answer
+
+        budget = self.usage.check_budget(user_id)
+        usage = TurnUsage(user_id, conversation_id)
+
+        async def track(event: dict) -> None:
+            if event.get("type") == "tool" and event.get("phase") == "start":
+                usage.tools.append(event.get("tool"))
+            await _emit(on_event, event)
+
+        route = self.router.route("openai" if llm_provider == "openai" else "gemini", message, history)
+        if budget == "downgrade":
+            route.cap("lite", "user is over the usage budget")
+            usage.downgraded = True
+        try:
+            if llm_provider == "openai":
+                response = await self.chat_with_assistant_openai(history, message, user_token, route=route, conversation_id=conversation_id,
+                                                                 on_event=track, usage=usage, checkpoint=checkpoint, deadline=deadline)
+            else:
+                response = await self.chat_with_assistant_gemini(history, message, user_token, route=route, conversation_id=conversation_id,
+                                                                 on_event=track, usage=usage, checkpoint=checkpoint, deadline=deadline)
+        finally:
+            # Cancelled or failed turns still spent tokens
+            self.usage.record_turn(usage)
+        # Outcome line pairs with the decision line above for routing tuning
+        print(f"🧭 Route outcome: {json.dumps({**route.to_dict(), 'answered': bool(response)}, ensure_ascii=False)}")
+        return response
+
+    async def chat_with_assistant_openai(self, history: List[dict], message: str, user_token: str = "", route: ModelRoute = None, conversation_id: str = None,
+                                         on_event: EventSink = None, usage: TurnUsage = None, checkpoint: TurnCheckpoint = None,
+                                         deadline: Deadline = None):
+        route = route or self.router.route("openai", message, history)
+        checkpoint = checkpoint or self.checkpoints.begin(None, "openai", message, conversation_id)
+        deadline = deadline or Deadline.after(TURN_DEADLINE_SECONDS)
+        prefetch = None
         try:
-            async with MCPOrchestrator() as orchestrator:
-                messages = []
+            async with self._orchestrator_session() as orchestrator:
                 tools_specs = await orchestrator.get_all_tools_specs()
-                messages.append({"role": "system", "content": system_prompt})
-                if len(history) > 0:
-                    messages.extend(history)
-                messages.append({"role": "user", "content": message})
-                
-                # Persist user message
-                try:
-                    self.redis_client.add_message({"role": "user", "content": message})
-                except Exception:
-                    pass
-
-                response = self.client.chat.completions.create(
-                    max_tokens=1000,
-                    tools=self.get_tools_from_specs(tools_specs),
-                    model="gpt-4o",
-                    tool_choice="auto",
-                    messages=messages
-                )
-                
-                message_obj = response.choices[0].message
-                
-                if message_obj.tool_calls:
-                    # Include the assistant message that initiated the tool calls
-                    assistant_msg_dict = {
-                        "role": "assistant",
-                        "content": message_obj.content or "",
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": tc.type,
-                                "function": {
-                                    "name": tc.function.name,
-                                    "arguments": tc.function.arguments
-                                }
-                            } for tc in message_obj.tool_calls
-                        ]
-                    }
-                    messages.append(assistant_msg_dict)
-                    
-                    # Persist assistant message with tool calls
+                if checkpoint.transcript is not None:
+                    # An earlier attempt of this request got this far; its messages are already persisted
+                    messages = checkpoint.transcript
+                    print(f"♻️ [OpenAI] Resuming request {checkpoint.request_id} after {checkpoint.iteration} LLM call(s), "
+                          f"{len(checkpoint.results)}/{len(checkpoint.pending)} pending tool call(s) done")
+                else:
+                    # Likely read-only calls run concurrently with the first completion
+                    prefetch = self.prefetcher.start(orchestrator, message, tools_specs,
+                                                     _tool_meta(conversation_id, deadline), deadline)
+                    messages = [{"role": "system", "content": system_prompt}]
+                    messages.extend(self.transcripts.transcript("openai", conversation_id, history or []))
+                    messages.append({"role": "user", "content": message})
+
+                    # Persist user message
                     try:
-                        self.redis_client.add_message(assistant_msg_dict)
-                    except Exception as e:
-                        print(f"Error persisting openai tool call: {e}")
-
-                    tool_messages = await self._execute_tool_calls(orchestrator, list(message_obj.tool_calls))
-                    messages.extend(tool_messages)
-                    
-                    # Persist tool results
-                    for tool_msg in tool_messages:
-                        try:
-                            self.redis_client.add_message(tool_msg)
-                        except Exception:
-                            pass
+                        self._persist_message({"role": "user", "content": message}, conversation_id)
+                    except Exception:
+                        pass
 
-                    iterations = 0
-                    while iterations < self.MAX_ITERATIONS:
-                        iterations += 1
-                        follow_up_response = self.client.chat.completions.create(
+                while True:
+                    if not checkpoint.pending:
+                        # The first completion plus up to MAX_ITERATIONS follow-ups
+                        if checkpoint.iteration > self.MAX_ITERATIONS:
+                            print("Reached the maximum number of iterations for tool calls.")
+                            final_msg = "I've completed all the required actions. Is there anything else I can help you with?"
+                            try:
+                                self._persist_message({"role": "assistant", "content": final_msg}, conversation_id)
+                            except Exception:
+                                pass
+                            checkpoint.finish(final_msg)
+                            return final_msg
+
+                        wrap_up = deadline.running_low()
+                        if wrap_up:
+                            print(f"⏳ [OpenAI] {deadline}; asking for a best-effort answer")
+                            messages.append({"role": "system", "content": WRAP_UP_INSTRUCTION})
+                        response = await self._openai_completion(
+                            route,
+                            usage,
+                            deadline,
                             max_tokens=1000,
                             tools=self.get_tools_from_specs(tools_specs),
-                            model="gpt-4o",
-                            tool_choice="auto",
+                            tool_choice="none" if wrap_up else "auto",
                             messages=messages
                         )
-                        follow_up_message = follow_up_response.choices[0].message
-                        
-                        if follow_up_message.tool_calls:
-                            print(f"🔧 [OpenAI] Executing {len(follow_up_message.tool_calls)} tool call(s)...")
-                            
-                            assistant_followup_dict = {
-                                "role": "assistant",
-                                "content": follow_up_message.content or "",
-                                "tool_calls": [
-                                    {
-                                        "id": tc.id,
-                                        "type": tc.type,
-                                        "function": {
-                                            "name": tc.function.name,
-                                            "arguments": tc.function.arguments
-                                        }
-                                    } for tc in follow_up_message.tool_calls
-                                ]
-                            }
-                            messages.append(assistant_followup_dict)
-                            
-                            try:
-                                self.redis_client.add_message(assistant_followup_dict)
-                            except Exception:
-                                pass
+                        checkpoint.iteration += 1
+                        message_obj = response.choices[0].message
 
-                            additional_tool_messages = await self._execute_tool_calls(orchestrator, list(follow_up_message.tool_calls))
-                            messages.extend(additional_tool_messages)
-                            
-                            for tool_msg in additional_tool_messages:
-                                try:
-                                    self.redis_client.add_message(tool_msg)
-                                except Exception:
-                                    pass
-                        else:
-                            print('[OpenAI] No tool calls in follow up message')
-                            final_content = follow_up_message.content or ""
-                            messages.append({
-                                "role": "assistant",
-                                "content": final_content
-                            })
-                            
+                        if not message_obj.tool_calls:
+                            final_content = message_obj.content or ""
+                            # Length only: answers carry customer details
+                            print(f"🤖 [OpenAI] Answered ({len(final_content)} chars)")
                             try:
-                                self.redis_client.add_message({"role": "assistant", "content": final_content})
+                                self._persist_message({"role": "assistant", "content": final_content}, conversation_id)
                             except Exception:
                                 pass
-                                
+                            checkpoint.finish(final_content)
                             return final_content
+
+                        print(f"🔧 [OpenAI] Executing {len(message_obj.tool_calls)} tool call(s)...")
+                        # Include the assistant message that initiated the tool calls
+                        assistant_msg_dict = {
+                            "role": "assistant",
+                            "content": message_obj.content or "",
+                            "tool_calls": [_tool_call_dict(tc) for tc in message_obj.tool_calls]
+                        }
+                        messages.append(assistant_msg_dict)
+                        checkpoint.llm_response(messages, assistant_msg_dict["tool_calls"])
+
+                    # The message that asked for this batch (also when resuming from a checkpoint)
+                    assistant_msg_dict = messages[-1]
+                    if deadline.running_low():
+                        # No time for this batch; the next completion answers without it
+                        print(f"⏳ [OpenAI] {deadline}; skipping {len(checkpoint.pending)} tool call(s)")
+                        tool_messages = [checkpoint.result(tc["id"]) or {"role": "tool", "tool_call_id": tc["id"], "content": TOOL_SKIPPED_CONTENT}
+                                         for tc in checkpoint.pending]
                     else:
-                        print("Reached the maximum number of iterations for tool calls.")
-                        final_msg = "I've completed all the required actions. Is there anything else I can help you with?"
+                        tool_messages = await self._execute_tool_calls(orchestrator, checkpoint.pending, prefetch, on_event,
+                                                                       conversation_id, checkpoint, deadline)
+                    messages.extend(tool_messages)
+                    self._escalate_on_tool_errors(route, tool_messages)
+
+                    # Persist the tool calls together with their results: a turn cancelled mid-batch
+                    # must not leave a tool_calls message without tool replies, which OpenAI rejects
+                    for msg in [assistant_msg_dict, *tool_messages]:
                         try:
-                            self.redis_client.add_message({"role": "assistant", "content": final_msg})
-                        except Exception:
-                            pass
-                        return final_msg
-                else:
-                    final_content = message_obj.content or ""
-                    print(f"\n🤖 [OpenAI] Assistant: {final_content}")
-                    try:
-                        self.redis_client.add_message({"role": "assistant", "content": final_content})
-                    except Exception:
-                        pass
-                    return final_content
+                            self._persist_message(msg, conversation_id)
+                        except Exception as e:
+                            print(f"Error persisting openai tool call: {e}")
+                    checkpoint.tools_done(messages)
         except Exception as e:
             print(f"Error: {e}")
             return None
+        finally:
+            if prefetch is not None:
+                prefetched = prefetch.finish()
+                if usage is not None and prefetched["started"]:
+                    usage.prefetch = prefetched
 
 
-    async def chat_with_assistant_gemini(self, history: List[dict], message: str, user_token: str = ""):
+    async def chat_with_assistant_gemini(self, history: List[dict], message: str, user_token: str = "", route: ModelRoute = None, conversation_id: str = None,
+                                         on_event: EventSink = None, usage: TurnUsage = None, checkpoint: TurnCheckpoint = None,
+                                         deadline: Deadline = None):
         """Gemini-based version of chat_with_assistant with tool calls via MCP.
         Uses Redis to persist and retrieve conversation history.
         
@@ -377,73 +728,47 @@ class TeluguVermiFarmsClient:
             history: Chat history
             message: User message
             user_token: JWT token for authentication with backend API
+            route: Model routing decision (computed from the message if not given)
+            conversation_id: Conversation whose Redis history is appended to
+            on_event: Optional async callback for tool progress events
+            usage: Token usage of this turn (each Gemini call is added to it)
+            checkpoint: Loop state of this request; resumed from when an earlier attempt left one
+            deadline: When the turn must be answered by; close to it no more tools are run
         """
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        route = route or self.router.route("gemini", message, history)
+        checkpoint = checkpoint or self.checkpoints.begin(None, "gemini", message, conversation_id)
+        deadline = deadline or Deadline.after(TURN_DEADLINE_SECONDS)
+        prefetch = None
         try:
-            genai.configure(api_key=api_key)
-            model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
-
-            print(f"Querying Gemini with model: {model_name}")
+            # Load (import + configure) the Gemini SDK inside the try so setup errors are reported below
+            self.providers.get("gemini")
+            print(f"Querying Gemini with {route.tier} tier: {route.candidates()[:1]}")
             
-            async with MCPOrchestrator() as orchestrator:
+            async with self._orchestrator_session() as orchestrator:
                 print("Getting tool specs from orchestrator...")
                 tools_specs = await orchestrator.get_all_tools_specs()
                 print(f"Got {len(tools_specs)} tool specs")
                 gemini_tools = self.get_gemini_tools_from_specs(tools_specs)
 
-                # model initialization removed as it's done per-request in retry loop
-                # try:
-                #     model = genai.GenerativeModel(model_name, tools=gemini_tools)
-                #     print("Gemini model initialized successfully")
-                # except Exception as model_err:
-                #     print(f"Failed to initialize Gemini model: {model_err}")
-                #     return None
-
-                contents.append({"role": "user", "parts": [{"text": system_prompt}]})
-                for msg in (history or [])[-50:]:
-                    role = msg.get("role")
-                    if role in ("user", "assistant"):
-                        # If this is an assistant function_call record without content, skip textual echo
-                        if role == "assistant" and msg.get("function_call") and not msg.get("content"):
-                            continue
-                        text = msg.get("content", "")
-                        if not isinstance(text, str):
-                            try:
-                                text = json.dumps(text, ensure_ascii=False)
-                            except Exception:
-                                text = str(text)
-                        if not text:
-                            continue
-                        if role == "assistant":
-                            contents.append({"role": "model", "parts": [{"text": text}]})
-                        else:
-                            contents.append({"role": "user", "parts": [{"text": text}]})
-                    elif role == "tool":
-                        # Map stored tool result back into Gemini function_response part
-                        tool_name = msg.get("name") or msg.get("tool_name")
-                        tool_content = msg.get("structured_response")
-                        if tool_content is None:
-                            raw_tool_content = msg.get("content", "")
-                            try:
-                                tool_content = json.loads(raw_tool_content)
-                            except Exception:
-                                tool_content = {"content": raw_tool_content}
-                        contents.append({
-                            "role": "user",
-                            "parts": [{
-                                "function_response": {
-                                    "name": tool_name,
-                                    "response": tool_content
-                                }
-                            }]
-                        })
+                if checkpoint.transcript is not None:
+                    # An earlier attempt of this request got this far; its messages are already persisted
+                    contents = checkpoint.transcript
+                    print(f"♻️ Resuming Gemini request {checkpoint.request_id} after {checkpoint.iteration} LLM call(s), "
+                          f"{len(checkpoint.results)}/{len(checkpoint.pending)} pending tool call(s) done")
+                else:
+                    # Likely read-only calls run concurrently with the first generate_content
+                    prefetch = self.prefetcher.start(orchestrator, message, tools_specs,
+                                                     _tool_meta(conversation_id, deadline), deadline)
+                    contents = [{"role": "user", "parts": [{"text": system_prompt}]}]
+                    contents.extend(self.transcripts.transcript("gemini", conversation_id, history or [], window=50))
+
+                    contents.append({"role": "user", "parts": [{"text": message}]})
+                    # Persist user message in Redis
+                    try:
+                        self._persist_message({"role": "user", "content": message}, conversation_id)
+                    except Exception:
+                        pass
 
-                contents.append({"role": "user", "parts": [{"text": message}]})
-                # Persist user message in Redis
-                try:
-                    self.redis_client.add_message({"role": "user", "content": message})
-                except Exception:
-                    pass
                 def extract_function_calls(gen_result: Any):
                     calls = []
                     try:
@@ -467,62 +792,77 @@ class TeluguVermiFarmsClient:
                         pass
                     return calls
 
-                # First turn
-                print("Sending request to Gemini...")
-                result = await self._generate_content_with_fallback(contents, gemini_tools)
-                
-                if not result:
-                     print("Failed to get response from any model")
-                     return None
-
-                print("Received response from Gemini")
-
-                iterations = 0
-                while iterations < self.MAX_ITERATIONS:
-                    iterations += 1
-                    function_calls = extract_function_calls(result)
-                    
-                    if function_calls:
-                        print(f"Gemini requested {len(function_calls)} tool calls")
-                    else:
-                        print("No tool calls requested by Gemini")
+                def tool_args(raw_args: Any) -> dict:
+                    try:
+                        if isinstance(raw_args, str):
+                            return json.loads(raw_args or "{}")
+                        # Plain dicts/lists (not SDK map types) so the call can be checkpointed
+                        return _plain(raw_args or {})
+                    except Exception:
+                        return {}
+
+                while True:
+                    if not checkpoint.pending:
+                        # First turn, or ask model to continue with the new tool results
+                        print("Sending request to Gemini...")
+                        tool_config = None
+                        if deadline.running_low():
+                            print(f"⏳ Gemini turn: {deadline}; asking for a best-effort answer")
+                            contents.append({"role": "user", "parts": [{"text": WRAP_UP_INSTRUCTION}]})
+                            tool_config = {"function_calling_config": {"mode": "NONE"}}
+                        result = await self._generate_content_with_fallback(contents, gemini_tools, route, usage, deadline, tool_config)
+                        if not result:
+                            print("Failed to get response from any model")
+                            return None
+                        checkpoint.iteration += 1
+                        print("Received response from Gemini")
+
+                        function_calls = extract_function_calls(result)
+                        if not function_calls:
+                            print("No tool calls requested by Gemini")
+                            # No tool calls; return model text (safely)
+                            text = _gemini_result_text(result)
+                            if text:
+                                try:
+                                    self._persist_message({"role": "assistant", "content": text}, conversation_id)
+                                except Exception:
+                                    pass
+                            checkpoint.finish(text or None)
+                            return text or None
 
-                    if not function_calls:
-                        # No tool calls; return model text (safely)
-                        text = _gemini_result_text(result)
-                        if text:
-                            try:
-                                self.redis_client.add_message({"role": "assistant", "content": text})
-                            except Exception:
-                                pass
-                            return text
-                        return None
+                        print(f"Gemini requested {len(function_calls)} tool calls")
+                        # The first call plus up to MAX_ITERATIONS - 1 follow-ups may request tools
+                        if checkpoint.iteration > self.MAX_ITERATIONS:
+                            checkpoint.finish(None)
+                            return None
+                        checkpoint.llm_response(contents, [
+                            {"id": f"{checkpoint.iteration}:{i}", "name": fc.get("name"), "args": tool_args(fc.get("args"))}
+                            for i, fc in enumerate(function_calls)
+                        ])
 
                     # Execute tool calls and append function responses
                     function_response_messages = []
-                    for fc in function_calls:
+                    for fc in checkpoint.pending:
                         tool_name = fc.get("name")
-                        raw_args = fc.get("args")
-                        try:
-                            if isinstance(raw_args, str):
-                                args_dict = json.loads(raw_args or "{}")
-                            else:
-                                args_dict = raw_args or {}
-                        except Exception:
-                            args_dict = {}
+                        args_dict = fc.get("args") or {}
+                        tool_content = checkpoint.result(fc["id"])
 
-                        # Persist assistant function call (serialized) in Redis
-                        try:
-                            self.redis_client.add_message({
-                                "role": "assistant",
-                                "function_call": {"name": tool_name, "args": args_dict}
-                            })
-                        except Exception:
-                            pass
-
-                        # Execute tool safely via MCP
-                        tool_result_msg = await self._call_tool_safely(orchestrator, tool_name or "", args_dict, tool_name or "call")
-                        tool_content = tool_result_msg.get("content", "")
+                        if tool_content is None:
+                            if deadline.running_low():
+                                # No time left to run it; the next call answers without it
+                                print(f"⏳ Gemini turn: {deadline}; skipping {tool_name}")
+                                tool_content = TOOL_SKIPPED_CONTENT
+                            else:
+                                # Execute tool safely via MCP
+                                tool_result_msg = await self._call_tool_safely(orchestrator, tool_name or "", args_dict, tool_name or "call", prefetch,
+                                                                               on_event, conversation_id, deadline)
+                                tool_content = tool_result_msg.get("content", "")
+                                self._escalate_on_tool_errors(route, [tool_result_msg])
+                                if tool_content != TOOL_SKIPPED_CONTENT:
+                                    checkpoint.add_result(fc["id"], tool_content)
+                            persist = True
+                        else:
+                            persist = False  # done (and persisted) by an earlier attempt
 
                         # Try to parse content as JSON for structured response
                         structured_response = None
@@ -541,29 +881,34 @@ class TeluguVermiFarmsClient:
                             }]
                         })
 
-                        # Persist tool result in Redis for future context
-                        try:
-                            self.redis_client.add_message({
-                                "role": "tool",
-                                "name": tool_name,
-                                "content": tool_content,
-                                "structured_response": structured_response
-                            })
-                        except Exception:
-                            pass
+                        # Persist the function call and its result together, so a turn cancelled while
+                        # the tool runs doesn't leave a call without a response in history
+                        if persist:
+                            try:
+                                self._persist_message({
+                                    "role": "assistant",
+                                    "function_call": {"name": tool_name, "args": args_dict}
+                                }, conversation_id)
+                                self._persist_message({
+                                    "role": "tool",
+                                    "name": tool_name,
+                                    "content": tool_content,
+                                    "structured_response": structured_response
+                                }, conversation_id)
+                            except Exception:
+                                pass
 
                     contents.extend(function_response_messages)
-                    # Ask model to continue with the new tool results
-                    result = await self._generate_content_with_fallback(contents, gemini_tools)
-                    if not result:
-                        print("Failed to get response during tool loop")
-                        return None
-                
-                return None
+                    checkpoint.tools_done(contents)
 
         except Exception as e:
             print(f"Error with Gemini tool-chat: {e}")
             return None
+        finally:
+            if prefetch is not None:
+                prefetched = prefetch.finish()
+                if usage is not None and prefetched["started"]:
+                    usage.prefetch = prefetched
 
 
     async def run_chat(self):
@@ -593,7 +938,7 @@ class TeluguVermiFarmsClient:
                     messages.append({"role": "user", "content": user_input})
                     self.conversation_history.append({"role": "user", "content": user_input})
                     tools_specs = await orchestrator.get_all_tools_specs()
-                    response = self.client.chat.completions.create(
+                    response = await self.client.chat.completions.create(
                     max_tokens=1000,
                     tools=self.get_tools_from_specs(tools_specs),
                     model="gpt-4o",
@@ -610,7 +955,7 @@ class TeluguVermiFarmsClient:
                         for tool in message.tool_calls:
                             print(f"Tool Call : {tool}")
                         print(f"🔧 Executing {len(message.tool_calls)} tool call(s)...")
-                        tool_messages = await self._execute_tool_calls(orchestrator, list(message.tool_calls))
+                        tool_messages = await self._execute_tool_calls(orchestrator, [_tool_call_dict(tc) for tc in message.tool_calls])
                         self.conversation_history.extend(tool_messages)
 
                         iterations = 0
@@ -618,7 +963,7 @@ class TeluguVermiFarmsClient:
                             iterations += 1
                             follow_up_messages = [{"role": "system", "content": system_prompt}]
                             follow_up_messages.extend(self.conversation_history)
-                            follow_up_response = self.client.chat.completions.create(
+                            follow_up_response = await self.client.chat.completions.create(
                                 max_tokens=1000,
                                 tools=self.get_tools_from_specs(tools_specs),
                                 model="gpt-4o",
@@ -627,7 +972,7 @@ class TeluguVermiFarmsClient:
                             follow_up_message = follow_up_response.choices[0].message
                             if follow_up_message.tool_calls:
                                 print(f"🔧 Executing {len(follow_up_message.tool_calls)} tool call(s)...")
-                                additional_tool_messages = await self._execute_tool_calls(orchestrator, list(follow_up_message.tool_calls))
+                                additional_tool_messages = await self._execute_tool_calls(orchestrator, [_tool_call_dict(tc) for tc in follow_up_message.tool_calls])
                                 print('Additional Tool Messages : ',additional_tool_messages)
                                 self.conversation_history.append({
                                     "role": "assistant",
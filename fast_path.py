@@ -0,0 +1,188 @@
+"""
+Deterministic fast path for simple count / lookup questions - answers without calling the LLM
+
+Only messages that match one of the anchored patterns below with nothing else in them are
+handled here; anything with extra constraints (dates, customers, follow-ups) goes to the LLM.
+"""
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+ORDER_STATUSES = {"pending": 1, "confirmed": 2, "shipped": 3, "delivered": 4, "cancelled": 5, "canceled": 5}
+STATUS_NAMES = {1: "pending", 2: "confirmed", 3: "shipped", 4: "delivered", 5: "cancelled"}
+COUNT_LABELS = {
+    "orders_count": ("order", "orders"),
+    "enquiries_count": ("enquiry", "enquiries"),
+    "products_count": ("product", "products"),
+}
+
+_POLITE = r"(?:please\s+|pls\s+|can you\s+|could you\s+|tell me\s+|show me\s+)*"
+_END = r"\s*(?:please|pls)?\s*[?.!]*\s*$"
+_STATUS = r"(?P<status>pending|confirmed|shipped|delivered|cancell?ed|canceled)"
+
+ORDERS_COUNT = [
+    # "how many pending orders", "how many orders are pending"
+    re.compile(r"^" + _POLITE + r"how many\s+(?:" + _STATUS + r"\s+)?orders(?:\s+(?:are|do we have|are there|we have|in total|total))*(?:\s+(?P<status_after>pending|confirmed|shipped|delivered|cancell?ed|canceled))?" + _END),
+    re.compile(r"^" + _POLITE + r"(?:total\s+)?(?:number of|count of|no\.? of)\s+(?:" + _STATUS + r"\s+)?orders" + _END),
+    re.compile(r"^" + _POLITE + r"(?:" + _STATUS + r"\s+)?orders?\s+count" + _END),
+]
+ENQUIRIES_COUNT = [
+    re.compile(r"^" + _POLITE + r"how many\s+(?:enquir(?:y|ies)|inquir(?:y|ies))(?:\s+(?:are|do we have|are there|we have|in total|total))*" + _END),
+    re.compile(r"^" + _POLITE + r"(?:total\s+)?(?:number of|count of|no\.? of)\s+(?:enquir(?:y|ies)|inquir(?:y|ies))" + _END),
+    re.compile(r"^" + _POLITE + r"(?:enquir(?:y|ies)|inquir(?:y|ies))\s+count" + _END),
+]
+PRODUCTS_COUNT = [
+    re.compile(r"^" + _POLITE + r"how many\s+products(?:\s+(?:are|do we have|are there|we have|in total|total))*" + _END),
+    re.compile(r"^" + _POLITE + r"(?:total\s+)?(?:number of|count of|no\.? of)\s+products" + _END),
+    re.compile(r"^" + _POLITE + r"products?\s+count" + _END),
+]
+# Shape of an order unique ID: ORD-2025-ABC, or the older letters-then-digits form like ABC123.
+# Anything else, such as the quantity in "order 5000kg", is left to the LLM.
+ORDER_ID_PATTERN = os.getenv("ORDER_ID_PATTERN", r"ORD-\d{4}-[A-Z0-9]{3,}|[A-Z]{2,5}\d{3,}")
+# "show order ORD-2025-ABC", "order details for ABC123", "details of order #ABC123"
+ORDER_DETAILS = [
+    re.compile(r"^" + _POLITE + r"(?:show|get|fetch|view|open)?\s*(?:the\s+)?(?:order\s+details?|details?\s+of\s+order|order)\s+(?:for\s+|of\s+)?#?(?P<order_id>" + ORDER_ID_PATTERN + r")" + _END, re.IGNORECASE),
+]
+
+
+class FastIntent:
+    def __init__(self, name: str, tool: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.tool = tool
+        self.args = args
+
+
+def _find_count(payload: Any) -> Optional[int]:
+    """Locate the count in a backend response such as {"success": true, "data": {"count": 3}}."""
+    if isinstance(payload, bool):
+        return None
+    if isinstance(payload, (int, float)):
+        return int(payload)
+    if isinstance(payload, dict):
+        for key in ("count", "total", "totalCount", "total_count"):
+            if key in payload and isinstance(payload[key], (int, float)) and not isinstance(payload[key], bool):
+                return int(payload[key])
+        for key in ("data", "result"):
+            if key in payload:
+                found = _find_count(payload[key])
+                if found is not None:
+                    return found
+    return None
+
+
+def _find_records(payload: Any) -> List[Dict[str, Any]]:
+    if isinstance(payload, list):
+        return [r for r in payload if isinstance(r, dict)]
+    if isinstance(payload, dict):
+        for key in ("data", "result", "orders", "rows"):
+            if key in payload:
+                records = _find_records(payload[key])
+                if records:
+                    return records
+    return []
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _table(rows: List[Dict[str, Any]]) -> str:
+    columns: List[str] = []
+    for row in rows:
+        for key, value in row.items():
+            if key not in columns and not isinstance(value, (dict, list)):
+                columns.append(key)
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join(_cell(row.get(c)) for c in columns) + " |")
+    return "\n".join(lines)
+
+
+class FastPath:
+    """Matches simple intents and renders templated Markdown answers from a single tool call."""
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("FAST_PATH", "on").lower() not in ("0", "off", "false")
+
+    def match(self, message: str) -> Optional[FastIntent]:
+        if not self.enabled or not message:
+            return None
+        text = " ".join(message.lower().split())
+        for pattern in ORDERS_COUNT:
+            m = pattern.match(text)
+            if m:
+                groups = m.groupdict()
+                status_word = groups.get("status") or groups.get("status_after")
+                args: Dict[str, Any] = {}
+                if status_word:
+                    args["status"] = ORDER_STATUSES["cancelled" if status_word.startswith("cancel") else status_word]
+                return FastIntent("orders_count", "get_orders_count", args)
+        for pattern in ENQUIRIES_COUNT:
+            if pattern.match(text):
+                return FastIntent("enquiries_count", "get_enquiries_count", {})
+        for pattern in PRODUCTS_COUNT:
+            if pattern.match(text):
+                return FastIntent("products_count", "get_products_count", {})
+        for pattern in ORDER_DETAILS:
+            m = pattern.match(text)
+            if m:
+                # Recover the ID's original casing from the raw message
+                raw = re.search(re.escape(m.group("order_id")), message, re.IGNORECASE)
+                order_id = raw.group(0) if raw else m.group("order_id").upper()
+                return FastIntent("order_details", "fetch_order_details", {"order_unique_ids_csv": order_id})
+        return None
+
+    def render(self, intent: FastIntent, payload: Any) -> Optional[str]:
+        """Markdown answer for the tool payload, or None when the payload isn't what we expect."""
+        if not isinstance(payload, (dict, list)) or (isinstance(payload, dict) and payload.get("error")):
+            return None
+        if intent.name in ("orders_count", "enquiries_count", "products_count"):
+            count = _find_count(payload)
+            if count is None:
+                return None
+            singular, plural = COUNT_LABELS[intent.name]
+            status = STATUS_NAMES.get(intent.args.get("status"))
+            label = singular if count == 1 else plural
+            if status:
+                label = f"{status} {label}"
+            return f"There {'is' if count == 1 else 'are'} **{count}** {label}."
+        if intent.name == "order_details":
+            orders = _find_records(payload)
+            if not orders:
+                return None
+            parts = []
+            for order in orders:
+                title = order.get("order_unique_id") or order.get("orderUniqueId") or intent.args["order_unique_ids_csv"]
+                scalars = {k: v for k, v in order.items() if not isinstance(v, (dict, list))}
+                parts.append(f"**Order {title}**\n\n| Field | Value |\n|---|---|\n" +
+                             "\n".join(f"| {k} | {_cell(v)} |" for k, v in scalars.items()))
+                for key, value in order.items():
+                    if isinstance(value, dict):
+                        parts.append(f"*{key}*\n\n" + _table([value]))
+                    elif isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+                        parts.append(f"*{key}*\n\n" + _table(value))
+            return "\n\n".join(parts)
+        return None
+
+
+def tool_result_payload(result: Any) -> Any:
+    """Structured payload of an MCP CallToolResult (falls back to parsing its text content)."""
+    structured = getattr(result, "structured_content", None)
+    if isinstance(structured, dict):
+        # FastMCP wraps non-object returns as {"result": ...}
+        if set(structured) == {"result"}:
+            return structured["result"]
+        return structured
+    for block in getattr(result, "content", None) or []:
+        text = getattr(block, "text", None)
+        if text:
+            try:
+                return json.loads(text)
+            except ValueError:
+                return None
+    return None
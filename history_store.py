@@ -0,0 +1,284 @@
+"""
+Chat history backends: Redis, a bounded in-process LRU, and Redis with in-memory failover
+
+HISTORY_BACKEND=redis (default) uses Redis and keeps hot conversations mirrored in memory.
+When Redis errors, a circuit breaker opens and history is served from / written to memory
+without waiting on Redis again; on recovery the messages written meanwhile are appended to
+Redis (after whatever other workers stored there in the meantime). HISTORY_BACKEND=memory skips Redis entirely (single-node deployments).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from circuit_breaker import CircuitBreaker, CLOSED
+from redis_client import (
+    RedisClient, MAX_HISTORY_MESSAGES, HISTORY_TTL_SECONDS, decode_message, encode_message, tail_after,
+)
+
+
+class MemoryHistory:
+    """LRU of encoded conversation histories, bounded by conversation count and total bytes."""
+
+    def __init__(self, max_conversations: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+        self.max_conversations = max_conversations or int(os.getenv("HISTORY_MEMORY_MAX_CONVERSATIONS", 1000))
+        self.max_bytes = max_bytes or int(os.getenv("HISTORY_MEMORY_MAX_BYTES", 64 * 1024 * 1024))
+        # conversation key -> (encoded entries, last write time)
+        self._conversations: "OrderedDict[str, Tuple[List[bytes], float]]" = OrderedDict()
+        # Write counter per conversation, like the Redis version key
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def ping(self) -> bool:
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _evict(self) -> None:
+        while self._conversations and (len(self._conversations) > self.max_conversations or self._bytes > self.max_bytes):
+            key, (entries, _) = self._conversations.popitem(last=False)
+            self._versions.pop(key, None)
+            self._bytes -= sum(len(e) for e in entries)
+
+    def _live_entries(self, key: str) -> List[bytes]:
+        """The conversation's entries (the stored list itself), dropping it if expired. Caller holds the lock."""
+        item = self._conversations.get(key)
+        if item is None:
+            return []
+        entries, written_at = item
+        if time.time() - written_at > HISTORY_TTL_SECONDS:
+            self._conversations.pop(key)
+            self._versions.pop(key, None)
+            self._bytes -= sum(len(e) for e in entries)
+            return []
+        self._conversations.move_to_end(key)
+        return entries
+
+    def get_entries(self, conversation_id: str = None) -> List[bytes]:
+        with self._lock:
+            return list(self._live_entries(conversation_id or ""))
+
+    def get_entries_versioned(self, conversation_id: str = None) -> Tuple[int, List[bytes]]:
+        key = conversation_id or ""
+        with self._lock:
+            entries = list(self._live_entries(key))
+            return self._versions.get(key, 0), entries
+
+    def get_entries_since(self, conversation_id: str, version: int,
+                          last_entry: Optional[bytes]) -> Tuple[int, Optional[List[bytes]]]:
+        """Entries written after `version`; see RedisClient.get_entries_since."""
+        key = conversation_id or ""
+        with self._lock:
+            entries = self._live_entries(key)
+            current = self._versions.get(key, 0)
+            new = current - version
+            if new == 0:
+                return current, []
+            if not 0 < new < MAX_HISTORY_MESSAGES:
+                return current, None
+            return current, tail_after(entries[-(new + (last_entry is not None)):], new, last_entry)
+
+    def replace_entries(self, entries: List[bytes], conversation_id: str = None) -> None:
+        key = conversation_id or ""
+        entries = list(entries[-MAX_HISTORY_MESSAGES:])
+        with self._lock:
+            old = self._conversations.pop(key, None)
+            if old is not None:
+                self._bytes -= sum(len(e) for e in old[0])
+            if entries:
+                self._conversations[key] = (entries, time.time())
+                self._bytes += sum(len(e) for e in entries)
+            # Past the trim window, so delta readers fall back to a full read
+            self._versions[key] = self._versions.get(key, 0) + MAX_HISTORY_MESSAGES
+            self._evict()
+
+    def add_entry(self, entry: bytes, conversation_id: str = None) -> int:
+        key = conversation_id or ""
+        with self._lock:
+            entries, _ = self._conversations.pop(key, ([], 0.0))
+            entries.append(entry)
+            self._bytes += len(entry)
+            while len(entries) > MAX_HISTORY_MESSAGES:
+                self._bytes -= len(entries.pop(0))
+            self._conversations[key] = (entries, time.time())
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+            self._evict()
+            return version
+
+    def add_message(self, msg: dict, conversation_id: str = None) -> int:
+        return self.add_entry(encode_message(msg), conversation_id)
+
+    def get_last_messages(self, conversation_id: str = None) -> List[dict]:
+        return [decode_message(m) for m in self.get_entries(conversation_id)]
+
+    def clear_history(self, conversation_id: str = None) -> None:
+        with self._lock:
+            if conversation_id:
+                old = self._conversations.pop(conversation_id, None)
+                self._versions.pop(conversation_id, None)
+                if old is not None:
+                    self._bytes -= sum(len(e) for e in old[0])
+            else:
+                self._conversations.clear()
+                self._versions.clear()
+                self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "memory", "memory_conversations": len(self), "memory_bytes": self.size_bytes}
+
+
+class FailoverHistory:
+    """Redis-backed history that keeps working from memory while Redis is unavailable."""
+
+    def __init__(self, primary: Optional[RedisClient] = None, fallback: Optional[MemoryHistory] = None,
+                 breaker: Optional[CircuitBreaker] = None) -> None:
+        self.primary = primary or RedisClient()
+        self.fallback = fallback or MemoryHistory()
+        self.breaker = breaker or CircuitBreaker(
+            "Redis history",
+            failure_threshold=int(os.getenv("HISTORY_BREAKER_FAILURES", 2)),
+            reset_timeout=float(os.getenv("HISTORY_BREAKER_RESET_SECONDS", 5.0)),
+        )
+        # Messages written only to memory while Redis was down, per conversation, oldest first
+        self._dirty: Dict[str, List[bytes]] = {}
+        self._dirty_lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self.primary.client
+
+    def ping(self) -> bool:
+        # Startup readiness still requires Redis itself, not the fallback
+        return self.primary.ping()
+
+    def _primary(self, method: str, *args):
+        """Call a Redis method through the breaker; raises (fast, if open) on failure."""
+        self.breaker.check()
+        try:
+            if self.breaker.state != CLOSED or self._dirty:
+                # Trial call after an outage (or a write that failed while the circuit stayed
+                # closed): append what Redis missed before anything reads or writes after it
+                self.resync()
+            result = getattr(self.primary, method)(*args)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _mark_dirty(self, entry: bytes, conversation_id: Optional[str]) -> None:
+        with self._dirty_lock:
+            self._dirty.setdefault(conversation_id or "", []).append(entry)
+
+    def resync(self) -> int:
+        """
+        Append the messages written only to memory during the outage to Redis. Returns how many
+        conversations were synced.
+
+        Only this process's own missed writes are sent: other workers may have appended to the
+        same conversations meanwhile, and overwriting Redis with this process's copy would lose them.
+        """
+        with self._dirty_lock:
+            dirty = self._dirty
+            self._dirty = {}
+        synced = 0
+        try:
+            for key in list(dirty):
+                self.primary.add_entries(dirty[key], key or None)
+                del dirty[key]
+                synced += 1
+        finally:
+            if dirty:
+                with self._dirty_lock:
+                    # Not sent: keep them ahead of anything written since
+                    for key, entries in dirty.items():
+                        self._dirty[key] = entries + self._dirty.get(key, [])
+        if synced:
+            print(f"🔁 Resynced {synced} conversation(s) to Redis")
+        return synced
+
+    def add_message(self, msg: dict, conversation_id: str = None) -> Optional[int]:
+        """Returns the conversation's Redis version after the write (None if only memory took it)."""
+        entry = encode_message(msg)
+        self.fallback.add_entry(entry, conversation_id)
+        if self.breaker.state != CLOSED:
+            # Queued for the resync, which appends it after anything written before it
+            self._mark_dirty(entry, conversation_id)
+            try:
+                self._primary("ping")
+            except Exception:
+                pass
+            return None
+        try:
+            return self._primary("add_entry", entry, conversation_id)
+        except Exception:
+            self._mark_dirty(entry, conversation_id)
+            return None
+
+    def _is_dirty(self, conversation_id: Optional[str]) -> bool:
+        with self._dirty_lock:
+            return (conversation_id or "") in self._dirty
+
+    def get_entries_versioned(self, conversation_id: str = None) -> Tuple[Optional[int], List[bytes]]:
+        """(Redis version, entries); the version is None when the entries came from memory."""
+        try:
+            version, entries = self._primary("get_entries_versioned", conversation_id)
+        except Exception:
+            return None, self.fallback.get_entries(conversation_id)
+        if self._is_dirty(conversation_id):
+            # A write failed after the resync above; memory is the newer copy
+            return None, self.fallback.get_entries(conversation_id)
+        # Redis is authoritative (other workers write too); refresh the mirror
+        self.fallback.replace_entries(entries, conversation_id)
+        return version, entries
+
+    def get_entries_since(self, conversation_id: str, version: int,
+                          last_entry: Optional[bytes]) -> Tuple[Optional[int], Optional[List[bytes]]]:
+        try:
+            current, entries = self._primary("get_entries_since", conversation_id, version, last_entry)
+        except Exception:
+            return None, None
+        if entries is None or self._is_dirty(conversation_id):
+            return None, None
+        # Written by other workers (this one's writes are in the mirror already)
+        for entry in entries:
+            self.fallback.add_entry(entry, conversation_id)
+        return current, entries
+
+    def get_last_messages(self, conversation_id: str = None) -> List[dict]:
+        _, entries = self.get_entries_versioned(conversation_id)
+        return [decode_message(m) for m in entries]
+
+    def clear_history(self, conversation_id: str = None) -> None:
+        self.fallback.clear_history(conversation_id)
+        with self._dirty_lock:
+            if conversation_id:
+                self._dirty.pop(conversation_id, None)
+            else:
+                self._dirty.clear()
+        if self.breaker.state == CLOSED:
+            self.primary.clear_history(conversation_id)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": "redis",
+            **self.breaker.stats(),
+            "memory_conversations": len(self.fallback),
+            "memory_bytes": self.fallback.size_bytes,
+            "pending_resync": len(self._dirty),
+        }
+
+
+def create_history_store():
+    """History backend selected by HISTORY_BACKEND (redis | memory)."""
+    backend = os.getenv("HISTORY_BACKEND", "redis").lower()
+    if backend == "memory":
+        print("🗂️ Chat history kept in process memory (HISTORY_BACKEND=memory)")
+        return MemoryHistory()
+    return FailoverHistory()
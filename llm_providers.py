@@ -0,0 +1,62 @@
+"""
+LLM provider plugins - each provider's SDK is imported only when that provider is first used
+"""
+import os
+from typing import Any, Callable, Dict
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self) -> None:
+        from openai import AsyncOpenAI
+        # Async client so cancelling a turn also aborts the in-flight HTTP request
+        self.client = AsyncOpenAI(api_key=os.getenv("OPEN_AI_API_KEY"))
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self) -> None:
+        from google import generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"))
+        self.genai = genai
+
+    def model(self, model_name: str, tools: Any = None) -> Any:
+        return self.genai.GenerativeModel(model_name, tools=tools)
+
+
+# name -> factory; register new providers here
+PROVIDERS: Dict[str, Callable[[], Any]] = {
+    OpenAIProvider.name: OpenAIProvider,
+    GeminiProvider.name: GeminiProvider,
+}
+
+
+def configured_provider_name() -> str:
+    return os.getenv("LLM_PROVIDER", "gemini").lower()
+
+
+class ProviderRegistry:
+    """Lazily instantiates providers; nothing is imported until get() is called."""
+
+    def __init__(self) -> None:
+        self._instances: Dict[str, Any] = {}
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            factory = PROVIDERS.get(name)
+            if factory is None:
+                raise ValueError(f"Unknown LLM provider: {name}")
+            instance = factory()
+            self._instances[name] = instance
+        return instance
+
+    def configured(self) -> Any:
+        """Return the provider selected by LLM_PROVIDER (falls back to gemini like chat())."""
+        name = configured_provider_name()
+        return self.get(name if name in PROVIDERS else GeminiProvider.name)
+
+    def loaded(self) -> list[str]:
+        return list(self._instances)
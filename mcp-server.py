@@ -1,6 +1,19 @@
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_context
 import requests
 import json
+import time
+import hashlib
+import inspect
+import random
+import functools
+import tempfile
+import threading
+import redis
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED
+from product_index import ProductIndex
+from order_index import OrderIndex, order_row
+from sales_analytics import SalesData
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
@@ -17,12 +30,150 @@ API_BASE_URL = os.getenv("SERVER_URL", "http://localhost:3000") + "/api"
 _API_KEY: Optional[str] = None
 _API_KEY_EXPIRES_AT: Optional[str] = None
 
+# =============================================================================
+# BACKEND HTTP
+# =============================================================================
+# All backend calls go through backend_request: each route (first path segment, e.g.
+# "order") has its own circuit breaker and a bulkhead capping concurrent requests, and
+# idempotent GETs are retried with jittered exponential backoff on transient failures.
+
+BACKEND_TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", 10))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", 2))
+BACKEND_BACKOFF_BASE_SECONDS = float(os.getenv("BACKEND_BACKOFF_BASE_SECONDS", 0.2))
+BACKEND_BACKOFF_MAX_SECONDS = float(os.getenv("BACKEND_BACKOFF_MAX_SECONDS", 2.0))
+BACKEND_BREAKER_FAILURES = int(os.getenv("BACKEND_BREAKER_FAILURES", 5))
+BACKEND_BREAKER_RESET_SECONDS = float(os.getenv("BACKEND_BREAKER_RESET_SECONDS", 15))
+BACKEND_MAX_CONCURRENCY = int(os.getenv("BACKEND_MAX_CONCURRENCY", 8))
+# How long a call waits for a bulkhead slot before giving up
+BACKEND_BULKHEAD_WAIT_SECONDS = float(os.getenv("BACKEND_BULKHEAD_WAIT_SECONDS", 2))
+
+RETRYABLE_METHODS = {"GET", "HEAD"}
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+class BackendUnavailableError(requests.exceptions.RequestException):
+    """Raised without calling the backend (circuit open or bulkhead full)"""
+
+class BackendRoute:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.breaker = CircuitBreaker(f"Backend /{name}", failure_threshold=BACKEND_BREAKER_FAILURES,
+                                      reset_timeout=BACKEND_BREAKER_RESET_SECONDS)
+        self.bulkhead = threading.BoundedSemaphore(BACKEND_MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def stats(self) -> dict:
+        return {**self.breaker.stats(), "in_flight": self.in_flight, "rejected": self.rejected, "retries": self.retries}
+
+_backend_routes: Dict[str, BackendRoute] = {}
+_backend_routes_lock = threading.Lock()
+
+def backend_route(path: str) -> BackendRoute:
+    name = path.lstrip("/").split("?", 1)[0].split("/", 1)[0] or "root"
+    with _backend_routes_lock:
+        if name not in _backend_routes:
+            _backend_routes[name] = BackendRoute(name)
+        return _backend_routes[name]
+
+def backoff_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After if the backend sent one"""
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), BACKEND_BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKEND_BACKOFF_MAX_SECONDS, BACKEND_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def request_meta(key: str) -> Any:
+    """A field of the _meta the agent sent with the current tool call (None outside a tool call)"""
+    try:
+        meta = get_context().request_context.meta
+    except Exception:
+        return None
+    if isinstance(meta, dict):
+        return meta.get(key)
+    return getattr(meta, key, None)
+
+def current_turn_deadline() -> Optional[float]:
+    """Epoch time at which the agent turn behind this tool call gives up (None if it sent none)"""
+    try:
+        return float(request_meta("deadline"))
+    except (TypeError, ValueError):
+        return None
+
+def seconds_left(deadline: Optional[float]) -> float:
+    return float("inf") if deadline is None else max(0.0, deadline - time.time())
+
+def can_retry(route: BackendRoute, attempt: int, attempts: int, deadline: Optional[float] = None) -> bool:
+    # Once the circuit has opened, waiting for another attempt is pointless; so is
+    # backing off past the deadline of the turn that is waiting for this call
+    return (attempt + 1 < attempts and route.breaker.state == CLOSED
+            and seconds_left(deadline) > BACKEND_BACKOFF_MAX_SECONDS)
+
+def backend_request(method: str, path: str, **kwargs) -> requests.Response:
+    """
+    Call the backend at API_BASE_URL + path. Returns the response like requests.request
+    (callers still raise_for_status); raises BackendUnavailableError when the route's
+    circuit is open or its bulkhead is full. Inside a tool call that carries the agent turn's
+    deadline, timeouts, bulkhead waits and retries are cut to the time that turn has left.
+    """
+    method = method.upper()
+    route = backend_route(path)
+    timeout = kwargs.pop("timeout", BACKEND_TIMEOUT_SECONDS)
+    attempts = 1 + (BACKEND_RETRIES if method in RETRYABLE_METHODS else 0)
+    deadline = current_turn_deadline()
+    if seconds_left(deadline) <= 0:
+        raise BackendUnavailableError("The request ran out of time before the backend was called")
+
+    if not route.bulkhead.acquire(timeout=min(BACKEND_BULKHEAD_WAIT_SECONDS, seconds_left(deadline))):
+        route.rejected += 1
+        raise BackendUnavailableError(f"Backend /{route.name} is busy ({BACKEND_MAX_CONCURRENCY} requests in flight)")
+    route.in_flight += 1
+    try:
+        for attempt in range(attempts):
+            try:
+                route.breaker.check()
+            except CircuitOpenError as e:
+                raise BackendUnavailableError(f"Backend temporarily unavailable: {e}") from e
+            try:
+                # requests rejects a zero timeout; a retry can start with a sliver of the budget left
+                response = requests.request(method, f"{API_BASE_URL}{path}",
+                                            timeout=max(0.5, min(timeout, seconds_left(deadline))), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                route.breaker.record_failure(e)
+                if not can_retry(route, attempt, attempts, deadline):
+                    raise
+                delay = backoff_delay(attempt)
+            except BaseException as e:
+                # Any other failure (bad URL, broken chunked body, cancellation) must settle the
+                # breaker too, or a half-open trial stays in flight and the route never reopens
+                route.breaker.record_failure(e)
+                raise
+            else:
+                if response.status_code >= 500:
+                    route.breaker.record_failure(f"HTTP {response.status_code}")
+                else:
+                    # 4xx means the backend is up; only this request was refused
+                    route.breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUSES or not can_retry(route, attempt, attempts, deadline):
+                    return response
+                delay = backoff_delay(attempt, response)
+            route.retries += 1
+            print(f"🔁 Retrying {method} {path} in {delay:.2f}s (attempt {attempt + 2}/{attempts})")
+            time.sleep(delay)
+    finally:
+        route.in_flight -= 1
+        route.bulkhead.release()
+
+def backend_stats() -> Dict[str, dict]:
+    with _backend_routes_lock:
+        routes = list(_backend_routes.values())
+    return {route.name: route.stats() for route in routes}
+
 def fetch_api_key() -> str:
     """Fetch API key from BE server"""
     global _API_KEY, _API_KEY_EXPIRES_AT
     try:
         print("🔑 Fetching API key from BE server...")
-        response = requests.post(f"{API_BASE_URL}/agent/generate-api-key")
+        response = backend_request("POST", "/agent/generate-api-key")
         response.raise_for_status()
         data = response.json()
         if data.get('success') and data.get('data', {}).get('apiKey'):
@@ -47,7 +198,7 @@ def refresh_api_key() -> Optional[str]:
         
         print("🔄 Refreshing API key...")
         headers = {'X-API-Key': _API_KEY}
-        response = requests.post(f"{API_BASE_URL}/agent/refresh", headers=headers)
+        response = backend_request("POST", "/agent/refresh", headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -106,10 +257,210 @@ except Exception as e:
     print(f"⚠️  Warning: Could not fetch API key on startup: {e}")
     print("⚠️  API calls will fail until key is obtained")
 
+# =============================================================================
+# IDEMPOTENCY
+# =============================================================================
+# Write tools are deduplicated per (conversation, tool, canonical args): a repeat inside
+# TOOL_IDEMPOTENCY_TTL_SECONDS returns the first result instead of writing to the backend again.
+
+TOOL_IDEMPOTENCY = os.getenv("TOOL_IDEMPOTENCY", "on").lower() not in ("0", "off", "false", "no")
+TOOL_IDEMPOTENCY_TTL_SECONDS = int(os.getenv("TOOL_IDEMPOTENCY_TTL_SECONDS", 600))
+# How long a duplicate waits for the first call's result while that call is still running
+TOOL_IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("TOOL_IDEMPOTENCY_WAIT_SECONDS", 10))
+_IDEMPOTENCY_PENDING = b"__pending__"
+_idempotency_redis = None
+
+def get_idempotency_redis():
+    """Redis client for the dedupe store (None if dedupe is off or Redis is unreachable)"""
+    global _idempotency_redis
+    if not TOOL_IDEMPOTENCY:
+        return None
+    if _idempotency_redis is None:
+        timeouts = {"socket_connect_timeout": 1.0, "socket_timeout": 1.0}
+        if os.getenv("REDIS_URL"):
+            _idempotency_redis = redis.from_url(os.getenv("REDIS_URL"), **timeouts)
+        else:
+            _idempotency_redis = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"),
+                                             port=int(os.getenv("REDIS_PORT", 6379)), db=0, **timeouts)
+    return _idempotency_redis
+
+def current_conversation_id() -> str:
+    """Conversation id sent by the agent in the tool call's _meta ("default" if absent)"""
+    return str(request_meta("conversationId") or "default")
+
+def idempotency_key(tool_name: str, conversation_id: str, args: Dict[str, Any]) -> str:
+    canonical = json.dumps({"conversation": conversation_id, "tool": tool_name, "args": args},
+                           sort_keys=True, separators=(",", ":"), default=str)
+    return f"mcp:idempotency:{tool_name}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+def idempotent(fn):
+    """Dedupe a write tool; place it under @mcp.tool so the tool schema is unchanged"""
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            store = get_idempotency_redis()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = idempotency_key(fn.__name__, current_conversation_id(), dict(bound.arguments))
+            claimed = store is not None and store.set(key, _IDEMPOTENCY_PENDING, nx=True, ex=TOOL_IDEMPOTENCY_TTL_SECONDS)
+        except redis.exceptions.RedisError as e:
+            print(f"⚠️  Idempotency store unavailable, calling {fn.__name__} without dedupe: {e}")
+            return fn(*args, **kwargs)
+        if store is None:
+            return fn(*args, **kwargs)
+
+        if not claimed:
+            # Same call already made (or in flight) within the window: hand back its result
+            deadline = time.monotonic() + TOOL_IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                try:
+                    stored = store.get(key)
+                except redis.exceptions.RedisError:
+                    stored = None
+                if stored is None:
+                    break  # the first call failed and released the key; retry for real
+                if stored != _IDEMPOTENCY_PENDING:
+                    print(f"♻️  Duplicate {fn.__name__} call, returning the original result")
+                    return json.loads(stored)
+                if time.monotonic() >= deadline:
+                    return {"error": f"An identical {fn.__name__} request is still being processed. "
+                                     "Do not retry; check whether it completed first."}
+                time.sleep(0.1)
+            return wrapper(*args, **kwargs)
+
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            try:
+                if isinstance(result, dict) and "error" not in result:
+                    store.set(key, json.dumps(result, default=str), ex=TOOL_IDEMPOTENCY_TTL_SECONDS)
+                else:
+                    # Failures are not remembered so a retry can still go through
+                    store.delete(key)
+            except redis.exceptions.RedisError as e:
+                print(f"⚠️  Could not record {fn.__name__} result for dedupe: {e}")
+        return result
+
+    return wrapper
+
 # =============================================================================
 # PRODUCT TOOLS
 # =============================================================================
 
+# Local fuzzy index over the product catalogue, rebuilt in the background every
+# PRODUCT_INDEX_REFRESH_SECONDS and right away after a product is changed through this server
+PRODUCT_INDEX_REFRESH_SECONDS = int(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", 300))
+PRODUCT_INDEX_PAGE_SIZE = 200
+_product_index = ProductIndex()
+_product_index_stale = True
+_product_index_refreshing = threading.Lock()
+
+def result_rows(payload: Any) -> List[Dict[str, Any]]:
+    """Records in a backend list response such as {"success": true, "data": {"result": [...]}}"""
+    if isinstance(payload, list):
+        return [row for row in payload if isinstance(row, dict)]
+    if isinstance(payload, dict):
+        for key in ("data", "result", "rows", "products", "orders"):
+            if key in payload:
+                rows = result_rows(payload[key])
+                if rows:
+                    return rows
+    return []
+
+def product_id(product: Dict[str, Any]) -> Any:
+    return product.get("id", product.get("id_product"))
+
+def load_all_products() -> List[Dict[str, Any]]:
+    products: Dict[Any, Dict[str, Any]] = {}
+    offset = 0
+    while True:
+        response = backend_request("GET", "/product/fetch-products",
+                                   params={"limit": PRODUCT_INDEX_PAGE_SIZE, "offset": offset}, headers=get_auth_headers())
+        response.raise_for_status()
+        rows = result_rows(response.json())
+        new_rows = [row for row in rows if product_id(row) not in products]
+        products.update((product_id(row), row) for row in new_rows)
+        # Stop on a short page, or if the backend ignored the offset and repeated itself
+        if len(rows) < PRODUCT_INDEX_PAGE_SIZE or not new_rows:
+            return list(products.values())
+        offset += PRODUCT_INDEX_PAGE_SIZE
+
+def refresh_product_index() -> None:
+    global _product_index_stale
+    if not _product_index_refreshing.acquire(blocking=False):
+        return  # another call is already rebuilding it
+    try:
+        started = time.perf_counter()
+        products = load_all_products()
+        _product_index.build(products)
+        _product_index_stale = False
+        print(f"🔎 Product index rebuilt: {len(products)} products in {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        _product_index_refreshing.release()
+
+def refresh_product_index_in_background() -> None:
+    def run():
+        try:
+            refresh_product_index()
+        except Exception as e:
+            print(f"⚠️  Product index refresh failed, keeping the old one: {e}")
+    threading.Thread(target=run, name="product-index-refresh", daemon=True).start()
+
+def ensure_product_index() -> None:
+    """Build the index on first use or after a product change; refresh it in the background when old"""
+    if _product_index_stale or not _product_index.built_at:
+        with _product_index_refreshing:
+            pass  # wait for a rebuild that is already running
+        if _product_index_stale or not _product_index.built_at:
+            refresh_product_index()
+    elif _product_index.age_seconds > PRODUCT_INDEX_REFRESH_SECONDS:
+        refresh_product_index_in_background()
+
+def mark_product_index_stale() -> None:
+    global _product_index_stale
+    _product_index_stale = True
+
+@mcp.tool(description="Resolve a partial or misspelled product name to ranked matching products with IDs and prices. Use it whenever you need a product ID or are unsure of the exact product name.")
+def resolve_products(query: str, limit: Optional[int] = 5) -> dict:
+    """
+    Find the products a (possibly misspelled or partial) name refers to, from a local index.
+
+    Args:
+        query: Product name as the user wrote it, e.g. "vermi compost 25kg bag"
+        limit: Maximum number of candidates to return
+
+    Returns:
+        dict: Candidates ranked by match score (1.0 = exact), each with id, name, price_per_kg
+    """
+    try:
+        ensure_product_index()
+        started = time.perf_counter()
+        matches = _product_index.search(query, limit=max(1, min(limit or 5, 20)))
+        took_ms = (time.perf_counter() - started) * 1000
+        return {
+            "query": query,
+            "matches": [
+                {
+                    "id": product_id(m["product"]),
+                    "name": m["product"].get("name"),
+                    "price_per_kg": m["product"].get("price_per_kg"),
+                    "is_active": m["product"].get("is_active"),
+                    "description": (m["product"].get("description") or "")[:120],
+                    "score": m["score"],
+                }
+                for m in matches
+            ],
+            "indexed_products": len(_product_index),
+            "took_ms": round(took_ms, 3),
+        }
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Failed to load products: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
 @mcp.tool(description="Fetch available products with optional search and pagination.")
 def fetch_products(q: Optional[str] = None, limit: Optional[int] = None, offset: Optional[int] = None) -> dict:
     """
@@ -132,7 +483,7 @@ def fetch_products(q: Optional[str] = None, limit: Optional[int] = None, offset:
         if offset is not None:
             params["offset"] = offset
 
-        response = requests.get(f"{API_BASE_URL}/product/fetch-products", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/product/fetch-products", params=params, headers=get_auth_headers())
         response.raise_for_status()
 
         return response.json()
@@ -151,7 +502,7 @@ def get_products_count(q: Optional[str] = None) -> dict:
         if q is not None:
             params["q"] = q
 
-        response = requests.get(f"{API_BASE_URL}/product/count", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/product/count", params=params, headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -175,7 +526,7 @@ def fetch_best_sellers(top_k: Optional[int] = 5) -> dict:
         if top_k:
             params["topK"] = top_k
         
-        response = requests.get(f"{API_BASE_URL}/product/best-sellers", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/product/best-sellers", params=params, headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -212,8 +563,9 @@ def update_product(
         if is_active is not None:
             payload["is_active"] = is_active
 
-        response = requests.put(f"{API_BASE_URL}/product/{id}", json=payload, headers=get_auth_headers())
+        response = backend_request("PUT", f"/product/{id}", json=payload, headers=get_auth_headers())
         response.raise_for_status()
+        mark_product_index_stale()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to update product: {str(e)}"}
@@ -226,8 +578,9 @@ def delete_product(id: int) -> dict:
     Delete a product by ID (soft delete on server).
     """
     try:
-        response = requests.delete(f"{API_BASE_URL}/product/{id}", headers=get_auth_headers())
+        response = backend_request("DELETE", f"/product/{id}", headers=get_auth_headers())
         response.raise_for_status()
+        mark_product_index_stale()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to delete product: {str(e)}"}
@@ -285,7 +638,7 @@ def fetch_stock_batches(
         if offset is not None:
             params["offset"] = offset
 
-        response = requests.get(f"{API_BASE_URL}/stock-batch", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/stock-batch", params=params, headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -294,6 +647,7 @@ def fetch_stock_batches(
         return {"error": f"Unexpected error: {str(e)}"}
 
 @mcp.tool(description="Create a new stock batch.")
+@idempotent
 def create_stock_batch(
     fk_id_product: int,
     quantity_produced: float,
@@ -312,7 +666,7 @@ def create_stock_batch(
             "end_date": end_date,
             "price_per_kg": price_per_kg
         }
-        response = requests.post(f"{API_BASE_URL}/stock-batch", json=payload, headers=get_auth_headers())
+        response = backend_request("POST", "/stock-batch", json=payload, headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -345,7 +699,7 @@ def update_stock_batch(
         if is_active is not None:
             payload["is_active"] = is_active
 
-        response = requests.put(f"{API_BASE_URL}/stock-batch/{id}", json=payload, headers=get_auth_headers())
+        response = backend_request("PUT", f"/stock-batch/{id}", json=payload, headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -359,13 +713,152 @@ def delete_stock_batch(id: int) -> dict:
     Delete a stock batch by ID.
     """
     try:
-        response = requests.delete(f"{API_BASE_URL}/stock-batch/{id}", headers=get_auth_headers())
+        response = backend_request("DELETE", f"/stock-batch/{id}", headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to delete stock batch: {str(e)}"}
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}"}
+
+# =============================================================================
+# ORDER TOOLS
+# =============================================================================
+
+# Orders are mirrored into a local SQLite FTS index for search_orders. Syncs are incremental:
+# newest pages of /order are fetched until a page holds nothing newer than the stored
+# updated_at watermark. A periodic full sync picks up edits to older orders and deletions,
+# and every order tool that changes an order re-syncs that order in the background right away.
+ORDER_INDEX_PATH = os.getenv("ORDER_INDEX_PATH", os.path.join(tempfile.gettempdir(), "telugu_vermi_farms_orders.sqlite3"))
+ORDER_INDEX_SYNC_SECONDS = int(os.getenv("ORDER_INDEX_SYNC_SECONDS", 60))
+ORDER_INDEX_FULL_SYNC_SECONDS = int(os.getenv("ORDER_INDEX_FULL_SYNC_SECONDS", 1800))
+ORDER_INDEX_PAGE_SIZE = 100
+_order_index = OrderIndex(ORDER_INDEX_PATH)
+_order_index_syncing = threading.Lock()
+
+def fetch_order_page(offset: int, limit: int = ORDER_INDEX_PAGE_SIZE, **filters) -> List[Dict[str, Any]]:
+    response = backend_request("GET", "/order", params={"limit": limit, "offset": offset, **filters},
+                               headers=get_auth_headers())
+    response.raise_for_status()
+    return result_rows(response.json())
+
+def sync_orders(full: bool = False) -> None:
+    """Pull new and changed orders into the local index (all of them when `full`)"""
+    if not _order_index_syncing.acquire(blocking=False):
+        return  # another call is already syncing
+    try:
+        started = time.perf_counter()
+        watermark = None if full else _order_index.watermark()
+        seen: set = set()
+        offset = synced = 0
+        while True:
+            rows = fetch_order_page(offset)
+            records = [record for record in (order_row(row, 0) for row in rows) if record]
+            new_keys = {record["key"] for record in records} - seen
+            seen |= new_keys
+            synced += _order_index.upsert(rows)
+            newer = [record for record in records
+                     if watermark is None or record["updated_at"] is None or record["updated_at"] > watermark]
+            # Stop on a short page, a page the backend repeated, or (incremental) nothing newer
+            if len(rows) < ORDER_INDEX_PAGE_SIZE or not new_keys or (watermark is not None and not newer):
+                break
+            offset += ORDER_INDEX_PAGE_SIZE
+        removed = _order_index.retain(seen) if full else 0
+        now = time.time()
+        _order_index.set_state("last_sync", now)
+        if full:
+            _order_index.set_state("last_full_sync", now)
+        print(f"🗂️  Order index {'full' if full else 'incremental'} sync: {synced} orders"
+              f"{f', {removed} removed' if removed else ''} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        _order_index_syncing.release()
+
+def sync_orders_in_background(full: bool = False) -> None:
+    def run():
+        try:
+            sync_orders(full)
+        except Exception as e:
+            print(f"⚠️  Order index sync failed, serving the last synced orders: {e}")
+    threading.Thread(target=run, name="order-index-sync", daemon=True).start()
+
+def order_sync_age(name: str) -> float:
+    value = _order_index.get_state(name)
+    return time.time() - float(value) if value else float("inf")
+
+def ensure_order_index() -> None:
+    """Full sync on first use; afterwards keep the index fresh in the background"""
+    if order_sync_age("last_full_sync") == float("inf"):
+        with _order_index_syncing:
+            pass  # wait for a sync that is already running
+        if order_sync_age("last_full_sync") == float("inf"):
+            sync_orders(full=True)
+    elif order_sync_age("last_full_sync") > ORDER_INDEX_FULL_SYNC_SECONDS:
+        sync_orders_in_background(full=True)
+    elif order_sync_age("last_sync") > ORDER_INDEX_SYNC_SECONDS:
+        sync_orders_in_background()
+
+def find_value(payload: Any, *keys: str) -> Any:
+    """First value stored under any of `keys` anywhere in a nested response"""
+    if isinstance(payload, dict):
+        for key in keys:
+            if payload.get(key) not in (None, ""):
+                return payload[key]
+        payload = list(payload.values())
+    if isinstance(payload, list):
+        for item in payload:
+            value = find_value(item, *keys)
+            if value is not None:
+                return value
+    return None
+
+def sync_order(order_unique_id: Optional[str]) -> None:
+    """Re-fetch one order into the index (an incremental sync when its ID is unknown)"""
+    try:
+        rows = fetch_order_page(0, limit=5, orderUniqueId=order_unique_id) if order_unique_id else []
+        if rows:
+            _order_index.upsert(rows)
+        else:
+            sync_orders()
+    except Exception as e:
+        print(f"⚠️  Order index update after write failed (next sync will catch up): {e}")
+
+def sync_order_after_write(result: Any, order_unique_id: Optional[str] = None) -> None:
+    """Re-sync the order a successful write touched, in the background so the write tool returns
+    without waiting on the extra fetch; search_orders sees the change moments later"""
+    if not isinstance(result, dict) or result.get("error") or result.get("success") is False:
+        return
+    order_unique_id = order_unique_id or find_value(result, "order_unique_id", "orderUniqueId")
+    threading.Thread(target=sync_order, args=(order_unique_id,), name="order-index-write-sync", daemon=True).start()
+
+@mcp.tool(description="Search orders by partial or misspelled customer name, email, mobile number, order unique ID or status word. Much faster than fetch_orders for finding a customer's orders; optional status and delivery date filters.")
+def search_orders(query: Optional[str] = "", status: Optional[int] = None,
+                  delivery_date_from: Optional[str] = None, delivery_date_to: Optional[str] = None,
+                  limit: Optional[int] = 10) -> dict:
+    """
+    Search the locally synced orders.
+
+    Args:
+        query: Words to find, e.g. "ravi 98480" or "lakshmi cancelled"; every word must match some field
+        status: Filter by order status (1: Pending, 2: Confirmed, 3: Shipped, 4: Delivered, 5: Cancelled)
+        delivery_date_from: Delivery date from (YYYY-MM-DD)
+        delivery_date_to: Delivery date to (YYYY-MM-DD)
+        limit: Maximum number of orders to return (default: 10)
+
+    Returns:
+        dict: Matching order summaries; use fetch_order_details for items and allocations
+    """
+    try:
+        ensure_order_index()
+        started = time.perf_counter()
+        orders = _order_index.search(query or "", status=status, date_from=delivery_date_from,
+                                     date_to=delivery_date_to, limit=max(1, min(limit or 10, 100)))
+        took_ms = (time.perf_counter() - started) * 1000
+        return {"query": query, "orders": orders, "indexed_orders": len(_order_index), "took_ms": round(took_ms, 3)}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Failed to sync orders: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
 @mcp.tool(description="Confirm an order by customer.")
 def confirm_order_by_customer(order_unique_id: str) -> dict:
     """
@@ -378,10 +871,12 @@ def confirm_order_by_customer(order_unique_id: str) -> dict:
         dict: Confirmation status and order details
     """
     try:
-        response = requests.put(f"{API_BASE_URL}/order/confirm/{order_unique_id}")
+        response = backend_request("PUT", f"/order/confirm/{order_unique_id}")
         response.raise_for_status()
         
-        return response.json()
+        result = response.json()
+        sync_order_after_write(result, order_unique_id)
+        return result
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to confirm order: {str(e)}"}
     except Exception as e:
@@ -399,10 +894,12 @@ def confirm_order_by_admin(order_unique_id: str) -> dict:
         dict: Admin confirmation status and order details
     """
     try:
-        response = requests.put(f"{API_BASE_URL}/order/admin/confirm/{order_unique_id}", headers=get_auth_headers())
+        response = backend_request("PUT", f"/order/admin/confirm/{order_unique_id}", headers=get_auth_headers())
         response.raise_for_status()
         
-        return response.json()
+        result = response.json()
+        sync_order_after_write(result, order_unique_id)
+        return result
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to confirm order by admin: {str(e)}"}
     except Exception as e:
@@ -420,10 +917,12 @@ def cancel_order_by_admin(order_unique_id: str) -> dict:
         dict: Cancellation status and order details
     """
     try:
-        response = requests.put(f"{API_BASE_URL}/order/admin/cancel/{order_unique_id}", headers=get_auth_headers())
+        response = backend_request("PUT", f"/order/admin/cancel/{order_unique_id}", headers=get_auth_headers())
         response.raise_for_status()
         
-        return response.json()
+        result = response.json()
+        sync_order_after_write(result, order_unique_id)
+        return result
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to cancel order: {str(e)}"}
     except Exception as e:
@@ -473,7 +972,7 @@ def fetch_orders(limit: Optional[int] = 10, offset: Optional[int] = 0,
         if status:
             params["status"] = status
         
-        response = requests.get(f"{API_BASE_URL}/order", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/order", params=params, headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -482,6 +981,7 @@ def fetch_orders(limit: Optional[int] = 10, offset: Optional[int] = 0,
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}"}
 @mcp.tool(description="Create an order on behalf of a customer (Admin only).")
+@idempotent
 def create_order_by_admin(
     customer_name: str,
     customer_mobile: str,
@@ -528,10 +1028,12 @@ def create_order_by_admin(
             "maxDateRequired": max_date_required
         }
         
-        response = requests.post(f"{API_BASE_URL}/order/admin/create-order", json=payload, headers=get_auth_headers())
+        response = backend_request("POST", "/order/admin/create-order", json=payload, headers=get_auth_headers())
         response.raise_for_status()
         
-        return response.json()
+        result = response.json()
+        sync_order_after_write(result)
+        return result
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to create order: {str(e)}"}
     except Exception as e:
@@ -560,7 +1062,7 @@ def check_stock_availability(items: List[Dict[str, Any]]) -> dict:
             "limit": 1000  # Fetch enough batches
         }
         
-        response = requests.get(f"{API_BASE_URL}/stock-batch", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/stock-batch", params=params, headers=get_auth_headers())
         response.raise_for_status()
         batches_data = response.json()
         
@@ -632,7 +1134,7 @@ def fetch_order_details(order_ids_csv: Optional[str] = None, order_unique_ids_cs
         if order_unique_ids_csv:
             params["orderUniqueIds"] = order_unique_ids_csv
 
-        response = requests.get(f"{API_BASE_URL}/order/order-details", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/order/order-details", params=params, headers=get_auth_headers())
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -678,7 +1180,7 @@ def get_orders_count(order_unique_id: Optional[str] = None, customer_name: Optio
         if status:
             params["status"] = status
         
-        response = requests.get(f"{API_BASE_URL}/order/count", params=params, headers=get_auth_headers())
+        response = backend_request("GET", "/order/count", params=params, headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -687,11 +1189,83 @@ def get_orders_count(order_unique_id: Optional[str] = None, customer_name: Optio
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}"}
 
+# =============================================================================
+# ANALYTICS TOOLS
+# =============================================================================
+
+# sales_analytics aggregates the synced orders held as NumPy columns (sales_analytics.py).
+# Orders whose list record carries no line items get them from /order/order-details once per
+# updated_at, in batches of ORDER_DETAILS_BATCH_SIZE.
+ORDER_DETAILS_BATCH_SIZE = int(os.getenv("ORDER_DETAILS_BATCH_SIZE", 50))
+_sales_data = SalesData()
+
+def sync_order_details() -> int:
+    """Fetch and cache details for orders missing line items. Returns how many orders were fetched"""
+    missing = _order_index.missing_details()
+    for start in range(0, len(missing), ORDER_DETAILS_BATCH_SIZE):
+        batch = missing[start:start + ORDER_DETAILS_BATCH_SIZE]
+        unique_ids = [order["order_unique_id"] for order in batch if order["order_unique_id"]]
+        response = backend_request("GET", "/order/order-details", headers=get_auth_headers(),
+                                   params={"orderUniqueIds": ",".join(unique_ids)} if unique_ids else
+                                   {"orderIds": ",".join(order["order_id"] for order in batch if order["order_id"])})
+        response.raise_for_status()
+        by_id = {}
+        for record in result_rows(response.json()):
+            for key in (find_value(record, "order_unique_id", "orderUniqueId"), find_value(record, "id", "id_order", "orderId")):
+                if key is not None:
+                    by_id.setdefault(str(key), record)
+        # Orders the backend returned nothing for are cached empty so they are not asked for again
+        _order_index.set_details((order["key"], order["updated_at"],
+                                  by_id.get(order["key"]) or by_id.get(str(order["order_id"])) or {}) for order in batch)
+    return len(missing)
+
+@mcp.tool(description="Sales analytics over all orders in one call: revenue, quantity or order counts aggregated (sum, mean, count) by product, customer, status, day, week, month or weekday, with date and status filters and top-k. Use it for questions like revenue by product last month, average order value this week or which day had most orders, instead of paging through orders.")
+def sales_analytics(measure: str = "revenue", aggregate: str = "sum", group_by: str = "none",
+                    date_from: Optional[str] = None, date_to: Optional[str] = None, date_field: str = "created",
+                    status: Optional[int] = None, include_cancelled: bool = False,
+                    top_k: Optional[int] = 10, sort: Optional[str] = None) -> dict:
+    """
+    Aggregate sales across the locally synced orders.
+
+    Args:
+        measure: "revenue" (order totals, line amounts when grouped by product), "quantity" (line quantities) or "orders"
+        aggregate: "sum", "mean" (e.g. average order value) or "count"
+        group_by: "none", "product", "customer", "status", "day", "week", "month" or "weekday"
+        date_from: Only orders on/after this date (YYYY-MM-DD)
+        date_to: Only orders on/before this date (YYYY-MM-DD)
+        date_field: Date the range and time buckets use: "created" (order date) or "delivery"
+        status: Only orders with this status (1: Pending, 2: Confirmed, 3: Shipped, 4: Delivered, 5: Cancelled)
+        include_cancelled: Count cancelled orders when no status is given (default: False)
+        top_k: Number of groups to return (default: 10)
+        sort: "value" (largest first) or "group" (chronological); time groupings default to "group"
+
+    Returns:
+        dict: {"columns": [...], "rows": [[group, value, count], ...]} plus totals
+    """
+    try:
+        ensure_order_index()
+        sync_order_details()
+        loaded = _sales_data.refresh(_order_index)
+        started = time.perf_counter()
+        result = _sales_data.query(measure=measure, aggregate=aggregate, group_by=group_by, date_from=date_from,
+                                   date_to=date_to, date_field=date_field, status=status,
+                                   include_cancelled=include_cancelled, top_k=max(1, min(top_k or 10, 100)), sort=sort)
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        result["orders_loaded"] = loaded
+        return result
+    except ValueError as e:
+        return {"error": str(e)}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Failed to sync orders: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
 # =============================================================================
 # CONTACT/ENQUIRY TOOLS
 # =============================================================================
 
 @mcp.tool(description="Submit a new enquiry to Telugu Vermi Farms.")
+@idempotent
 def submit_enquiry(enquiry_data: Dict[str, Any]) -> dict:
     """
     Submit a new enquiry to Telugu Vermi Farms.
@@ -703,7 +1277,7 @@ def submit_enquiry(enquiry_data: Dict[str, Any]) -> dict:
         dict: Enquiry submission confirmation
     """
     try:
-        response = requests.post(f"{API_BASE_URL}/contact-us/submit-enquiry", json=enquiry_data, headers=get_auth_headers())
+        response = backend_request("POST", "/contact-us/submit-enquiry", json=enquiry_data, headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -721,7 +1295,7 @@ def fetch_all_enquiries() -> dict:
         dict: List of all enquiries
     """
     try:
-        response = requests.get(f"{API_BASE_URL}/contact-us/fetch-all", headers=get_auth_headers())
+        response = backend_request("GET", "/contact-us/fetch-all", headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -739,7 +1313,7 @@ def get_enquiries_count() -> dict:
         dict: Count of enquiries
     """
     try:
-        response = requests.get(f"{API_BASE_URL}/contact-us/fetch-count", headers=get_auth_headers())
+        response = backend_request("GET", "/contact-us/fetch-count", headers=get_auth_headers())
         response.raise_for_status()
         
         return response.json()
@@ -758,28 +1332,31 @@ def check_api_health() -> dict:
     Check the health status of the Telugu Vermi Farms API.
     
     Returns:
-        dict: API health status
+        dict: API health status, with circuit breaker / bulkhead state per backend route
     """
     try:
         # Try to fetch products as a health check
-        response = requests.get(f"{API_BASE_URL}/product/fetch-products", timeout=5, headers=get_auth_headers())
+        response = backend_request("GET", "/product/fetch-products", timeout=5, headers=get_auth_headers())
         response.raise_for_status()
         
         return {
             "status": "healthy",
             "message": "API is responding correctly",
+            "circuits": backend_stats(),
             "timestamp": datetime.now().isoformat()
         }
     except requests.exceptions.RequestException as e:
         return {
             "status": "unhealthy",
             "error": f"API health check failed: {str(e)}",
+            "circuits": backend_stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "error": f"Unexpected error during health check: {str(e)}",
+            "circuits": backend_stats(),
             "timestamp": datetime.now().isoformat()
         }
 
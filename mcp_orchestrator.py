@@ -2,26 +2,56 @@
 from fastmcp import Client as MCPClient
 from contextlib import AsyncExitStack
 from typing import Optional, Dict, List, Any
+import asyncio
+import importlib.util
 import json
+import os
+
+# MCP_SERVER_URL=inproc:// mounts mcp-server.py's FastMCP instance in this process (in-memory
+# transport, no SSE/HTTP hop); inproc:///path/to/server.py loads another server file.
+INPROC_SCHEME = "inproc://"
+DEFAULT_INPROC_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp-server.py")
+_inproc_servers: Dict[str, Any] = {}
+
+
+def load_inproc_server(url: str) -> Any:
+    """Import the server file named by an inproc:// URL (once) and return its `mcp` FastMCP instance."""
+    path = os.path.abspath(url[len(INPROC_SCHEME):] or DEFAULT_INPROC_SERVER)
+    server = _inproc_servers.get(path)
+    if server is None:
+        spec = importlib.util.spec_from_file_location("mcp_server_inproc", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        server = _inproc_servers[path] = module.mcp
+        print(f"Loaded in-process MCP server from {path}")
+    return server
 
 
 class MCPOrchestrator:
 
     def __init__(self, admin_agent_url: Optional[str] = None) -> None:
         # Assign URL for MCP server, defaulting to the server in mcp-server.py if not provided
-        import os
         self.admin_agent_url = admin_agent_url or os.getenv("MCP_SERVER_URL", "http://127.0.0.1:6280/sse")
         self._clients: Dict[str, MCPClient] = {}
         self._stack: Optional[AsyncExitStack] = None
+        self._connect_lock = asyncio.Lock()
+        # Tool specs only change when the MCP server restarts, so cache them per session
+        self._tools_specs_cache: Dict[bool, List[Dict[str, Any]]] = {}
         print(f"MCP Orchestrator initialized with URL: {self.admin_agent_url}")
     
-    async def __aenter__(self) -> "MCPOrchestrator":
+    async def connect(self) -> "MCPOrchestrator":
         print(f"Connecting to MCP Server at {self.admin_agent_url}...")
         self._stack = AsyncExitStack()
-        admin_agent_client = MCPClient(self.admin_agent_url)
+        admin_agent_client = MCPClient(await self._transport_target())
         print("Initializing admin_agent client...")
-        await self._stack.enter_async_context(admin_agent_client)
+        try:
+            await self._stack.enter_async_context(admin_agent_client)
+        except BaseException:
+            await self._stack.aclose()
+            self._stack = None
+            raise
         self._clients["admin_agent"] = admin_agent_client
+        self._tools_specs_cache.clear()
         print("admin_agent client initialized.")
         # Print the nested object for the admin_agent client (for debugging)
         # print("admin_agent client object:", self._clients["admin_agent"].__dict__)
@@ -31,9 +61,44 @@ class MCPOrchestrator:
         # for tool in tools:
         #     print(f"  - {tool.name}: {getattr(tool, 'description', '')}")
         return self
+
+    async def _transport_target(self) -> Any:
+        """What to hand fastmcp's Client: a URL, or a FastMCP instance for the in-memory transport."""
+        if isinstance(self.admin_agent_url, str) and self.admin_agent_url.startswith(INPROC_SCHEME):
+            # In a thread: importing mcp-server.py fetches its backend API key over HTTP
+            return await asyncio.to_thread(load_inproc_server, self.admin_agent_url)
+        return self.admin_agent_url
+
+    async def close(self) -> None:
+        self._clients.clear()
+        self._tools_specs_cache.clear()
+        if self._stack is not None:
+            stack, self._stack = self._stack, None
+            await stack.aclose()
+
+    def is_connected(self) -> bool:
+        if not self._clients:
+            return False
+        return all(c.is_connected() for c in self._clients.values())
+
+    async def ensure_connected(self) -> "MCPOrchestrator":
+        """Return this orchestrator with a live session, (re)connecting if the previous one dropped."""
+        if self.is_connected():
+            return self
+        async with self._connect_lock:
+            if not self.is_connected():
+                try:
+                    await self.close()
+                except Exception as e:
+                    print(f"Error closing stale MCP session: {e}")
+                await self.connect()
+        return self
+
+    async def __aenter__(self) -> "MCPOrchestrator":
+        return await self.connect()
     
     async def __aexit__(self, exc_type, exc_value, traceback) -> None:
-        await self._stack.aclose()
+        await self.close()
 
     async def get_client(self, name: str) -> MCPClient:
         return self._clients[name]
@@ -47,9 +112,10 @@ class MCPOrchestrator:
         except (TypeError, ValueError):
             return {}
 
-    async def get_all_tools_specs(self, namespaced: bool = True) -> List[Dict[str, Any]]:
+    async def get_all_tools_specs(self, namespaced: bool = True, refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Return a normalized, model-agnostic view of all tools with namespacing.
+        Cached for the lifetime of the MCP session unless refresh=True.
         
         Each item:
         {
@@ -60,6 +126,8 @@ class MCPOrchestrator:
           "inputSchema": {...}  # plain JSON Schema
         }
         """
+        if not refresh and namespaced in self._tools_specs_cache:
+            return self._tools_specs_cache[namespaced]
         specs: List[Dict[str, Any]] = []
         for server, c in self._clients.items():
             tools = await c.list_tools()
@@ -76,6 +144,7 @@ class MCPOrchestrator:
                     "description": desc,
                     "inputSchema": inputSchema,
                 })
+        self._tools_specs_cache[namespaced] = specs
         return specs
             
 
@@ -0,0 +1,161 @@
+"""
+Complexity-based model routing - cheap local heuristics pick a fast or strong model per turn
+"""
+import os
+import re
+import json
+from typing import Dict, List, Optional
+
+TIERS = ["lite", "standard", "strong"]
+
+
+def _models_from_env(var: str, default: List[str]) -> List[str]:
+    raw = os.getenv(var)
+    if not raw:
+        return default
+    return [m.strip() for m in raw.split(",") if m.strip()]
+
+
+# Per-provider model ladders; override with e.g. GEMINI_LITE_MODELS="gemini-2.0-flash-lite,..."
+TIER_MODELS: Dict[str, Dict[str, List[str]]] = {
+    "gemini": {
+        "lite": _models_from_env("GEMINI_LITE_MODELS", ["gemini-2.0-flash-lite", "gemini-2.5-flash-lite"]),
+        "standard": _models_from_env("GEMINI_STANDARD_MODELS", ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-flash-latest"]),
+        "strong": _models_from_env("GEMINI_STRONG_MODELS", ["gemini-2.5-pro"]),
+    },
+    "openai": {
+        "lite": _models_from_env("OPENAI_LITE_MODELS", ["gpt-4o-mini"]),
+        "standard": _models_from_env("OPENAI_STANDARD_MODELS", ["gpt-4o"]),
+        "strong": _models_from_env("OPENAI_STRONG_MODELS", ["gpt-4o"]),
+    },
+}
+
+# Read-only lookups that a lite model handles well
+LOOKUP_PATTERN = re.compile(
+    r"\b(how many|count|number of|list|show|fetch|get|what is|what's|which|price|status|details?|best ?sellers?)\b"
+)
+# Mutations - a wrong call here costs a backend write, so never route to lite
+WRITE_PATTERN = re.compile(
+    r"\b(create|place|add|new|update|change|edit|modify|delete|remove|cancel|confirm|submit|allocate)\b"
+)
+# Multi-step reasoning / aggregation
+REASONING_PATTERN = re.compile(
+    r"\b(compare|analy[sz]e|analysis|trend|revenue|average|total|sum|report|why|explain|plan|forecast|and then|after that)\b"
+)
+# Domain entities; each distinct one usually means at least one tool call
+ENTITY_PATTERNS = {
+    "product": re.compile(r"\bproducts?\b"),
+    "order": re.compile(r"\borders?\b"),
+    "stock": re.compile(r"\b(stock|batch(es)?|inventory)\b"),
+    "enquiry": re.compile(r"\b(enquir(y|ies)|inquir(y|ies))\b"),
+    "customer": re.compile(r"\b(customers?|mobile|email|address)\b"),
+}
+AFFIRMATION_PATTERN = re.compile(r"^\s*(yes|yeah|yep|ok(ay)?|sure|go ahead|proceed|confirm(ed)?|do it|correct)\b[\s.!]*$")
+
+
+class ModelRoute:
+    """Routing decision for one turn; escalates up the tier ladder on failure."""
+
+    def __init__(self, provider: str, tier: str, reason: str, features: Dict[str, object],
+                 pinned_model: Optional[str] = None) -> None:
+        self.provider = provider
+        self.tier = tier
+        self.initial_tier = tier
+        self.reason = reason
+        self.features = features
+        self.pinned_model = pinned_model
+        # Strongest tier this turn may use (set when a usage budget forces a downgrade)
+        self.ceiling: Optional[str] = None
+        self.escalations: List[str] = []
+        self.model: Optional[str] = None
+
+    def candidates(self) -> List[str]:
+        """Models to try in order: current tier, then every stronger tier, then weaker tiers as a last resort."""
+        ladder = TIER_MODELS.get(self.provider, {})
+        models: List[str] = [self.pinned_model] if self.pinned_model else []
+        idx = TIERS.index(self.tier)
+        top = TIERS.index(self.ceiling) if self.ceiling else len(TIERS) - 1
+        for tier in TIERS[idx:top + 1] + list(reversed(TIERS[:idx])):
+            for model in ladder.get(tier, []):
+                if model not in models:
+                    models.append(model)
+        return models
+
+    def escalate(self, reason: str) -> bool:
+        """Move to the next stronger tier. Returns False if already at the top."""
+        idx = TIERS.index(self.tier)
+        top = TIERS.index(self.ceiling) if self.ceiling else len(TIERS) - 1
+        if idx + 1 > top:
+            return False
+        self.tier = TIERS[idx + 1]
+        self.pinned_model = None
+        self.escalations.append(reason)
+        print(f"🧭 Route escalated to {self.tier}: {reason}")
+        return True
+
+    def cap(self, tier: str, reason: str) -> None:
+        """Move to `tier` and never escalate above it for the rest of the turn."""
+        if TIERS.index(tier) < TIERS.index(self.tier):
+            self.tier = tier
+        self.ceiling = tier
+        self.pinned_model = None
+        self.reason = f"{self.reason}; capped at {tier}: {reason}"
+        print(f"🧭 Route capped at {tier}: {reason}")
+
+    def to_dict(self) -> dict:
+        return {
+            "provider": self.provider,
+            "tier": self.tier,
+            "initial_tier": self.initial_tier,
+            "model": self.model,
+            "ceiling": self.ceiling,
+            "reason": self.reason,
+            "escalations": self.escalations,
+            "features": self.features,
+        }
+
+
+class ModelRouter:
+    """Classifies a request with local heuristics (length, intent keywords, expected tool count)."""
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("MODEL_ROUTING", "on").lower() not in ("0", "off", "false")
+        self.long_message_chars = int(os.getenv("ROUTER_LONG_MESSAGE_CHARS", 400))
+
+    def classify(self, message: str, history: Optional[List[dict]] = None) -> tuple[str, str, Dict[str, object]]:
+        text = (message or "").lower()
+        entities = [name for name, pattern in ENTITY_PATTERNS.items() if pattern.search(text)]
+        is_write = bool(WRITE_PATTERN.search(text))
+        is_lookup = bool(LOOKUP_PATTERN.search(text))
+        needs_reasoning = bool(REASONING_PATTERN.search(text))
+        expected_tools = max(len(entities), 1) + (1 if is_write else 0) + (1 if needs_reasoning else 0)
+        features: Dict[str, object] = {
+            "chars": len(text),
+            "entities": entities,
+            "write": is_write,
+            "lookup": is_lookup,
+            "reasoning": needs_reasoning,
+            "expected_tools": expected_tools,
+        }
+
+        if AFFIRMATION_PATTERN.match(text) and history:
+            # "yes, go ahead" usually confirms a pending write from the previous turn
+            return "standard", "confirmation of previous turn", features
+        if len(text) > self.long_message_chars * 2 or expected_tools >= 4:
+            return "strong", "long or multi-step request", features
+        if is_write or needs_reasoning or len(text) > self.long_message_chars or expected_tools >= 3:
+            return "standard", "write or multi-step intent", features
+        if is_lookup and len(entities) <= 1:
+            return "lite", "simple lookup", features
+        return "standard", "default", features
+
+    def route(self, provider: str, message: str, history: Optional[List[dict]] = None) -> ModelRoute:
+        pinned = os.getenv("GEMINI_MODEL") if provider == "gemini" else os.getenv("OPENAI_MODEL")
+        if not self.enabled:
+            decision = ModelRoute(provider, "standard", "routing disabled", {}, pinned_model=pinned)
+        else:
+            tier, reason, features = self.classify(message, history)
+            decision = ModelRoute(provider, tier, reason, features, pinned_model=pinned)
+        # Single JSON line per decision so routing can be tuned from logs
+        print(f"🧭 Route: {json.dumps(decision.to_dict(), ensure_ascii=False)}")
+        return decision
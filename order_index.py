@@ -0,0 +1,332 @@
+"""
+Local order index - orders synced from the backend into SQLite with an FTS5 trigram index
+
+Each order is upserted under its unique id and only replaces the stored row when it changed and
+its updated timestamp is not older, so overlapping syncs are harmless, synced_at marks real
+changes and MAX(updated_at) is the watermark for incremental syncs. The trigram full-text table covers the order id, customer name, email,
+mobile and status, which makes substring and prefix lookups ("ravi", "48012", "@gmail") a
+single index query. Queries with no exact hit fall back to ranking by shared trigrams, so a
+misspelled name still finds its orders.
+
+Line items come with the order record when the backend includes them, otherwise from the
+order-details endpoint (cached per order and updated_at in order_details) - see order_lines.
+"""
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+ORDER_STATUSES = {1: "pending", 2: "confirmed", 3: "shipped", 4: "delivered", 5: "cancelled"}
+
+# Bump when the tables change; an index file from another version is rebuilt from scratch
+SCHEMA_VERSION = 2
+LINE_KEYS = ("items", "order_items", "orderItems", "allocations", "batch_allocations", "batchAllocations", "lines")
+
+# Minimum share of the query's trigrams an order must contain to count as a fuzzy match
+FUZZY_MIN_SCORE = 0.5
+FUZZY_CANDIDATES = 200
+
+SEARCH_COLUMNS = ("order_unique_id", "customer_name", "customer_email", "customer_mobile", "status_name")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    key TEXT PRIMARY KEY,
+    order_id TEXT,
+    order_unique_id TEXT,
+    customer_name TEXT,
+    customer_email TEXT,
+    customer_mobile TEXT,
+    status INTEGER,
+    status_name TEXT,
+    delivery_date TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    has_lines INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_updated_at ON orders(updated_at);
+CREATE INDEX IF NOT EXISTS orders_synced_at ON orders(synced_at);
+CREATE TABLE IF NOT EXISTS order_details (
+    key TEXT PRIMARY KEY,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS order_details_synced_at ON order_details(synced_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+    order_unique_id, customer_name, customer_email, customer_mobile, status_name,
+    content='orders', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS orders_ai AFTER INSERT ON orders BEGIN
+    INSERT INTO orders_fts(rowid, order_unique_id, customer_name, customer_email, customer_mobile, status_name)
+    VALUES (new.rowid, new.order_unique_id, new.customer_name, new.customer_email, new.customer_mobile, new.status_name);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_ad AFTER DELETE ON orders BEGIN
+    INSERT INTO orders_fts(orders_fts, rowid, order_unique_id, customer_name, customer_email, customer_mobile, status_name)
+    VALUES ('delete', old.rowid, old.order_unique_id, old.customer_name, old.customer_email, old.customer_mobile, old.status_name);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_au AFTER UPDATE ON orders BEGIN
+    INSERT INTO orders_fts(orders_fts, rowid, order_unique_id, customer_name, customer_email, customer_mobile, status_name)
+    VALUES ('delete', old.rowid, old.order_unique_id, old.customer_name, old.customer_email, old.customer_mobile, old.status_name);
+    INSERT INTO orders_fts(rowid, order_unique_id, customer_name, customer_email, customer_mobile, status_name)
+    VALUES (new.rowid, new.order_unique_id, new.customer_name, new.customer_email, new.customer_mobile, new.status_name);
+END;
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UPSERT = """
+INSERT INTO orders (key, order_id, order_unique_id, customer_name, customer_email, customer_mobile,
+                    status, status_name, delivery_date, created_at, updated_at, has_lines, data, synced_at)
+VALUES (:key, :order_id, :order_unique_id, :customer_name, :customer_email, :customer_mobile,
+        :status, :status_name, :delivery_date, :created_at, :updated_at, :has_lines, :data, :synced_at)
+ON CONFLICT(key) DO UPDATE SET
+    order_id = excluded.order_id, order_unique_id = excluded.order_unique_id,
+    customer_name = excluded.customer_name, customer_email = excluded.customer_email,
+    customer_mobile = excluded.customer_mobile, status = excluded.status, status_name = excluded.status_name,
+    delivery_date = excluded.delivery_date, created_at = excluded.created_at, updated_at = excluded.updated_at,
+    has_lines = excluded.has_lines, data = excluded.data, synced_at = excluded.synced_at
+WHERE excluded.data IS NOT orders.data
+  AND (excluded.updated_at IS NULL OR orders.updated_at IS NULL OR excluded.updated_at >= orders.updated_at)
+"""
+
+SUMMARY_COLUMNS = ("order_id", "order_unique_id", "customer_name", "customer_email", "customer_mobile",
+                   "status", "status_name", "delivery_date", "created_at", "updated_at")
+
+
+def field(order: Dict[str, Any], *names: str) -> Any:
+    """First non-empty value among the given keys (the backend mixes snake and camel case)."""
+    for name in names:
+        value = order.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def customer_field(order: Dict[str, Any], name: str) -> Any:
+    """customer_<name> / customer<Name> on the order, or <name> on a nested "customer" object."""
+    value = field(order, f"customer_{name}", f"customer{name.capitalize()}")
+    customer = order.get("customer")
+    if value is None and isinstance(customer, dict):
+        value = field(customer, name)
+    return value
+
+
+def order_lines(order: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Line items / batch allocations of an order record (possibly nested under "order" or "data")."""
+    for key in LINE_KEYS:
+        lines = order.get(key)
+        if isinstance(lines, list) and lines and all(isinstance(line, dict) for line in lines):
+            return lines
+    for key in ("order", "data"):
+        if isinstance(order.get(key), dict):
+            return order_lines(order[key])
+    return []
+
+
+def order_row(order: Dict[str, Any], synced_at: float) -> Optional[Dict[str, Any]]:
+    """Column values of a backend order record (None when it has no usable id)."""
+    order_id = field(order, "id", "id_order", "orderId")
+    unique_id = field(order, "order_unique_id", "orderUniqueId")
+    if order_id is None and unique_id is None:
+        return None
+    status = field(order, "status", "order_status", "fk_id_order_status")
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    created_at = field(order, "created_at", "createdAt")
+    mobile = customer_field(order, "mobile")
+    return {
+        "key": str(unique_id if unique_id is not None else order_id),
+        "order_id": None if order_id is None else str(order_id),
+        "order_unique_id": unique_id,
+        "customer_name": customer_field(order, "name"),
+        "customer_email": customer_field(order, "email"),
+        "customer_mobile": None if mobile is None else str(mobile),
+        "status": status,
+        "status_name": ORDER_STATUSES.get(status),
+        "delivery_date": field(order, "delivery_date", "deliveryDate", "max_date_required", "maxDateRequired"),
+        "created_at": created_at,
+        "updated_at": field(order, "updated_at", "updatedAt") or created_at,
+        "has_lines": int(bool(order_lines(order))),
+        "data": json.dumps(order, ensure_ascii=False, default=str),
+        "synced_at": synced_at,
+    }
+
+
+def _terms(query: str) -> List[str]:
+    return [t for t in re.split(r"\s+", (query or "").strip().lower()) if t]
+
+
+def _phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class OrderIndex:
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # It is only a cache of the backend: start over rather than migrate
+                self._conn.executescript("DROP TABLE IF EXISTS orders_fts; DROP TABLE IF EXISTS orders; "
+                                         "DROP TABLE IF EXISTS order_details; DROP TABLE IF EXISTS sync_state;")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def upsert(self, orders: Iterable[Dict[str, Any]]) -> int:
+        """Store backend order records, keeping the newer copy of each. Returns how many were usable."""
+        now = time.time()
+        rows = [row for row in (order_row(o, now) for o in orders if isinstance(o, dict)) if row]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def retain(self, keys: Set[str]) -> int:
+        """Drop orders not in `keys` (the ids a full sync saw). Returns how many were removed."""
+        with self._lock, self._conn:
+            stored = {row[0] for row in self._conn.execute("SELECT key FROM orders")}
+            gone = [(key,) for key in stored - keys]
+            self._conn.executemany("DELETE FROM orders WHERE key = ?", gone)
+            self._conn.executemany("DELETE FROM order_details WHERE key = ?", gone)
+            if gone:
+                # Readers holding copies of the orders (sales analytics) reload on a new generation
+                self._conn.execute("INSERT INTO sync_state (name, value) VALUES ('generation', '1') ON CONFLICT(name) "
+                                   "DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+            return len(gone)
+
+    def generation(self) -> int:
+        return int(self.get_state("generation") or 0)
+
+    def missing_details(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Orders without line items whose details were never fetched or predate their last update."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT o.key, o.order_id, o.order_unique_id, o.updated_at FROM orders o "
+                "LEFT JOIN order_details d ON d.key = o.key "
+                "WHERE o.has_lines = 0 AND (d.key IS NULL OR d.updated_at IS NOT o.updated_at) LIMIT ?",
+                (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_details(self, details: Iterable[tuple]) -> None:
+        """Cache order-details records as (key, updated_at of the order, record) tuples."""
+        now = time.time()
+        rows = [(key, updated_at, json.dumps(record, ensure_ascii=False, default=str), now)
+                for key, updated_at, record in details]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO order_details (key, updated_at, data, synced_at) VALUES (?, ?, ?, ?) "
+                                   "ON CONFLICT(key) DO UPDATE SET updated_at = excluded.updated_at, "
+                                   "data = excluded.data, synced_at = excluded.synced_at", rows)
+
+    def changed_since(self, since: float) -> List[sqlite3.Row]:
+        """Orders (with cached details) stored or re-synced after the `since` timestamp."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT o.key, o.status, o.customer_name, o.customer_mobile, o.created_at, o.delivery_date, "
+                "o.data, d.data AS details, MAX(o.synced_at, COALESCE(d.synced_at, 0)) AS changed_at "
+                "FROM orders o LEFT JOIN order_details d ON d.key = o.key "
+                "WHERE o.synced_at > ? OR d.synced_at > ? ORDER BY changed_at", (since, since)).fetchall()
+
+    def watermark(self) -> Optional[str]:
+        """Newest updated timestamp stored; orders at or before it are already in the index."""
+        with self._lock:
+            return self._conn.execute("SELECT MAX(updated_at) FROM orders").fetchone()[0]
+
+    def get_state(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else None
+
+    def set_state(self, name: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO sync_state (name, value) VALUES (?, ?) "
+                               "ON CONFLICT(name) DO UPDATE SET value = excluded.value", (name, str(value)))
+
+    def search(self, query: str = "", status: Optional[int] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """Orders matching every query term (substring of any searched field), newest first by relevance."""
+        filters, params = [], []
+        if status is not None:
+            filters.append("o.status = ?")
+            params.append(status)
+        if date_from:
+            filters.append("substr(o.delivery_date, 1, 10) >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            filters.append("substr(o.delivery_date, 1, 10) <= ?")
+            params.append(date_to[:10])
+
+        terms = _terms(query)
+        long_terms = [t for t in terms if len(t) >= 3]
+        # Trigram FTS can't match 1-2 character terms; those must start a word of some field
+        for term in (t for t in terms if len(t) < 3):
+            term = term.replace("%", "").replace("_", "")
+            filters.append("(" + " OR ".join(f"(lower(o.{c}) LIKE ? OR lower(o.{c}) LIKE ?)" for c in SEARCH_COLUMNS) + ")")
+            params.extend([term + "%", "% " + term + "%"] * len(SEARCH_COLUMNS))
+        where = (" AND " + " AND ".join(filters)) if filters else ""
+
+        with self._lock:
+            if not long_terms:
+                rows = self._conn.execute(
+                    f"SELECT o.*, 1.0 AS score FROM orders o WHERE 1 = 1{where} "
+                    "ORDER BY o.updated_at DESC LIMIT ?", (*params, limit)).fetchall()
+                return [self._summary(row, "filter") for row in rows]
+
+            match = " AND ".join(_phrase(t) for t in long_terms)
+            rows = self._conn.execute(
+                f"SELECT o.*, bm25(orders_fts) AS score FROM orders_fts JOIN orders o ON o.rowid = orders_fts.rowid "
+                f"WHERE orders_fts MATCH ?{where} ORDER BY score, o.updated_at DESC LIMIT ?",
+                (match, *params, limit)).fetchall()
+            if rows or not fuzzy:
+                return [self._summary(row, "exact") for row in rows]
+
+            query_grams = set().union(*(_trigrams(t) for t in long_terms))
+            match = " OR ".join(_phrase(g) for g in sorted(query_grams))
+            candidates = self._conn.execute(
+                f"SELECT o.*, bm25(orders_fts) AS score FROM orders_fts JOIN orders o ON o.rowid = orders_fts.rowid "
+                f"WHERE orders_fts MATCH ?{where} ORDER BY score LIMIT ?",
+                (match, *params, FUZZY_CANDIDATES)).fetchall()
+
+        scored = []
+        for row in candidates:
+            text = " ".join(str(row[c] or "").lower() for c in SEARCH_COLUMNS)
+            score = len(query_grams & _trigrams(text)) / len(query_grams)
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((score, row))
+        # Best score first, most recently updated first among equals
+        scored.sort(key=lambda item: item[1]["updated_at"] or "", reverse=True)
+        scored.sort(key=lambda item: -item[0])
+        return [self._summary(row, "fuzzy", round(score, 3)) for score, row in scored[:limit]]
+
+    @staticmethod
+    def _summary(row: sqlite3.Row, match: str, score: Optional[float] = None) -> Dict[str, Any]:
+        summary = {name: row[name] for name in SUMMARY_COLUMNS}
+        summary["match"] = match
+        if score is not None:
+            summary["score"] = score
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            watermark = self._conn.execute("SELECT MAX(updated_at) FROM orders").fetchone()[0]
+        return {"orders": count, "watermark": watermark, "path": self.path}
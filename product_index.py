@@ -0,0 +1,125 @@
+"""
+In-memory fuzzy product index - resolves partial or misspelled product names without a backend call
+
+Product names and descriptions are normalised ("25KG" -> "25 kg") and split into character
+trigrams; an inverted index maps each trigram to the products containing it. A query is scored
+against candidate products by trigram similarity on the name (plus token overlap with the
+description), so "vermi compst 25 kg bag" still ranks "Vermicompost 25kg" first.
+"""
+import re
+import time
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Any, Dict, List, Set
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_DIGIT_ALPHA = re.compile(r"(?<=\d)(?=[a-z])|(?<=[a-z])(?=\d)")
+# Words that say nothing about which product is meant
+_STOP_WORDS = {"a", "an", "the", "of", "for", "and", "with", "bag", "bags", "pack", "packet"}
+
+NAME_WEIGHT = 0.8
+DESCRIPTION_WEIGHT = 0.2
+# Only the products sharing the most trigrams with the query are scored in full
+MAX_CANDIDATES = 64
+
+
+def normalize(text: Any) -> str:
+    text = _NON_ALNUM.sub(" ", str(text or "").lower())
+    return " ".join(_DIGIT_ALPHA.sub(" ", text).split())
+
+
+def tokens(text: str) -> List[str]:
+    return [t for t in normalize(text).split() if t not in _STOP_WORDS]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of each token padded like pg_trgm ("  ve", " ver", ..., "st ")."""
+    grams: Set[str] = set()
+    for token in tokens(text):
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductIndex:
+    def __init__(self) -> None:
+        self.products: List[Dict[str, Any]] = []
+        self._name_gram_counts: List[int] = []
+        self._name_text: List[str] = []
+        self._description_tokens: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._description_postings: Dict[str, List[int]] = {}
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at if self.built_at else float("inf")
+
+    def build(self, products: List[Dict[str, Any]]) -> None:
+        name_grams = [trigrams(p.get("name")) for p in products]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, grams in enumerate(name_grams):
+            for gram in grams:
+                postings[gram].append(i)
+        description_tokens = [set(tokens(p.get("description"))) for p in products]
+        description_postings: Dict[str, List[int]] = defaultdict(list)
+        for i, words in enumerate(description_tokens):
+            for word in words:
+                description_postings[word].append(i)
+        # Swap everything in at once so concurrent searches see one consistent index
+        with self._lock:
+            self.products = list(products)
+            self._name_gram_counts = [len(grams) for grams in name_grams]
+            self._name_text = [normalize(p.get("name")) for p in products]
+            self._description_tokens = description_tokens
+            self._postings = dict(postings)
+            self._description_postings = dict(description_postings)
+            self.built_at = time.time()
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """Best matching products as {"score", "product"} dicts, highest score first."""
+        query_grams = trigrams(query)
+        query_tokens = set(tokens(query))
+        query_text = normalize(query)
+        if not query_grams:
+            return []
+        with self._lock:
+            products, gram_counts, name_text = self.products, self._name_gram_counts, self._name_text
+            description_tokens, postings = self._description_tokens, self._postings
+            description_postings = self._description_postings
+        # Counter consumes the posting lists in C; this is most of the lookup
+        counts = Counter(chain.from_iterable(postings.get(gram, ()) for gram in query_grams))
+        shared = dict(counts.most_common(max(MAX_CANDIDATES, limit)))
+        # Products matched only through their description get a chance too
+        for word in query_tokens:
+            for i in description_postings.get(word, ()):
+                shared.setdefault(i, counts.get(i, 0))
+
+        scored = []
+        for i, common in shared.items():
+            # Containment (how much of the query the name covers) finds the product; Jaccard
+            # prefers the name with the least extra text when several contain the query
+            containment = common / len(query_grams)
+            jaccard = common / (len(query_grams) + gram_counts[i] - common)
+            name_score = (containment + jaccard) / 2
+            if query_text and query_text in name_text[i]:
+                name_score = max(name_score, 0.9)
+            words = description_tokens[i]
+            description_score = len(words & query_tokens) / len(query_tokens) if query_tokens and words else 0.0
+            score = NAME_WEIGHT * name_score + DESCRIPTION_WEIGHT * description_score
+            if score >= min_score:
+                scored.append((score, i))
+        scored.sort(key=lambda item: (-item[0], name_text[item[1]]))
+        return [{"score": round(score, 3), "product": products[i]} for score, i in scored[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self.products),
+            "trigrams": len(self._postings),
+            "age_seconds": None if not self.built_at else round(self.age_seconds, 1),
+        }
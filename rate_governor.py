@@ -0,0 +1,287 @@
+"""
+Client-side rate governor - paces LLM calls to stay under provider requests/tokens-per-minute limits
+
+Each (provider, model) gets two token buckets: requests per minute and tokens per minute. A call
+reserves one request and its estimated tokens before it is sent; if a bucket is in debt the call
+waits its turn instead of being sent and rejected. Limits start from configuration and are
+corrected from what the provider reports (OpenAI x-ratelimit-* headers, retry hints on 429s).
+Buckets are per process, so with several agent workers configure each worker's share.
+
+Limits: OPENAI_RPM / OPENAI_TPM / GEMINI_RPM / GEMINI_TPM per provider, overridden per model with
+LLM_RATE_LIMITS="gpt-4o=500/30000,gemini-2.5-pro=5/250000" (model=rpm/tpm).
+"""
+import os
+import re
+import json
+import time
+import asyncio
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+RATE_GOVERNOR = os.getenv("RATE_GOVERNOR", "on").lower() not in ("0", "off", "false", "no")
+# Longest a call may be held back; beyond this the caller should try another model instead
+RATE_MAX_WAIT_SECONDS = float(os.getenv("RATE_MAX_WAIT_SECONDS", 15))
+# Retries of the same model after a rate-limit error (each one paced by the governor)
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", 2))
+# Pause after a 429 that carries no retry hint
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", 5))
+
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "openai": (float(os.getenv("OPENAI_RPM", 500)), float(os.getenv("OPENAI_TPM", 30000))),
+    "gemini": (float(os.getenv("GEMINI_RPM", 60)), float(os.getenv("GEMINI_TPM", 1000000))),
+}
+
+
+def _model_limits_from_env(var: str) -> Dict[str, Tuple[float, float]]:
+    limits: Dict[str, Tuple[float, float]] = {}
+    for item in (os.getenv(var) or "").split(","):
+        model, _, value = item.partition("=")
+        rpm, _, tpm = value.partition("/")
+        try:
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            continue
+    return limits
+
+
+MODEL_LIMITS = _model_limits_from_env("LLM_RATE_LIMITS")
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+_RETRY_HINTS = (
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"try again in ([\d.]+)\s*s", re.IGNORECASE),
+)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an OpenAI reset header ("1s", "6m0s", "20ms") or a plain number."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def estimate_tokens(*parts: Any) -> int:
+    """Rough prompt size (~4 characters per token) of messages/contents and tool declarations."""
+    size = 0
+    for part in parts:
+        if part:
+            size += len(part) if isinstance(part, str) else len(json.dumps(part, ensure_ascii=False, default=str))
+    return size // 4 + 1
+
+
+def used_tokens(response: Any) -> Optional[int]:
+    """Total tokens reported by an OpenAI completion or Gemini result (None if absent)."""
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None) is not None:
+        return int(usage.total_tokens)
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None and getattr(metadata, "total_token_count", None):
+        return int(metadata.total_token_count)
+    return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    if name in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(error).lower()
+    return "429" in text and ("rate" in text or "quota" in text or "exhausted" in text)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Wait suggested by a rate-limit error: Retry-After headers, or the hint in Gemini's message."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RateLimitWait(Exception):
+    """The model's buckets would hold the call longer than RATE_MAX_WAIT_SECONDS."""
+
+    def __init__(self, provider: str, model: str, wait: float) -> None:
+        super().__init__(f"{provider}/{model} rate limit: next slot in {wait:.1f}s")
+        self.provider = provider
+        self.model = model
+        self.wait = wait
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `per_minute`; reservations may run it into debt."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = max(1.0, per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount: float) -> float:
+        """What `amount` is charged: a call larger than the whole bucket could never fit, so it
+        goes through at full-bucket cost."""
+        return min(amount, self.capacity)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take cost(amount) now and return how long the caller must wait until it is covered."""
+        self._refill(now)
+        self.level -= self.cost(amount)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+    def set_limit(self, per_minute: float) -> None:
+        if per_minute > 0 and per_minute != self.capacity:
+            self.capacity = per_minute
+            self.level = min(self.level, per_minute)
+
+    def cap(self, remaining: float, now: float) -> None:
+        """The provider says only `remaining` is left; never believe we have more than that."""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class ModelBudget:
+    def __init__(self, provider: str, model: str, rpm: float, tpm: float) -> None:
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # Set from 429 retry hints: nothing is sent before this (monotonic) time
+        self.blocked_until = 0.0
+        self.calls = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.requests.capacity,
+            "tpm": self.tokens.capacity,
+            "tokens_available": round(self.tokens.level),
+            "calls": self.calls,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 2),
+            "rate_limited": self.rate_limited,
+        }
+
+
+class Reservation:
+    def __init__(self, budget: ModelBudget, estimated_tokens: int) -> None:
+        self.budget = budget
+        self.estimated_tokens = estimated_tokens
+        # What the token bucket was actually charged for the estimate
+        self.charged_tokens = budget.tokens.cost(estimated_tokens)
+
+
+class RateGovernor:
+    def __init__(self, enabled: Optional[bool] = None, max_wait: Optional[float] = None) -> None:
+        self.enabled = RATE_GOVERNOR if enabled is None else enabled
+        self.max_wait = RATE_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        self.max_retries = RATE_LIMIT_RETRIES
+        self._budgets: Dict[Tuple[str, str], ModelBudget] = {}
+
+    def budget(self, provider: str, model: str) -> ModelBudget:
+        key = (provider, model)
+        budget = self._budgets.get(key)
+        if budget is None:
+            rpm, tpm = MODEL_LIMITS.get(model) or DEFAULT_LIMITS.get(provider, (60.0, 100000.0))
+            budget = self._budgets[key] = ModelBudget(provider, model, rpm, tpm)
+        return budget
+
+    async def acquire(self, provider: str, model: str, estimated_tokens: int, max_wait: Optional[float] = None) -> Reservation:
+        """Reserve a request and its tokens, sleeping until they are covered.
+
+        RateLimitWait is raised instead when that takes longer than RATE_MAX_WAIT_SECONDS or the
+        caller's `max_wait` (e.g. what is left of the turn's deadline), whichever is shorter.
+        """
+        budget = self.budget(provider, model)
+        reservation = Reservation(budget, estimated_tokens)
+        if not self.enabled:
+            return reservation
+        now = time.monotonic()
+        wait = max(
+            budget.requests.reserve(1, now),
+            budget.tokens.reserve(estimated_tokens, now),
+            budget.blocked_until - now,
+        )
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        if wait > limit:
+            budget.requests.refund(1)
+            budget.tokens.refund(reservation.charged_tokens)
+            raise RateLimitWait(provider, model, wait)
+        budget.calls += 1
+        if wait > 0:
+            budget.waits += 1
+            budget.wait_seconds += wait
+            print(f"⏳ Pacing {provider}/{model}: waiting {wait:.2f}s for rate limit headroom")
+            await asyncio.sleep(wait)
+        return reservation
+
+    def settle(self, reservation: Reservation, response: Any = None, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Correct the reservation with the tokens actually used and learn from rate-limit headers."""
+        budget = reservation.budget
+        actual = used_tokens(response) if response is not None else None
+        if actual is not None:
+            # Positive refund returns over-estimated tokens, negative takes the shortfall
+            budget.tokens.level = min(budget.tokens.capacity, budget.tokens.level + reservation.charged_tokens - actual)
+        if headers:
+            self.observe(budget, headers)
+
+    def observe(self, budget: ModelBudget, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((budget.requests, "requests"), (budget.tokens, "tokens")):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if limit:
+                    bucket.set_limit(float(limit))
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    bucket.cap(float(remaining), now)
+            except (TypeError, ValueError):
+                continue
+
+    def on_rate_limited(self, reservation: Reservation, error: BaseException) -> float:
+        """Pause the model after a 429 (provider hint, else RATE_LIMIT_BACKOFF_SECONDS). Returns the pause."""
+        budget = reservation.budget
+        budget.rate_limited += 1
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        if headers:
+            self.observe(budget, headers)
+        pause = retry_after(error)
+        if pause is None:
+            pause = parse_duration(headers.get("x-ratelimit-reset-tokens")) or RATE_LIMIT_BACKOFF_SECONDS
+        budget.blocked_until = max(budget.blocked_until, time.monotonic() + pause)
+        print(f"🚦 {budget.provider}/{budget.model} rate limited; pausing it for {pause:.1f}s")
+        return pause
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "models": {f"{p}/{m}": b.stats() for (p, m), b in self._budgets.items()},
+        }
@@ -1,35 +1,159 @@
-import redis, json
+import redis, json, os
+import msgpack
+from typing import Optional, Tuple
 
 
 
 CHAT_KEY = "admin_chat"
+# Messages kept per conversation (older ones are trimmed on write)
+MAX_HISTORY_MESSAGES = 60
+HISTORY_TTL_SECONDS = 3*24*3600  # 3 days
+# Fail fast when Redis is unreachable so the history failover kicks in quickly
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2.0))
+
+# Clear stored chat history when the agent starts/stops. Turn off when several workers
+# share Redis, otherwise one worker restarting wipes conversations served by the others.
+RESET_HISTORY_ON_RESTART = os.getenv("RESET_HISTORY_ON_RESTART", "true").lower() not in ("0", "false", "no")
+
+# New entries are written as msgpack; HISTORY_ENCODING=json keeps the old format.
+# Reads accept both, so existing JSON histories stay readable after the switch.
+HISTORY_ENCODING = os.getenv("HISTORY_ENCODING", "msgpack").lower()
+
+def history_key(conversation_id: str = None) -> str:
+    """Redis list holding a conversation's messages (shared by every worker)."""
+    return f"{CHAT_KEY}:{conversation_id}" if conversation_id else CHAT_KEY
+
+def version_key(conversation_id: str = None) -> str:
+    """Counter bumped on every write to a conversation, so readers can fetch just the new entries."""
+    return f"{CHAT_KEY}.version:{conversation_id or ''}"
+
+def tail_after(tail: list, new: int, last_entry: Optional[bytes]) -> Optional[list]:
+    """The last `new` entries of `tail` if the entry before them is `last_entry`, else None."""
+    anchored = 1 if last_entry is not None else 0
+    if len(tail) != new + anchored or (anchored and tail[0] != last_entry):
+        return None
+    return list(tail[anchored:])
+
+def _canonical(msg: dict) -> dict:
+    """
+    Keep one representation of a tool result. Gemini tool messages carry both the text
+    `content` and its parsed `structured_response`; store whichever the other derives from.
+    """
+    if msg.get("role") != "tool" or "structured_response" not in msg:
+        return msg
+    structured = msg["structured_response"]
+    content = msg.get("content")
+    if structured == {"content": content}:
+        # Content wasn't JSON; the structured form is just a wrapper around it
+        return {k: v for k, v in msg.items() if k != "structured_response"}
+    try:
+        if isinstance(content, str) and json.loads(content) == structured:
+            return {k: v for k, v in msg.items() if k != "content"}
+    except ValueError:
+        pass
+    return msg
+
+
+def encode_message(msg: dict) -> bytes:
+    msg = _canonical(msg)
+    if HISTORY_ENCODING == "json":
+        return json.dumps(msg).encode()
+    return msgpack.packb(msg, use_bin_type=True, default=str)
+
+
+def decode_message(raw: bytes) -> dict:
+    # JSON entries always start with "{"; a msgpack map never does
+    if raw[:1] == b"{":
+        msg = json.loads(raw)
+    else:
+        msg = msgpack.unpackb(raw, raw=False)
+    if msg.get("role") == "tool" and "content" not in msg and "structured_response" in msg:
+        msg["content"] = json.dumps(msg["structured_response"], ensure_ascii=False)
+    return msg
+
 
 class RedisClient:
     def __init__(self):
-        import os
         redis_url = os.getenv("REDIS_URL")
+        timeouts = {"socket_connect_timeout": REDIS_SOCKET_TIMEOUT, "socket_timeout": REDIS_SOCKET_TIMEOUT}
         if redis_url:
-            self.client = redis.from_url(redis_url)
+            self.client = redis.from_url(redis_url, **timeouts)
         else:
             host = os.getenv("REDIS_HOST", "localhost")
             port = int(os.getenv("REDIS_PORT", 6379))
-            self.client = redis.Redis(host=host, port=port, db=0)
+            self.client = redis.Redis(host=host, port=port, db=0, **timeouts)
+
+    def ping(self):
+        return self.client.ping()
+
+    def add_message(self, msg: dict, conversation_id: str = None) -> int:
+        return self.add_entry(encode_message(msg), conversation_id)
+
+    def add_entry(self, entry: bytes, conversation_id: str = None) -> int:
+        """Append an already-encoded message (one round trip). Returns the conversation's new version."""
+        return self.add_entries([entry], conversation_id)
+
+    def add_entries(self, entries: list, conversation_id: str = None) -> int:
+        """Append encoded messages in order (one round trip). Returns the conversation's new version."""
+        key, counter = history_key(conversation_id), version_key(conversation_id)
+        # MULTI so a reader never sees the entries without the version that counts them
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(key, *entries)
+        pipe.ltrim(key, -MAX_HISTORY_MESSAGES, -1)  # keep last 60 messages
+        pipe.expire(key, HISTORY_TTL_SECONDS)
+        pipe.incrby(counter, len(entries))
+        pipe.expire(counter, HISTORY_TTL_SECONDS)
+        return pipe.execute()[3]
+
+    def get_entries(self, conversation_id: str = None) -> list:
+        return self.client.lrange(history_key(conversation_id), 0, -1)
+
+    def get_entries_versioned(self, conversation_id: str = None) -> Tuple[int, list]:
+        """(version, all entries), read atomically."""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(version_key(conversation_id))
+        pipe.lrange(history_key(conversation_id), 0, -1)
+        version, entries = pipe.execute()
+        return int(version or 0), entries
 
-    def add_message(self, msg: dict):
-        self.client.rpush(CHAT_KEY, json.dumps(msg))
-        self.client.ltrim(CHAT_KEY, -60, -1)  # keep last 60 messages
-        self.client.expire(CHAT_KEY, 3*24*3600)  # 3 days TTL
+    def get_entries_since(self, conversation_id: str, version: int,
+                          last_entry: Optional[bytes]) -> Tuple[int, Optional[list]]:
+        """
+        (current version, entries written after `version`), where `last_entry` is the newest entry
+        the caller already has. The entries are None when they can't be told apart from the rest
+        (history rewritten, trimmed past that point or written meanwhile); read everything then.
+        """
+        counter = version_key(conversation_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(counter)
+                current = int(pipe.get(counter) or 0)
+                new = current - version
+                if new == 0:
+                    return current, []
+                if not 0 < new < MAX_HISTORY_MESSAGES:
+                    return current, None
+                pipe.multi()
+                pipe.lrange(history_key(conversation_id), -(new + (last_entry is not None)), -1)
+                tail = pipe.execute()[0]
+            except redis.WatchError:
+                return version, None
+        return current, tail_after(tail, new, last_entry)
 
-    def get_last_messages(self):
-        msgs = self.client.lrange(CHAT_KEY, 0, -1)
-        messages = [json.loads(m) for m in msgs]
-        print("All messages in Redis:", messages)
-        return messages
+    def get_last_messages(self, conversation_id: str = None):
+        return [decode_message(m) for m in self.get_entries(conversation_id)]
 
-    def clear_history(self):
-        """Clear the chat history from Redis."""
+    def clear_history(self, conversation_id: str = None):
+        """Clear one conversation's history, or every conversation when no id is given."""
         try:
-            self.client.delete(CHAT_KEY)
+            if conversation_id:
+                self.client.delete(history_key(conversation_id), version_key(conversation_id))
+            else:
+                self.client.delete(CHAT_KEY)
+                keys = list(self.client.scan_iter(match=f"{CHAT_KEY}:*", count=500))
+                keys += list(self.client.scan_iter(match=f"{CHAT_KEY}.version:*", count=500))
+                if keys:
+                    self.client.delete(*keys)
             print("Redis chat history cleared.")
         except Exception as e:
-            print(f"Error clearing Redis history: {e}")
\ No newline at end of file
+            print(f"Error clearing Redis history: {e}")
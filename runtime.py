@@ -0,0 +1,120 @@
+"""
+Process-wide agent runtime - one shared assistant, warmed up at startup, with readiness state
+"""
+import os
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from client import TeluguVermiFarmsClient
+from redis_client import RESET_HISTORY_ON_RESTART
+
+
+class AgentRuntime:
+    """
+    Owns the single TeluguVermiFarmsClient shared by the HTTP and Socket.IO layers.
+
+    start() is called from the ASGI lifespan hook. It builds the assistant and kicks off
+    a background warmup (Redis pool, MCP session + tool specs, provider SDKs) that retries
+    until every step succeeds; /ready reports ready only after that.
+    """
+
+    def __init__(self) -> None:
+        self._assistant: Optional[TeluguVermiFarmsClient] = None
+        self.checks: Dict[str, bool] = {"redis": False, "mcp": False, "providers": False}
+        self.last_error: Optional[str] = None
+        self.tool_count = 0
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._start_hooks: List[Callable[[], Awaitable[None]]] = []
+        self._stop_hooks: List[Callable[[], Awaitable[None]]] = []
+        self.reset_history = RESET_HISTORY_ON_RESTART
+        self.retry_delay = float(os.getenv("WARMUP_RETRY_DELAY", 1.0))
+        self.max_retry_delay = float(os.getenv("WARMUP_MAX_RETRY_DELAY", 15.0))
+
+    def on_start(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """Register an async callable run at startup (e.g. background listeners of other modules)."""
+        self._start_hooks.append(hook)
+
+    def on_stop(self, hook: Callable[[], Awaitable[None]]) -> None:
+        self._stop_hooks.append(hook)
+
+    @property
+    def assistant(self) -> TeluguVermiFarmsClient:
+        if self._assistant is None:
+            self._assistant = TeluguVermiFarmsClient()
+        return self._assistant
+
+    @property
+    def ready(self) -> bool:
+        return all(self.checks.values())
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "checks": dict(self.checks),
+            "tools": self.tool_count,
+            "error": None if self.ready else self.last_error,
+            "prefetch": self._assistant.prefetcher.stats() if self._assistant else None,
+            "history": self._assistant.history.stats() if self._assistant else None,
+            "rate_governor": self._assistant.governor.stats() if self._assistant else None,
+            "usage": self._assistant.usage.stats() if self._assistant else None,
+            "checkpoints": self._assistant.checkpoints.stats() if self._assistant else None,
+        }
+
+    async def start(self) -> None:
+        # Build eagerly so construction cost is paid at boot, not on the first request
+        _ = self.assistant
+        for hook in self._start_hooks:
+            await hook()
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_task = asyncio.create_task(self._warmup_until_ready())
+
+    async def wait_ready(self, poll_seconds: float = 0.5) -> None:
+        while not self.ready:
+            await asyncio.sleep(poll_seconds)
+
+    async def _warmup_until_ready(self) -> None:
+        delay = self.retry_delay
+        while not self.ready:
+            try:
+                await self.warmup()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ Warmup incomplete ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        print(f"✅ Agent ready ({self.tool_count} tools)")
+
+    async def warmup(self) -> None:
+        assistant = self.assistant
+        if not self.checks["redis"]:
+            await asyncio.to_thread(assistant.warm_redis, self.reset_history)
+            self.checks["redis"] = True
+        if not self.checks["providers"]:
+            assistant.warm_providers()
+            self.checks["providers"] = True
+        if not self.checks["mcp"]:
+            self.tool_count = await assistant.warm_mcp()
+            self.checks["mcp"] = True
+
+    async def stop(self) -> None:
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        for hook in self._stop_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                print(f"Error during shutdown hook: {e}")
+        if self._assistant is None:
+            return
+        if self.reset_history:
+            print("Shutting down server... Clearing Redis history.")
+            try:
+                self._assistant.history.clear_history()
+            except Exception as e:
+                print(f"Error during shutdown cleanup: {e}")
+        try:
+            await self._assistant.shutdown()
+        except Exception as e:
+            print(f"Error closing MCP session: {e}")
+
+
+runtime = AgentRuntime()
@@ -0,0 +1,265 @@
+"""
+Sales analytics over the locally synced orders - columnar NumPy arrays, vectorized group-bys
+
+SalesData keeps one array per column for orders (status, order/delivery day, total, customer)
+and for their line items (order position, product, quantity, amount). refresh() only reads the
+orders the OrderIndex stored since the last load: changed orders are masked out and re-appended,
+and the arrays are compacted once most of them is dead. Aggregations are a filter mask, group
+codes (dictionary codes directly, np.unique for dates) and np.bincount for sums and counts, so a
+question like "revenue by product last month" costs a few array passes instead of paging orders
+through the model.
+"""
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from order_index import ORDER_STATUSES, OrderIndex, field, order_lines
+
+MEASURES = ("revenue", "quantity", "orders")
+AGGREGATES = ("sum", "mean", "count")
+TIME_GROUPS = ("day", "week", "month", "weekday")
+GROUPS = ("none", "product", "customer", "status") + TIME_GROUPS
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+CANCELLED = 5
+NO_DATE = np.datetime64("NaT", "D")
+
+
+def number(value: Any) -> float:
+    # Postgres numerics arrive as strings ("450.00")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def day(value: Any) -> np.datetime64:
+    try:
+        return np.datetime64(str(value)[:10], "D") if value else NO_DATE
+    except ValueError:
+        return NO_DATE
+
+
+def line_values(line: Dict[str, Any]) -> Tuple[Any, str, float, float]:
+    """(product id, product name, quantity, amount) of an order line or batch allocation."""
+    product = line.get("product") if isinstance(line.get("product"), dict) else {}
+    product_id = field(line, "product_id", "productId", "fk_id_product", "id_product") or field(product, "id", "id_product")
+    name = field(line, "product_name", "productName") or field(product, "name") or field(line, "name")
+    quantity = number(field(line, "quantity", "quantity_allocated", "quantityAllocated", "qty"))
+    amount = field(line, "amount", "total", "total_price", "totalPrice", "line_total", "subtotal")
+    if amount is None:
+        price = field(line, "price", "unit_price", "unitPrice", "price_per_kg", "pricePerKg") or field(product, "price_per_kg")
+        amount = quantity * number(price)
+    return product_id, name, quantity, number(amount)
+
+
+class Dictionary:
+    """Dictionary encoding of a string-ish column: value -> small integer code."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Any, int] = {}
+        self.labels: List[str] = []
+
+    def code(self, value: Any, label: Optional[str] = None) -> int:
+        if value not in self.codes:
+            self.codes[value] = len(self.labels)
+            self.labels.append(label or str(value))
+        elif label and self.labels[self.codes[value]].startswith("product "):
+            self.labels[self.codes[value]] = label  # a later record carried the name
+        return self.codes[value]
+
+
+class SalesData:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.loaded_until = 0.0
+        self.generation = -1
+        self.positions: Dict[str, int] = {}
+        self.customers = Dictionary()
+        self.products = Dictionary()
+        self.o_status = np.zeros(0, np.int16)
+        self.o_created = np.zeros(0, "datetime64[D]")
+        self.o_delivery = np.zeros(0, "datetime64[D]")
+        self.o_total = np.zeros(0, np.float64)
+        self.o_customer = np.zeros(0, np.int32)
+        self.o_alive = np.zeros(0, bool)
+        self.l_order = np.zeros(0, np.int32)
+        self.l_product = np.zeros(0, np.int32)
+        self.l_quantity = np.zeros(0, np.float64)
+        self.l_amount = np.zeros(0, np.float64)
+        self.l_alive = np.zeros(0, bool)
+
+    def __len__(self) -> int:
+        return int(self.o_alive.sum())
+
+    def refresh(self, index: OrderIndex) -> int:
+        """Load orders changed in the index since the last refresh. Returns how many were (re)loaded."""
+        with self._lock:
+            if index.generation() != self.generation:
+                # Orders were deleted; positions can't be patched, reload everything
+                self._reset()
+                self.generation = index.generation()
+            rows = index.changed_since(self.loaded_until)
+            if rows:
+                self._append(rows)
+                self.loaded_until = max(row["changed_at"] for row in rows)
+                if self.o_alive.size > 1000 and self.o_alive.sum() < self.o_alive.size / 2:
+                    self._compact()
+            return len(rows)
+
+    def _append(self, rows: List[Any]) -> None:
+        base = self.o_alive.size
+        replaced = [self.positions[row["key"]] for row in rows if row["key"] in self.positions]
+        if replaced:
+            self.o_alive[replaced] = False
+            self.l_alive[np.isin(self.l_order, replaced)] = False
+        status, created, delivery, total, customer = [], [], [], [], []
+        l_order, l_product, l_quantity, l_amount = [], [], [], []
+        for offset, row in enumerate(rows):
+            order = json.loads(row["data"])
+            lines = order_lines(order) or order_lines(json.loads(row["details"]) if row["details"] else {})
+            position = base + offset
+            self.positions[row["key"]] = position
+            line_total = 0.0
+            for line in lines:
+                product_id, name, quantity, amount = line_values(line)
+                l_order.append(position)
+                l_product.append(self.products.code(product_id, name or f"product {product_id}"))
+                l_quantity.append(quantity)
+                l_amount.append(amount)
+                line_total += amount
+            order_total = field(order, "total_amount", "totalAmount", "total_price", "totalPrice",
+                                "grand_total", "total", "amount")
+            status.append(row["status"] or 0)
+            created.append(day(row["created_at"]))
+            delivery.append(day(row["delivery_date"]))
+            total.append(line_total if order_total is None else number(order_total))
+            customer.append(self.customers.code(row["customer_mobile"] or row["customer_name"],
+                                                row["customer_name"] or row["customer_mobile"]))
+        self.o_status = np.concatenate([self.o_status, np.array(status, np.int16)])
+        self.o_created = np.concatenate([self.o_created, np.array(created, "datetime64[D]")])
+        self.o_delivery = np.concatenate([self.o_delivery, np.array(delivery, "datetime64[D]")])
+        self.o_total = np.concatenate([self.o_total, np.array(total, np.float64)])
+        self.o_customer = np.concatenate([self.o_customer, np.array(customer, np.int32)])
+        self.o_alive = np.concatenate([self.o_alive, np.ones(len(rows), bool)])
+        self.l_order = np.concatenate([self.l_order, np.array(l_order, np.int32)])
+        self.l_product = np.concatenate([self.l_product, np.array(l_product, np.int32)])
+        self.l_quantity = np.concatenate([self.l_quantity, np.array(l_quantity, np.float64)])
+        self.l_amount = np.concatenate([self.l_amount, np.array(l_amount, np.float64)])
+        self.l_alive = np.concatenate([self.l_alive, np.ones(len(l_order), bool)])
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.o_alive)
+        remap = np.full(self.o_alive.size, -1, np.int32)
+        remap[keep] = np.arange(keep.size, dtype=np.int32)
+        for name in ("o_status", "o_created", "o_delivery", "o_total", "o_customer", "o_alive"):
+            setattr(self, name, getattr(self, name)[keep])
+        lines = np.flatnonzero(self.l_alive)
+        for name in ("l_product", "l_quantity", "l_amount", "l_alive"):
+            setattr(self, name, getattr(self, name)[lines])
+        self.l_order = remap[self.l_order[lines]]
+        self.positions = {key: int(remap[pos]) for key, pos in self.positions.items() if remap[pos] >= 0}
+
+    def _group_keys(self, group_by: str, orders: np.ndarray, lines: Optional[np.ndarray], date_field: str) -> np.ndarray:
+        if group_by == "product":
+            return self.l_product[lines]
+        if group_by == "customer":
+            return self.o_customer[orders]
+        if group_by == "status":
+            return self.o_status[orders]
+        if group_by == "none":
+            return np.zeros(orders.size, np.int8)
+        days = (self.o_delivery if date_field == "delivery" else self.o_created)[orders]
+        if group_by == "day":
+            return days
+        if group_by == "month":
+            return days.astype("datetime64[M]")
+        # 1970-01-01 was a Thursday: (days since epoch + 3) % 7 is 0 for Monday
+        weekday = (days.astype(np.int64) + 3) % 7
+        return weekday if group_by == "weekday" else days - weekday.astype("timedelta64[D]")
+
+    def _label(self, group_by: str, key: Any) -> Any:
+        if group_by == "product":
+            return self.products.labels[int(key)]
+        if group_by == "customer":
+            return self.customers.labels[int(key)]
+        if group_by == "status":
+            return ORDER_STATUSES.get(int(key), str(key))
+        if group_by == "weekday":
+            return WEEKDAYS[int(key)]
+        if group_by == "none":
+            return "all"
+        return str(key)
+
+    def query(self, measure: str = "revenue", aggregate: str = "sum", group_by: str = "none",
+              date_from: Optional[str] = None, date_to: Optional[str] = None, date_field: str = "created",
+              status: Optional[int] = None, include_cancelled: bool = False, top_k: int = 10,
+              sort: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate `measure` per group as a compact {"columns", "rows"} table."""
+        if measure not in MEASURES or aggregate not in AGGREGATES or group_by not in GROUPS:
+            raise ValueError(f"measure must be one of {MEASURES}, aggregate one of {AGGREGATES}, group_by one of {GROUPS}")
+        with self._lock:
+            days = self.o_delivery if date_field == "delivery" else self.o_created
+            mask = self.o_alive.copy()
+            if status is not None:
+                mask &= self.o_status == status
+            elif not include_cancelled:
+                mask &= self.o_status != CANCELLED
+            if date_from:
+                mask &= days >= day(date_from)  # NaT compares False, so undated orders drop out
+            if date_to:
+                mask &= days <= day(date_to)
+            if group_by in TIME_GROUPS:
+                mask &= ~np.isnat(days)
+
+            line_level = group_by == "product" or measure == "quantity"
+            if line_level:
+                lines = np.flatnonzero(self.l_alive & mask[self.l_order])
+                orders = self.l_order[lines]
+                keys = self._group_keys(group_by, orders, lines, date_field)
+                values = {"revenue": self.l_amount, "quantity": self.l_quantity}.get(measure)
+                values = values[lines] if values is not None else np.ones(lines.size)
+            else:
+                lines = None
+                orders = np.flatnonzero(mask)
+                keys = self._group_keys(group_by, orders, None, date_field)
+                values = self.o_total[orders] if measure == "revenue" else np.ones(orders.size)
+
+            if keys.dtype.kind in "iu":
+                # Dictionary codes are small integers: bincount them directly instead of sorting
+                present = np.bincount(keys.astype(np.intp)) if keys.size else np.zeros(0, np.intp)
+                groups = np.flatnonzero(present)
+                lookup = np.zeros(present.size, np.intp)
+                lookup[groups] = np.arange(groups.size)
+                inverse = lookup[keys.astype(np.intp)]
+            else:
+                groups, inverse = np.unique(keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=values, minlength=groups.size)
+            counts = np.bincount(inverse, minlength=groups.size).astype(np.float64)
+            if measure == "orders" and line_level:
+                # An order with several lines of one product still counts once for it
+                pairs = np.unique(inverse.astype(np.int64) * self.o_alive.size + orders)
+                sums = counts = np.bincount(pairs // self.o_alive.size, minlength=groups.size).astype(np.float64)
+            result = {"sum": sums, "count": counts}.get(aggregate)
+            if result is None:
+                result = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+            if (sort or ("group" if group_by in TIME_GROUPS else "value")) == "value":
+                order = np.argsort(-result, kind="stable")
+            else:
+                order = np.arange(groups.size)
+            top = order[:max(1, top_k)]
+            return {
+                "columns": [group_by, f"{aggregate}_{measure}", "count"],
+                "rows": [[self._label(group_by, groups[i]), round(float(result[i]), 2), int(counts[i])] for i in top],
+                "groups": int(groups.size),
+                "total": round(float(sums.sum()), 2),
+                "orders_considered": int(np.unique(orders).size if line_level else orders.size),
+                "date_field": date_field,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"orders": len(self), "lines": int(self.l_alive.sum()), "products": len(self.products.labels),
+                "customers": len(self.customers.labels)}
@@ -1,19 +1,50 @@
-from client import TeluguVermiFarmsClient
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import socketio
-from socket_server import sio
+import orjson
+from socket_server import sio, turn_queue
+from runtime import runtime
 from auth_middleware import get_current_user, JWTPayload
+from admission import admission, AdmissionRejected
+from turn_deadline import Deadline
+from stream_emitter import StreamEmitter
+from turn_queue import QueuedTurnError
+from usage_tracker import BudgetExceeded
+import asyncio
 import os
 
+class JSONResponse(Response):
+    """JSON response rendered with orjson (several times faster than the stdlib encoder)."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared assistant and warm Redis/MCP/providers before traffic arrives."""
+    await runtime.start()
+    yield
+    await runtime.stop()
+
 # Initialize FastAPI
 app = FastAPI(
     title="Ila Compost Assistant API",
     version="1.0.0",
     description="Simple FastAPI web server for AI compost assistant",
+    lifespan=lifespan,
+    # orjson instead of the stdlib encoder for every JSON response
+    default_response_class=JSONResponse,
 )
 
+# HTTP_GZIP=on compresses responses (incl. the NDJSON stream, flushed per chunk).
+# Starlette leaves text/event-stream uncompressed so SSE proxies keep working.
+if os.getenv("HTTP_GZIP", "off").lower() in ("1", "on", "true"):
+    app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("HTTP_GZIP_MIN_BYTES", 500)))
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,49 +60,234 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-assistant = TeluguVermiFarmsClient()
-
 # --- Routes ---
 @app.get("/")
 async def root():
     return {"message": "Ila compost assistant is running 🌱", "socket": "enabled"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 only once Redis, MCP tool specs and providers are warmed up."""
+    return JSONResponse(runtime.status(), status_code=200 if runtime.ready else 503)
+
 @app.post("/chat")
 async def chat(request: Request, user: JWTPayload = Depends(get_current_user)):
     """
     POST /chat
-    Body: {"message": "User text"}
+    Body: {"message": "User text", "conversationId": "optional id scoping the history",
+           "requestId": "optional client id of this turn (or an Idempotency-Key header)"}
+    Re-sending with the same requestId resumes the interrupted turn instead of starting over.
     Streams AI response as plain text
     Requires: JWT authentication via Bearer token
     """
     try:
-        data = await request.json()
+        data = await _json_body(request)
+        if data is None:
+            return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
         user_msg = data.get("message")
-        print('User Message ====', user_msg)
-        print('Authenticated User:', user.email)
+        conversation_id = data.get("conversationId")
+        request_id = _request_id(request, data)
+        # The budget covers waiting for admission as well as the turn itself
+        deadline = Deadline.for_endpoint("chat")
         if not user_msg:
             return JSONResponse({"error": "Missing 'message' field"}, status_code=400)
         # Fetch history through assistant method so we can change storage later without touching server
-        history = assistant.get_history()
-        print('History ====', history)
-        # Use unified chat method which handles provider selection
-        response = await assistant.chat(history, user_msg)
+        assistant = runtime.assistant
+        history = assistant.get_history(conversation_id) if turn_queue is None else []
+        # Use unified chat method which handles provider selection.
+        # Admission control bounds concurrent turns; overload gets a fast 429 instead of queueing forever.
+        async with admission.admit(f"user:{user.userId}"):
+            if turn_queue is not None:
+                # Run on the agent worker pool; the worker reads history itself
+                payload = {"message": user_msg, "conversationId": conversation_id, "userId": user.userId, "requestId": request_id,
+                           "deadline": deadline.at}
+                response = await asyncio.wait_for(turn_queue.run(payload), timeout=deadline.remaining() + 5)
+            else:
+                response = await asyncio.wait_for(assistant.chat(history, user_msg, conversation_id=conversation_id, user_id=user.userId,
+                                                                 request_id=request_id, deadline=deadline),
+                                                  timeout=deadline.remaining())
             
         return JSONResponse({"response": response}, status_code=200)
 
-        
+    except BudgetExceeded as e:
+        return JSONResponse({"error": str(e), "budget": True}, status_code=429)
+    except QueuedTurnError as e:
+        if e.code == "budget":
+            return JSONResponse({"error": str(e), "budget": True}, status_code=429)
+        return JSONResponse({"error": str(e)}, status_code=500)
 
+    except AdmissionRejected as e:
+        return JSONResponse(
+            {"error": e.reason, "busy": True},
+            status_code=429,
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": "The assistant took too long to respond. Please try again."}, status_code=504)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clear Redis conversation history on server shutdown."""
-    print("Shutting down server... Clearing Redis history.")
+async def _json_body(request: Request):
+    """The request body if it is a JSON object, else None (malformed or some other JSON value)."""
     try:
-        assistant.redis_client.clear_history()
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _request_id(request: Request, data: dict):
+    """Client-chosen id of this turn: retries that reuse it resume the turn's checkpoint."""
+    return data.get("requestId") or request.headers.get("idempotency-key") or None
+
+def _stream_format(request: Request) -> str:
+    fmt = request.query_params.get("format")
+    if fmt in ("sse", "ndjson"):
+        return fmt
+    return "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+
+def _encode_event(event: dict, fmt: str) -> bytes:
+    data = orjson.dumps(event)
+    if fmt == "sse":
+        return b"event: " + event["type"].encode() + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+async def _run_streamed_turn(user_msg: str, conversation_id, user: JWTPayload, events: asyncio.Queue, request_id=None) -> None:
+    """Run one turn, putting status/tool/chunk/complete/error events on `events` (None ends the stream)."""
+    deadline = Deadline.for_endpoint("chat_stream")
+    stream = StreamEmitter(lambda frame: events.put({"type": "chunk", **frame}), conversation_id)
+    try:
+        await events.put({"type": "status", "status": "thinking", "conversationId": conversation_id})
+        if turn_queue is not None:
+            async def relay(event):
+                # Worker events: re-batch its chunks, pass status/tool progress through
+                if event.get("type") == "chunk":
+                    await stream.write(event.get("chunk", ""))
+                elif event.get("status") != "thinking":
+                    await stream.flush()
+                    await events.put({**event, "conversationId": conversation_id})
+            payload = {"message": user_msg, "conversationId": conversation_id, "userId": user.userId, "requestId": request_id,
+                       "deadline": deadline.at}
+            response = await asyncio.wait_for(turn_queue.run(payload, on_event=relay), timeout=deadline.remaining() + 5)
+            streamed = True
+        else:
+            assistant = runtime.assistant
+            history = assistant.get_history(conversation_id)
+            async def progress(event):
+                await events.put({**event, "conversationId": conversation_id})
+            response = await asyncio.wait_for(
+                assistant.chat(history, user_msg, conversation_id=conversation_id, on_event=progress, user_id=user.userId,
+                               request_id=request_id, deadline=deadline),
+                timeout=deadline.remaining(),
+            )
+            streamed = False
+        if not response:
+            await events.put({"type": "error", "code": "empty", "message": "No response from assistant", "conversationId": conversation_id})
+            return
+        if not streamed:
+            await stream.write(response)
+        await stream.close()
+        await events.put({"type": "complete", "fullResponse": response, "conversationId": conversation_id})
+    except asyncio.TimeoutError:
+        await events.put({"type": "error", "code": "timeout", "message": "The assistant took too long to respond. Please try again.", "conversationId": conversation_id})
+    except BudgetExceeded as e:
+        await events.put({"type": "error", "code": "budget", "message": str(e), "conversationId": conversation_id})
+    except QueuedTurnError as e:
+        await events.put({"type": "error", "code": e.code or "internal", "message": str(e), "conversationId": conversation_id})
     except Exception as e:
-        print(f"Error during shutdown cleanup: {e}")
+        print(f"❌ Streamed chat error: {e}")
+        await events.put({"type": "error", "code": "internal", "message": "An internal error occurred. Please try again later.", "conversationId": conversation_id})
+    finally:
+        await events.put(None)
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request, user: JWTPayload = Depends(get_current_user)):
+    """
+    POST /chat/stream
+    Body: same as /chat
+    Streams the turn as NDJSON (default) or server-sent events (`Accept: text/event-stream`
+    or `?format=sse`): status, tool progress, chunk frames, then complete or error.
+    Requires: JWT authentication via Bearer token
+    """
+    data = await _json_body(request)
+    if data is None:
+        return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+    user_msg = data.get("message")
+    conversation_id = data.get("conversationId")
+    request_id = _request_id(request, data)
+    if not user_msg:
+        return JSONResponse({"error": "Missing 'message' field"}, status_code=400)
+    user_key = f"user:{user.userId}"
+    # Admit before the response starts so overload is still a plain 429
+    try:
+        await admission.acquire(user_key)
+    except AdmissionRejected as e:
+        return JSONResponse(
+            {"error": e.reason, "busy": True},
+            status_code=429,
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
+    fmt = _stream_format(request)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_admitted():
+        # The turn task owns the admission slot, so it is freed even if the body never starts
+        try:
+            await _run_streamed_turn(user_msg, conversation_id, user, events, request_id)
+        finally:
+            await admission.release(user_key)
+
+    turn = asyncio.create_task(run_admitted())
+
+    async def body():
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield _encode_event(event, fmt)
+        finally:
+            # Client went away: stop the LLM/tool loop instead of finishing it for nobody
+            if not turn.done():
+                turn.cancel()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if fmt == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Users allowed to see global usage and other users' usage
+USAGE_ADMIN_USER_IDS = {u.strip() for u in os.getenv("USAGE_ADMIN_USER_IDS", "").split(",") if u.strip()}
+
+@app.get("/usage")
+async def usage(request: Request, user: JWTPayload = Depends(get_current_user)):
+    """
+    GET /usage?hours=24                  - the caller's LLM token usage and cost over the last `hours`
+    GET /usage?conversationId=...        - totals and recent turns of one of the caller's conversations
+    GET /usage?scope=all or ?userId=...  - global / another user's usage (USAGE_ADMIN_USER_IDS only)
+    Requires: JWT authentication via Bearer token
+    """
+    tracker = runtime.assistant.usage
+    params = request.query_params
+    is_admin = str(user.userId) in USAGE_ADMIN_USER_IDS
+    try:
+        hours = int(params.get("hours", 24))
+    except ValueError:
+        return JSONResponse({"error": "'hours' must be an integer"}, status_code=400)
+    conversation_id = params.get("conversationId")
+    if conversation_id:
+        report = tracker.conversation(conversation_id)
+        if report["userId"] not in (None, str(user.userId)) and not is_admin:
+            return JSONResponse({"error": "Not your conversation"}, status_code=403)
+        return report
+    if params.get("scope") == "all":
+        if not is_admin:
+            return JSONResponse({"error": "Admin only"}, status_code=403)
+        return {"scope": "all", **tracker.global_window(hours)}
+    target = params.get("userId") or str(user.userId)
+    if target != str(user.userId) and not is_admin:
+        return JSONResponse({"error": "Admin only"}, status_code=403)
+    return {"userId": target, **tracker.user_window(target, hours)}
 
 # Wrap FastAPI with Socket.IO ASGI app
 socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
@@ -1,63 +1,222 @@
 """
 Socket.IO server for Agent - handles real-time chat with BE Server
 """
+import os
 import socketio
 import asyncio
-from client import TeluguVermiFarmsClient
+import uuid
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from runtime import runtime
+from auth_middleware import verify_access_token
+from turn_registry import TurnRegistry, socketio_redis_url
+from turn_queue import TurnQueue, QueuedTurnError, queue_enabled, queue_redis_url
+from admission import admission, AdmissionRejected
+from turn_deadline import Deadline
+from stream_emitter import StreamEmitter
+from usage_tracker import BudgetExceeded
 
-# Create Socket.IO server (async mode)
+# Create Socket.IO server (async mode).
+# SOCKETIO_MANAGER=redis switches to a Redis-backed client manager so emits reach the
+# right sid from any uvicorn worker / node (run with e.g. `uvicorn server:socket_app --workers 4`).
+_manager_url = socketio_redis_url()
 sio = socketio.AsyncServer(
     async_mode='asgi',
-    cors_allowed_origins=['http://localhost:3000', 'http://127.0.0.1:3000', '*']
+    cors_allowed_origins=['http://localhost:3000', 'http://127.0.0.1:3000', '*'],
+    client_manager=socketio.AsyncRedisManager(_manager_url) if _manager_url else None
 )
 
-# Initialize the assistant client
-assistant = TeluguVermiFarmsClient()
+# TURN_EXECUTION=queue: turns run in agent_worker.py processes and this process only relays events
+turn_queue = TurnQueue() if queue_enabled() else None
+
+# In-flight turns, one per conversation; cancels propagate across workers via Redis when enabled
+turns = TurnRegistry(redis_url=_manager_url or (queue_redis_url() if turn_queue else None))
+runtime.on_start(turns.start_listener)
+runtime.on_stop(turns.stop_listener)
+
+# SOCKET_AUTH=off accepts unauthenticated connections (local development only)
+SOCKET_AUTH_REQUIRED = os.getenv('SOCKET_AUTH', 'required').lower() not in ('0', 'off', 'false')
+# SOCKET_QUERY_TOKEN=on also reads ?token= (URLs end up in proxy/access logs, so it's off by default)
+SOCKET_QUERY_TOKEN = os.getenv('SOCKET_QUERY_TOKEN', 'off').lower() in ('1', 'on', 'true')
+
+def _connect_token(environ, auth):
+    """Token from the Socket.IO auth payload or the Authorization header (or ?token= when SOCKET_QUERY_TOKEN=on)."""
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    if isinstance(auth, str) and auth:
+        return auth
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):]
+    if SOCKET_QUERY_TOKEN:
+        return (parse_qs(environ.get('QUERY_STRING', '')).get('token') or [None])[0]
+    return None
 
 @sio.event
-async def connect(sid, environ):
-    print(f'✅ BE Server connected: {sid}')
+async def connect(sid, environ, auth=None):
+    token = _connect_token(environ, auth)
+    user = None
+    if token:
+        try:
+            user = verify_access_token(token)
+        except HTTPException as e:
+            print(f'🔒 Rejected socket {sid}: {e.detail}')
+            raise socketio.exceptions.ConnectionRefusedError(e.detail)
+    elif SOCKET_AUTH_REQUIRED:
+        print(f'🔒 Rejected socket {sid}: no token')
+        raise socketio.exceptions.ConnectionRefusedError('Authentication required')
+    # Identity is bound to the session; messages on this socket don't re-authenticate it
+    await sio.save_session(sid, {'user': user.to_dict() if user else None})
+    print(f'✅ BE Server connected: {sid}' + (f' (user {user.userId})' if user else ''))
 
 @sio.event
 async def disconnect(sid):
     print(f'❌ BE Server disconnected: {sid}')
+    # Nobody is listening any more; stop the LLM/tool loops this socket started
+    turns.cancel_sid(sid)
 
 @sio.on('chat:send')
 async def handle_chat(sid, data):
     """
     Handle chat message from BE Server
-    data: { message: str, conversationId: str, userId: int, userToken: str }
+    data: { message: str, conversationId: str, userId: int, userToken: str, requestId?: str }
+    (re-sending with the same requestId resumes an interrupted turn from its checkpoint)
+
+    Each turn runs as a tracked task per conversation; a newer message for the same
+    conversation supersedes (cancels) the previous one. The socket was authenticated at
+    connect; a forwarded userToken is checked against the verified-token cache.
     """
+    conversation_id = data.get('conversationId', '')
+    session = await sio.get_session(sid)
+    user = session.get('user')
+    user_token = data.get('userToken')
+    if user_token and SOCKET_AUTH_REQUIRED:
+        # Per-user token forwarded by the BE server; cached after first verification
+        try:
+            user = verify_access_token(user_token).to_dict()
+        except HTTPException as e:
+            await sio.emit('chat:error', {
+                'message': e.detail,
+                'code': 'unauthorized',
+                'conversationId': conversation_id
+            }, room=sid)
+            return
+    if user is None and SOCKET_AUTH_REQUIRED:
+        await sio.emit('chat:error', {
+            'message': 'Authentication required',
+            'code': 'unauthorized',
+            'conversationId': conversation_id
+        }, room=sid)
+        return
+    if user is not None:
+        # Trust the verified identity over the userId field in the payload
+        data = {**data, 'userId': user.get('userId')}
+    turn_id = uuid.uuid4().hex
+    await turns.start(sid, conversation_id or f'sid:{sid}', _run_turn(sid, data, turn_id), turn_id=turn_id)
+
+def _stream_emitter(sid, conversation_id):
+    """chat:stream frames for one answer, batched by time window / size (see stream_emitter.py)."""
+    async def send(frame):
+        await sio.emit('chat:stream', frame, room=sid)
+    return StreamEmitter(send, conversation_id)
+
+async def _emit_tool_status(sid, conversation_id, event):
+    """Tool progress as chat:status {'status': 'tool', 'tool', 'phase', ...}."""
+    await sio.emit('chat:status', {
+        'status': 'tool',
+        **{k: v for k, v in event.items() if k != 'type'},
+        'conversationId': conversation_id
+    }, room=sid)
+
+async def _relay_queued_turn(sid, data, turn_id, deadline):
+    """Enqueue the turn for the agent workers and relay their events; status and tool progress arrive
+    live, the answer's chunks once the worker has the whole answer (re-batched as chat:stream frames)."""
+    conversation_id = data.get('conversationId', '')
+    stream = _stream_emitter(sid, conversation_id)
+
+    async def on_event(event):
+        if event.get('type') == 'chunk':
+            await stream.write(event.get('chunk', ''))
+        elif event.get('type') == 'status' and event.get('status') != 'thinking':
+            # Keep frames and status updates in order
+            await stream.flush()
+            await sio.emit('chat:status', {
+                'status': event.get('status'),
+                'conversationId': conversation_id
+            }, room=sid)
+        elif event.get('type') == 'tool':
+            await _emit_tool_status(sid, conversation_id, event)
+
+    payload = {
+        'message': data.get('message', ''),
+        'conversationId': conversation_id,
+        'userId': data.get('userId'),
+        'userToken': data.get('userToken', ''),
+        'requestId': data.get('requestId'),
+        'deadline': deadline.at,
+    }
+    try:
+        response = await turn_queue.run(payload, turn_id=turn_id, on_event=on_event)
+        await stream.close()
+        return response
+    except asyncio.CancelledError:
+        stream.abort()
+        # Tell the worker running it to stop as well
+        await turns.cancel_remote(conversation_id or f'sid:{sid}', turn_id)
+        raise
+
+async def _run_turn(sid, data, turn_id=None):
     message = data.get('message', '')
     conversation_id = data.get('conversationId', '')
     user_id = data.get('userId')
     user_token = data.get('userToken', '')  # Get token from BE server
     
-    print(f'📨 Message from BE Server (user {user_id}): {message}')
+    # Length only: message text and history carry customer details
+    print(f'📨 Message from BE Server (user {user_id}, {len(message)} chars)')
+    deadline = Deadline.for_endpoint('socket')
     
     try:
-        # Get conversation history
-        history = assistant.get_history()
-        
-        # Send "thinking" status
-        await sio.emit('chat:status', {
-            'status': 'thinking',
-            'conversationId': conversation_id
-        }, room=sid)
-        
-        # Get response using unified chat interface (handles Gemini/OpenAI switching)
-        response = await assistant.chat(history, message, user_token)
+        # Reserve a turn slot first so an overloaded agent answers "busy" immediately
+        async with admission.admit(f"user:{user_id}" if user_id is not None else f"sid:{sid}"):
+            # Send "thinking" status
+            await sio.emit('chat:status', {
+                'status': 'thinking',
+                'conversationId': conversation_id
+            }, room=sid)
+            
+            if turn_queue is not None:
+                # Chunks are streamed by the relay as the worker publishes them
+                response = await asyncio.wait_for(
+                    _relay_queued_turn(sid, data, turn_id, deadline),
+                    timeout=deadline.remaining() + 5
+                )
+                streamed = True
+            else:
+                assistant = runtime.assistant
+                # Get conversation history
+                history = assistant.get_history(conversation_id)
+                
+                # Get response using unified chat interface (handles Gemini/OpenAI switching)
+                async def progress(event):
+                    await _emit_tool_status(sid, conversation_id, event)
+
+                response = await asyncio.wait_for(
+                    assistant.chat(history, message, user_token, conversation_id=conversation_id, on_event=progress, user_id=user_id,
+                                   request_id=data.get('requestId'), deadline=deadline),
+                    timeout=deadline.remaining()
+                )
+                streamed = False
         
-        if response:
-            # Stream the response word by word
-            words = (response or "").split(' ')
-            for i, word in enumerate(words):
-                await sio.emit('chat:stream', {
-                    'chunk': word + ' ',
-                    'index': i,
-                    'conversationId': conversation_id
-                }, room=sid)
-                await asyncio.sleep(0.01)  # Reduced delay for faster streaming
+        if response and streamed:
+            await sio.emit('chat:complete', {
+                'conversationId': conversation_id,
+                'fullResponse': response
+            }, room=sid)
+        elif response:
+            # Whole answer is available: send it as a few size-bounded frames
+            stream = _stream_emitter(sid, conversation_id)
+            await stream.write(response)
+            await stream.close()
             
             # Signal completion
             await sio.emit('chat:complete', {
@@ -70,6 +229,32 @@ async def handle_chat(sid, data):
                 'conversationId': conversation_id
             }, room=sid)
             
+    except AdmissionRejected as e:
+        print(f'🚦 Turn rejected for user {user_id}: {e.reason}')
+        await sio.emit('chat:error', {
+            'message': 'The assistant is busy right now. Please try again in a moment.',
+            'code': 'busy',
+            'retryAfter': e.retry_after,
+            'conversationId': conversation_id
+        }, room=sid)
+    except (BudgetExceeded, QueuedTurnError) as e:
+        over_budget = isinstance(e, BudgetExceeded) or e.code == 'budget'
+        print(f'{"💸" if over_budget else "❌"} Turn failed for user {user_id}: {e}')
+        await sio.emit('chat:error', {
+            'message': str(e) if over_budget else 'An internal error occurred. Please try again later.',
+            'code': 'budget' if over_budget else (e.code or 'internal'),
+            'conversationId': conversation_id
+        }, room=sid)
+    except asyncio.CancelledError:
+        print(f'🛑 Turn cancelled for user {user_id} (conversation {conversation_id})')
+        raise
+    except asyncio.TimeoutError:
+        print(f'⏱️ Turn timed out for user {user_id}')
+        await sio.emit('chat:error', {
+            'message': 'The assistant took too long to respond. Please try again.',
+            'code': 'timeout',
+            'conversationId': conversation_id
+        }, room=sid)
     except Exception as e:
         print(f'❌ Chat error: {e}')
         # Send generic error to user, log actual error
@@ -83,8 +268,8 @@ async def handle_ping(sid):
     print(f'🏓 Ping from {sid}')
     await sio.emit('pong', {'timestamp': asyncio.get_event_loop().time()}, room=sid)
 
-# Create ASGI app
-app = socketio.ASGIApp(sio)
+# Create ASGI app (standalone mode; server.py mounts sio with FastAPI's lifespan instead)
+app = socketio.ASGIApp(sio, on_startup=runtime.start, on_shutdown=runtime.stop)
 
 if __name__ == '__main__':
     import uvicorn
@@ -1,12 +1,16 @@
 #!/bin/bash
 
-# Start the MCP server in the background
-echo "Starting MCP Server..."
-python mcp-server.py &
+# Start the MCP server in the background, unless the agent mounts it in-process
+# (MCP_SERVER_URL=inproc://)
+if [[ "$MCP_SERVER_URL" == inproc://* ]]; then
+    echo "MCP Server runs in-process with the agent"
+else
+    echo "Starting MCP Server..."
+    python mcp-server.py &
+fi
 
-# Wait a moment for MCP server to initialize
-sleep 5
-
-# Start the main application
+# Start the main application.
+# No fixed sleep: the agent warms up in the background (retrying until the MCP server
+# answers) and GET /ready only returns 200 once Redis, MCP tools and providers are ready.
 echo "Starting Agent Server..."
 uvicorn server:socket_app --host 0.0.0.0 --port $PORT
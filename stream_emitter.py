@@ -0,0 +1,96 @@
+"""
+Batched streaming emitter - coalesces answer text into chat:stream frames by time window or size
+
+Instead of one event per word, text written to a StreamEmitter is sent as a frame when the
+buffer reaches STREAM_MAX_FRAME_BYTES or STREAM_WINDOW_MS after its first unsent byte,
+whichever comes first. Frames carry a sequence number (`seq`, mirrored in `index` for
+existing clients) and, with STREAM_COMPRESSION=deflate, large frames are sent as a
+zlib-deflated binary `data` field instead of `chunk`.
+"""
+import os
+import zlib
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+STREAM_WINDOW_MS = float(os.getenv("STREAM_WINDOW_MS", 40))
+STREAM_MAX_FRAME_BYTES = int(os.getenv("STREAM_MAX_FRAME_BYTES", 2048))
+STREAM_COMPRESSION = os.getenv("STREAM_COMPRESSION", "off").lower()
+# Deflate only pays off past a few hundred bytes
+STREAM_COMPRESS_MIN_BYTES = int(os.getenv("STREAM_COMPRESS_MIN_BYTES", 512))
+
+
+class StreamEmitter:
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[None]], conversation_id: str,
+                 window_ms: Optional[float] = None, max_bytes: Optional[int] = None,
+                 compress: Optional[bool] = None) -> None:
+        self.send = send
+        self.conversation_id = conversation_id
+        self.window = (STREAM_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_bytes = max_bytes or STREAM_MAX_FRAME_BYTES
+        self.compress = STREAM_COMPRESSION == "deflate" if compress is None else compress
+        self.seq = 0
+        self.frames = 0
+        self.bytes_sent = 0
+        self._parts: list = []
+        self._size = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def write(self, text: str) -> None:
+        if not text:
+            return
+        # Split large writes into frames of about max_bytes, at a space where possible
+        # (the budget is counted in characters, so non-ASCII frames come out somewhat larger)
+        while self._size + len(text) > self.max_bytes:
+            room = max(1, self.max_bytes - self._size)
+            cut = text.rfind(" ", 0, room) + 1 or room
+            self._parts.append(text[:cut])
+            self._size += len(text[:cut].encode())
+            text = text[cut:]
+            await self.flush()
+        if not text:
+            return
+        self._parts.append(text)
+        self._size += len(text.encode())
+        if self._size >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._parts:
+                return
+            text = "".join(self._parts)
+            self._parts, self._size = [], 0
+            frame: Dict[str, Any] = {"seq": self.seq, "index": self.seq, "conversationId": self.conversation_id}
+            raw = text.encode()
+            if self.compress and len(raw) >= STREAM_COMPRESS_MIN_BYTES:
+                frame["data"] = zlib.compress(raw, 6)
+                frame["encoding"] = "deflate"
+                self.bytes_sent += len(frame["data"])
+            else:
+                frame["chunk"] = text
+                self.bytes_sent += len(raw)
+            self.seq += 1
+            self.frames += 1
+            await self.send(frame)
+
+    async def close(self) -> None:
+        """Send whatever is still buffered (call before chat:complete)."""
+        await self.flush()
+
+    def abort(self) -> None:
+        """Drop buffered text without sending it (e.g. the turn was cancelled)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._parts, self._size = [], 0
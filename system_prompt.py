@@ -57,6 +57,9 @@ Do not try to hallucinate a tool or give a workaround unless it uses the availab
             - All the fields are required.
           v. Get Product Count:
             - Get the count of products with filters: name, description,limit, offset.
+          vi. Resolve Products:
+            - Match a partial or misspelled product name to product IDs and prices in one call.
+            - Use it before creating orders or stock batches instead of guessing several fetch_products searches.
         2. Orders:
           i.- **Fetch Orders**: Get a list of orders.
             - You can filter by:
@@ -85,6 +88,9 @@ Do not try to hallucinate a tool or give a workaround unless it uses the availab
             - **IMPORTANT:** If the user provided product details in a previous message, USE THEM. Do not say "I missed including items". Construct the `items` list from the chat history.
           vii. Check Stock Availability:
              - Check if stock is sufficient for a list of items before placing an order.
+          viii. Search Orders:
+             - Find orders from a partial or misspelled customer name, email, mobile fragment, order unique id or status word in one call.
+             - Prefer it over repeated fetch_orders attempts when the user gives incomplete customer details; use fetch_order_details for items.
         3. Stock Batches:
           i. Fetch Batches:
             - Filters: batchCode, productIds (CSV), fromStartDate, toStartDate, fromEndDate, toEndDate, onlyActive (default true), limit, offset.
@@ -97,9 +103,10 @@ Do not try to hallucinate a tool or give a workaround unless it uses the availab
             - Hard delete by id.
         - Enquiries: submit enquiry; fetch all; get count.
       4. Analytics Related Query:
-        - When you get some analytics related query, you might not get the exact functionality from available tools.
-        - For Example, User might ask what is revenue last month?. For this you do not have a direct tool, but you can fetch orders for given time peroid and process it.
-        - So think carefully and do a step by step analysis and give the final answer.
+        - Use sales_analytics for revenue, quantity and order-count questions: it aggregates all orders in one call.
+        - For Example, "revenue by product last month" is measure=revenue, group_by=product with date_from/date_to of last month;
+          "average order size this week" is aggregate=mean with this week's dates; "which day had most orders" is measure=orders, group_by=day, sort=value, top_k=1.
+        - Only when sales_analytics cannot express the question, fetch orders for the time period and process them step by step.
 
         Guidance:
         - Dates: prefer ISO 8601 (YYYY-MM-DD). If user says "tomorrow/next week", translate to concrete ISO date based on Today's Date: {today_date}.
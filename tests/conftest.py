@@ -0,0 +1,56 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+
+@pytest.fixture
+def load_mcp_server(monkeypatch):
+    """Import mcp-server.py the way inproc:// does, with the backend replaced by `handler`."""
+    import requests
+
+    def load(handler=None):
+        calls = []
+
+        def fake_request(method, url, **kwargs):
+            calls.append((method, url, kwargs))
+            if handler is not None:
+                return handler(method, url, **kwargs)
+            return FakeResponse({"success": True, "data": {"apiKey": "test-key-0123456789"}})
+
+        monkeypatch.setattr(requests, "request", fake_request)
+        spec = importlib.util.spec_from_file_location("mcp_server_under_test", os.path.join(ROOT, "mcp-server.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.backend_calls = calls
+        return module
+
+    return load
+
+
+@pytest.fixture
+def redis_history():
+    """RedisClient (history commands) backed by fakeredis."""
+    import fakeredis
+    from redis_client import RedisClient
+    primary = RedisClient()
+    primary.client = fakeredis.FakeRedis()
+    return primary
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_explicit_zero_limits_are_kept(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_TURNS", "8")
+    monkeypatch.setenv("MAX_TURNS_PER_USER", "2")
+    controller = AdmissionController(max_concurrent=0, max_per_user=0, max_queue=0)
+    assert (controller.max_concurrent, controller.max_per_user) == (0, 0)
+    with pytest.raises(AdmissionRejected):
+        run(controller.acquire("user:1"))
+
+
+def test_env_defaults_apply_when_not_given(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_TURNS", "3")
+    monkeypatch.setenv("MAX_TURNS_PER_USER", "1")
+    controller = AdmissionController()
+    assert (controller.max_concurrent, controller.max_per_user) == (3, 1)
+
+
+def test_per_user_limit_holds_under_concurrent_acquires():
+    controller = AdmissionController(max_concurrent=10, max_per_user=2, max_queue=10, queue_timeout=1)
+
+    async def scenario():
+        cond = controller._condition()
+        # Hold the lock so every acquire has passed its entry point before any gets in
+        async with cond:
+            tasks = [asyncio.create_task(controller.acquire("user:1")) for _ in range(5)]
+            await asyncio.sleep(0)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = run(scenario())
+    admitted = [r for r in results if r is None]
+    rejected = [r for r in results if isinstance(r, AdmissionRejected)]
+    assert (len(admitted), len(rejected)) == (2, 3)
+    assert controller._per_user["user:1"] == 2
+
+
+def test_queued_turn_gets_the_released_slot():
+    controller = AdmissionController(max_concurrent=1, max_per_user=2, max_queue=1, queue_timeout=1)
+
+    async def scenario():
+        await controller.acquire("user:1")
+        waiter = asyncio.create_task(controller.acquire("user:2"))
+        await asyncio.sleep(0.01)
+        assert controller.stats()["waiting"] == 1
+        # Queue is full: a third turn is turned away immediately
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("user:3")
+        await controller.release("user:1")
+        await asyncio.wait_for(waiter, 1)
+        return controller.stats()
+
+    stats = run(scenario())
+    assert (stats["active"], stats["waiting"], stats["users"]) == (1, 0, 1)
+
+
+def test_queue_timeout_rejects_and_frees_the_user_slot():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=1, queue_timeout=0.05)
+
+    async def scenario():
+        await controller.acquire("user:1")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("user:2")
+        return controller._per_user
+
+    assert run(scenario()) == {"user:1": 1}
+
+
+def test_admit_releases_on_error():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with controller.admit("user:1"):
+                raise RuntimeError("turn failed")
+        async with controller.admit("user:1"):
+            pass
+        return controller.stats()
+
+    assert run(scenario())["active"] == 0
@@ -0,0 +1,97 @@
+import jwt
+import pytest
+from fastapi import HTTPException
+
+import auth_middleware
+import socket_server
+from auth_middleware import JWTPayload, VerifiedTokenCache, token_cache, verify_access_token
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth_middleware.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+def user(user_id=1):
+    return JWTPayload(userId=user_id, email="admin@example.com", name="Admin", userCode="A1")
+
+
+def test_entry_is_served_until_the_tokens_exp(clock):
+    cache = VerifiedTokenCache()
+    cache.put("token", user(), exp=clock.now + 60)
+
+    clock.now += 59
+    assert cache.get("token").userId == 1
+    clock.now += 1
+    assert cache.get("token") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_token_without_exp_uses_the_fallback_ttl(clock):
+    cache = VerifiedTokenCache()
+    cache.put("token", user(), exp=None)
+
+    clock.now += auth_middleware.TOKEN_CACHE_TTL - 1
+    assert cache.get("token") is not None
+    clock.now += 1
+    assert cache.get("token") is None
+
+
+def test_cache_keeps_only_the_most_recently_used_tokens():
+    cache = VerifiedTokenCache(max_size=2)
+    cache.put("a", user(1), exp=None)
+    cache.put("b", user(2), exp=None)
+    cache.get("a")
+    cache.put("c", user(3), exp=None)
+
+    assert cache.get("b") is None
+    assert cache.get("a").userId == 1 and cache.get("c").userId == 3
+
+
+def test_tampered_token_misses_the_cache_and_is_rejected():
+    token = jwt.encode({"userId": 7, "email": "u@example.com", "name": "U", "userCode": "U7"}, auth_middleware.JWT_SECRET, algorithm="HS256")
+    assert verify_access_token(token).userId == 7
+    header, payload, signature = token.split(".")
+    tampered = ".".join([header, payload, signature[:-2] + ("AA" if signature[-2:] != "AA" else "BB")])
+
+    misses = token_cache.misses
+    with pytest.raises(HTTPException) as rejected:
+        verify_access_token(tampered)
+
+    assert rejected.value.status_code == 401
+    assert token_cache.misses == misses + 1
+    assert verify_access_token(token).userId == 7
+
+
+def test_expired_token_is_rejected_not_cached(clock):
+    token = jwt.encode({"userId": 7, "exp": 1}, auth_middleware.JWT_SECRET, algorithm="HS256")
+
+    with pytest.raises(HTTPException):
+        verify_access_token(token)
+    assert token_cache.get(token) is None
+
+
+def test_query_string_token_is_ignored_unless_enabled(monkeypatch):
+    environ = {"QUERY_STRING": "EIO=4&token=from-the-url"}
+
+    assert socket_server._connect_token(environ, None) is None
+    assert socket_server._connect_token({**environ, "HTTP_AUTHORIZATION": "Bearer from-header"}, None) == "from-header"
+    monkeypatch.setattr(socket_server, "SOCKET_QUERY_TOKEN", True)
+    assert socket_server._connect_token(environ, None) == "from-the-url"
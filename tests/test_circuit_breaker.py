@@ -0,0 +1,69 @@
+import pytest
+import requests
+from conftest import FakeResponse
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+def open_breaker(reset_timeout=60.0):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure("boom")
+    assert breaker.state == CLOSED
+    breaker.record_failure("boom")
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_open_breaker_fails_fast():
+    breaker = open_breaker()
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.retry_in() > 0
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # The trial is still in flight: nobody else gets through
+    assert not breaker.allow()
+
+
+def test_half_open_trial_success_closes():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    assert breaker.record_success() is True
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN
+    # With reset_timeout=0 the next caller is the new trial
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_backend_request_settles_half_open_trial_on_unexpected_errors(load_mcp_server, monkeypatch):
+    module = load_mcp_server()
+    route = module.backend_route("/order/orders")
+    route.breaker.reset_timeout = 0
+    for _ in range(route.breaker.failure_threshold):
+        route.breaker.record_failure("down")
+    assert route.breaker.state == OPEN
+
+    def invalid(method, url, **kwargs):
+        raise requests.exceptions.InvalidURL("bad url")
+
+    monkeypatch.setattr(requests, "request", invalid)
+    with pytest.raises(requests.exceptions.InvalidURL):
+        module.backend_request("POST", "/order/orders")
+    assert route.breaker.state == OPEN
+    assert route.in_flight == 0
+    # The failed trial did not wedge the breaker: the next call is admitted as a new trial
+    monkeypatch.setattr(requests, "request", lambda method, url, **kwargs: FakeResponse({"success": True}))
+    assert module.backend_request("POST", "/order/orders").status_code == 200
+    assert route.breaker.state == CLOSED
@@ -0,0 +1,42 @@
+import pytest
+
+from fast_path import FastPath
+from tool_prefetch import ToolPrefetcher
+
+
+@pytest.mark.parametrize("message", [
+    "show order ORD-2025-ABC",
+    "order details for ORD-2025-ABC",
+    "Details of order #ord-2025-abc please?",
+])
+def test_order_details_matches_order_ids(message):
+    intent = FastPath().match(message)
+    assert intent.tool == "fetch_order_details"
+    assert intent.args["order_unique_ids_csv"].upper() == "ORD-2025-ABC"
+
+
+def test_order_details_matches_legacy_order_ids():
+    assert FastPath().match("show order ABC123").args == {"order_unique_ids_csv": "ABC123"}
+
+
+def test_order_details_keeps_the_typed_casing():
+    assert FastPath().match("order ORD-2025-AbC").args == {"order_unique_ids_csv": "ORD-2025-AbC"}
+
+
+@pytest.mark.parametrize("message", [
+    "order 5000",
+    "order 5000kg",
+    "order abc12",
+    "order 5000 kg compost",
+    "show order ORD-2025-ABC and ORD-2025-XYZ",
+    "order ORD-2025-ABC for Ravi",
+    "order status",
+])
+def test_order_details_leaves_other_messages_to_the_llm(message):
+    assert FastPath().match(message) is None
+
+
+def test_prefetch_predicts_order_details_only_for_order_ids():
+    prefetcher = ToolPrefetcher()
+    assert ("fetch_order_details", {"order_unique_ids_csv": "ORD-2025-ABC"}) in prefetcher.predict("where is order ORD-2025-ABC for Ravi?")
+    assert all(tool != "fetch_order_details" for tool, _ in prefetcher.predict("order 5000 kg compost"))
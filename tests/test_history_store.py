@@ -0,0 +1,93 @@
+import pytest
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from history_store import FailoverHistory, MemoryHistory
+from redis_client import RedisClient
+
+
+def user(text):
+    return {"role": "user", "content": text}
+
+
+def contents(history, conversation_id):
+    return [m["content"] for m in history.get_last_messages(conversation_id)]
+
+
+def failing(monkeypatch, target, method):
+    def fail(*args, **kwargs):
+        raise ConnectionError("redis down")
+    monkeypatch.setattr(target, method, fail)
+
+
+@pytest.fixture
+def history(redis_history):
+    breaker = CircuitBreaker("test history", failure_threshold=2, reset_timeout=60)
+    return FailoverHistory(primary=redis_history, fallback=MemoryHistory(), breaker=breaker)
+
+
+def test_reads_refresh_memory_from_redis(history, redis_history):
+    history.add_message(user("one"), "c")
+    # Another worker appended to the same conversation
+    redis_history.add_message(user("two"), "c")
+    assert contents(history, "c") == ["one", "two"]
+    assert [e for e in history.fallback.get_entries("c")] == redis_history.get_entries("c")
+
+
+def test_failed_write_while_closed_is_not_lost_on_next_read(history, redis_history, monkeypatch):
+    history.add_message(user("one"), "c")
+    with monkeypatch.context() as m:
+        failing(m, redis_history, "add_entry")
+        history.add_message(user("two"), "c")
+    assert history.breaker.state == CLOSED
+    assert history.stats()["pending_resync"] == 1
+    assert contents(history, "c") == ["one", "two"]
+    assert [m["content"] for m in redis_history.get_last_messages("c")] == ["one", "two"]
+    assert history.stats()["pending_resync"] == 0
+
+
+def test_outage_writes_go_to_memory_and_resync_after_recovery(history, redis_history, monkeypatch):
+    history.add_message(user("one"), "c")
+    with monkeypatch.context() as m:
+        for method in ("add_entries", "get_entries", "ping"):
+            failing(m, redis_history, method)
+        history.add_message(user("two"), "c")
+        history.add_message(user("three"), "c")
+        assert history.breaker.state == OPEN
+        assert contents(history, "c") == ["one", "two", "three"]
+    # Circuit closed through some other path before any resync ran
+    history.breaker.record_success()
+    assert contents(history, "c") == ["one", "two", "three"]
+    assert [m["content"] for m in redis_history.get_last_messages("c")] == ["one", "two", "three"]
+
+
+def test_half_open_trial_resyncs_before_reading(history, redis_history, monkeypatch):
+    with monkeypatch.context() as m:
+        for method in ("add_entries", "ping"):
+            failing(m, redis_history, method)
+        history.add_message(user("one"), "c")
+        history.add_message(user("two"), "c")
+    assert history.breaker.state == OPEN
+    history.breaker.reset_timeout = 0
+    assert contents(history, "c") == ["one", "two"]
+    assert history.breaker.state == CLOSED
+    assert len(redis_history.get_entries("c")) == 2
+
+
+def test_resync_keeps_what_other_workers_wrote_during_the_outage(history, redis_history, monkeypatch):
+    # Another worker: its own connection to the same Redis
+    other_primary = RedisClient()
+    other_primary.client = redis_history.client
+    other = FailoverHistory(primary=other_primary, fallback=MemoryHistory())
+    history.add_message(user("one"), "c")
+    with monkeypatch.context() as m:
+        # Only this worker loses Redis; the other keeps writing to it
+        failing(m, history.primary, "add_entries")
+        failing(m, history.primary, "ping")
+        history.add_message(user("a1"), "c")
+        other.add_message(user("b1"), "c")
+        history.add_message(user("a2"), "c")
+    history.breaker.reset_timeout = 0
+    other.add_message(user("b2"), "c")
+
+    assert contents(history, "c") == ["one", "b1", "b2", "a1", "a2"]
+    assert contents(other, "c") == ["one", "b1", "b2", "a1", "a2"]
+    assert history.stats()["pending_resync"] == 0
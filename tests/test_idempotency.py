@@ -0,0 +1,73 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from conftest import FakeResponse
+
+BATCH = {"fk_id_product": 1, "quantity_produced": 100.0, "start_date": "2025-01-01",
+         "end_date": "2025-02-01", "price_per_kg": 40.0}
+
+
+@pytest.fixture
+def mcp_server(load_mcp_server, monkeypatch):
+    backend = {"posts": 0, "release": threading.Event(), "status": 200}
+    backend["release"].set()
+
+    def handler(method, url, **kwargs):
+        if url.endswith("/agent/generate-api-key"):
+            return FakeResponse({"success": True, "data": {"apiKey": "test-key-0123456789"}})
+        if method == "POST" and url.endswith("/stock-batch"):
+            backend["posts"] += 1
+            backend["release"].wait(5)
+            return FakeResponse({"success": True, "data": {"id": backend["posts"]}}, status_code=backend["status"])
+        return FakeResponse({}, status_code=404)
+
+    module = load_mcp_server(handler)
+    monkeypatch.setattr(module, "_idempotency_redis", fakeredis.FakeRedis())
+    module.backend = backend
+    return module
+
+
+def create_stock_batch(module):
+    fn = module.create_stock_batch
+    return getattr(fn, "fn", fn)(**BATCH)
+
+
+def test_duplicate_call_returns_the_stored_result(mcp_server):
+    first = create_stock_batch(mcp_server)
+    second = create_stock_batch(mcp_server)
+
+    assert second == first == {"success": True, "data": {"id": 1}}
+    assert mcp_server.backend["posts"] == 1
+
+
+def test_failed_call_is_not_remembered(mcp_server):
+    mcp_server.backend["status"] = 500
+    assert "error" in create_stock_batch(mcp_server)
+
+    mcp_server.backend["status"] = 200
+    assert create_stock_batch(mcp_server) == {"success": True, "data": {"id": 2}}
+    assert mcp_server.backend["posts"] == 2
+
+
+def test_concurrent_duplicate_waits_then_times_out(mcp_server, monkeypatch):
+    monkeypatch.setattr(mcp_server, "TOOL_IDEMPOTENCY_WAIT_SECONDS", 0.3)
+    mcp_server.backend["release"].clear()
+    results = []
+    first = threading.Thread(target=lambda: results.append(create_stock_batch(mcp_server)))
+    first.start()
+    while mcp_server.backend["posts"] == 0:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    duplicate = create_stock_batch(mcp_server)
+
+    assert time.monotonic() - started >= 0.3
+    assert "still being processed" in duplicate["error"]
+    assert mcp_server.backend["posts"] == 1
+    mcp_server.backend["release"].set()
+    first.join(5)
+    assert create_stock_batch(mcp_server) == results[0] == {"success": True, "data": {"id": 1}}
+    assert mcp_server.backend["posts"] == 1
@@ -0,0 +1,90 @@
+def test_import_fetches_api_key_through_backend_request(load_mcp_server, capsys):
+    module = load_mcp_server()
+    out = capsys.readouterr().out
+    assert "Error fetching API key" not in out
+    assert module._API_KEY == "test-key-0123456789"
+    method, url, kwargs = module.backend_calls[0]
+    assert (method, url.endswith("/agent/generate-api-key")) == ("POST", True)
+    # Outside a tool call there is no turn deadline: the default timeout applies
+    assert kwargs["timeout"] == module.BACKEND_TIMEOUT_SECONDS
+
+
+def test_backend_request_caps_timeout_at_turn_deadline(load_mcp_server, monkeypatch):
+    import time
+    module = load_mcp_server()
+    monkeypatch.setattr(module, "request_meta", lambda key: time.time() + 2 if key == "deadline" else None)
+    module.backend_request("GET", "/order/orders")
+    assert module.backend_calls[-1][2]["timeout"] <= 2
+
+
+def test_backend_request_refuses_after_deadline(load_mcp_server, monkeypatch):
+    import time
+    import pytest
+    module = load_mcp_server()
+    monkeypatch.setattr(module, "request_meta", lambda key: time.time() - 1 if key == "deadline" else None)
+    calls = len(module.backend_calls)
+    with pytest.raises(module.BackendUnavailableError):
+        module.backend_request("GET", "/order/orders")
+    assert len(module.backend_calls) == calls
+
+
+def test_get_is_retried_until_the_breaker_opens(load_mcp_server, monkeypatch):
+    import pytest
+    from conftest import FakeResponse
+    module = load_mcp_server(lambda method, url, **kwargs: FakeResponse({}, status_code=503))
+    monkeypatch.setattr(module, "backoff_delay", lambda attempt, response=None: 0)
+    calls = len(module.backend_calls)
+
+    assert module.backend_request("GET", "/order").status_code == 503
+    assert len(module.backend_calls) - calls == 1 + module.BACKEND_RETRIES
+    # Retries stop as soon as the failures open the route's circuit
+    assert module.backend_request("GET", "/order").status_code == 503
+    assert len(module.backend_calls) - calls == module.BACKEND_BREAKER_FAILURES
+    route = module.backend_route("/order")
+    assert route.breaker.state == "open"
+    assert route.retries == module.BACKEND_BREAKER_FAILURES - 2
+
+    with pytest.raises(module.BackendUnavailableError):
+        module.backend_request("GET", "/order")
+    assert len(module.backend_calls) - calls == module.BACKEND_BREAKER_FAILURES
+
+
+def test_get_retry_recovers_and_writes_are_not_retried(load_mcp_server, monkeypatch):
+    import requests
+    from conftest import FakeResponse
+    outcomes = []
+
+    def handler(method, url, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse({}, status_code=outcome)
+
+    module = load_mcp_server()
+    monkeypatch.setattr(requests, "request", handler)
+    monkeypatch.setattr(module, "backoff_delay", lambda attempt, response=None: 0)
+
+    outcomes[:] = [requests.exceptions.ConnectionError("reset"), 502, 200]
+    assert module.backend_request("GET", "/product").status_code == 200
+    assert module.backend_route("/product").retries == 2
+    assert module.backend_route("/product").breaker.state == "closed"
+
+    outcomes[:] = [503, 200]
+    assert module.backend_request("POST", "/product").status_code == 503
+    assert outcomes == [200]
+
+
+def test_full_bulkhead_rejects_without_calling_the_backend(load_mcp_server, monkeypatch):
+    import pytest
+    module = load_mcp_server()
+    monkeypatch.setattr(module, "BACKEND_BULKHEAD_WAIT_SECONDS", 0.05)
+    route = module.backend_route("/order")
+    for _ in range(module.BACKEND_MAX_CONCURRENCY):
+        route.bulkhead.acquire()
+    calls = len(module.backend_calls)
+
+    with pytest.raises(module.BackendUnavailableError):
+        module.backend_request("GET", "/order")
+
+    assert len(module.backend_calls) == calls
+    assert route.rejected == 1
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from conftest import FakeResponse
+from order_index import OrderIndex
+
+
+def order(unique_id, name, mobile="9848012345", status=1, updated_at="2025-01-01T00:00:00Z", **extra):
+    return {"id": int(unique_id.rsplit("-", 1)[-1]), "order_unique_id": unique_id, "customer_name": name,
+            "customer_mobile": mobile, "status": status, "updated_at": updated_at, **extra}
+
+
+ORDERS = [
+    order("ORD-2025-001", "Ravi Kumar", "9848011111", status=1, updated_at="2025-01-01T00:00:00Z"),
+    order("ORD-2025-002", "Lakshmi Devi", "9848022222", status=5, updated_at="2025-01-02T00:00:00Z"),
+    order("ORD-2025-003", "Ravi Teja", "9000033333", status=2, updated_at="2025-01-03T00:00:00Z"),
+]
+
+
+@pytest.fixture
+def index():
+    index = OrderIndex(":memory:")
+    index.upsert(ORDERS)
+    return index
+
+
+def ids(orders):
+    return [o["order_unique_id"] for o in orders]
+
+
+def test_search_matches_substrings_of_any_field(index):
+    assert sorted(ids(index.search("ravi"))) == ["ORD-2025-001", "ORD-2025-003"]
+    assert ids(index.search("22222")) == ["ORD-2025-002"]
+    assert ids(index.search("ravi 98480")) == ["ORD-2025-001"]
+    assert ids(index.search("lakshmi cancelled")) == ["ORD-2025-002"]
+
+
+def test_search_filters_and_short_terms(index):
+    assert ids(index.search("ravi", status=2)) == ["ORD-2025-003"]
+    assert ids(index.search("la")) == ["ORD-2025-002"]
+    assert ids(index.search("", limit=2)) == ["ORD-2025-003", "ORD-2025-002"]
+
+
+def test_misspelled_name_falls_back_to_fuzzy_matches(index):
+    found = index.search("lakshmy devi")
+    assert ids(found) == ["ORD-2025-002"]
+    assert found[0]["match"] == "fuzzy"
+
+
+def test_older_copy_never_replaces_a_newer_one(index):
+    index.upsert([order("ORD-2025-001", "Ravi Old", updated_at="2024-12-01T00:00:00Z")])
+    assert ids(index.search("ravi old", fuzzy=False)) == []
+    index.upsert([order("ORD-2025-001", "Ravi Kumar", status=3, updated_at="2025-02-01T00:00:00Z")])
+    assert index.search("ravi kumar")[0]["status_name"] == "shipped"
+    assert index.watermark() == "2025-02-01T00:00:00Z"
+
+
+def test_retain_drops_deleted_orders_and_bumps_the_generation(index):
+    assert index.retain({"ORD-2025-001", "ORD-2025-003"}) == 1
+    assert len(index) == 2
+    assert index.generation() == 1
+
+
+def tool(module, name):
+    fn = getattr(module, name)
+    return getattr(fn, "fn", fn)
+
+
+@pytest.fixture
+def mcp_server(load_mcp_server, monkeypatch, tmp_path):
+    monkeypatch.setenv("ORDER_INDEX_PATH", str(tmp_path / "orders.sqlite3"))
+    backend = {"orders": list(ORDERS), "refetch": threading.Event(), "refetch_error": None}
+    backend["refetch"].set()
+
+    def handler(method, url, **kwargs):
+        params = kwargs.get("params") or {}
+        if url.endswith("/agent/generate-api-key"):
+            return FakeResponse({"success": True, "data": {"apiKey": "test-key-0123456789"}})
+        if method == "PUT" and "/order/admin/cancel/" in url:
+            return FakeResponse({"success": True, "data": {"order_unique_id": url.rsplit("/", 1)[-1]}})
+        if method == "GET" and url.endswith("/order"):
+            if params.get("orderUniqueId"):
+                backend["refetch"].wait(5)
+                if backend["refetch_error"]:
+                    raise backend["refetch_error"]
+                return FakeResponse({"data": [o for o in backend["orders"] if o["order_unique_id"] == params["orderUniqueId"]]})
+            offset, limit = params.get("offset", 0), params.get("limit", 100)
+            return FakeResponse({"data": backend["orders"][offset:offset + limit]})
+        return FakeResponse({}, status_code=404)
+
+    module = load_mcp_server(handler)
+    module.backend = backend
+    return module
+
+
+def wait_for(predicate, timeout=5):
+    stop_at = time.time() + timeout
+    while not predicate():
+        assert time.time() < stop_at, "timed out"
+        time.sleep(0.01)
+
+
+def test_search_orders_syncs_on_first_use(mcp_server):
+    result = tool(mcp_server, "search_orders")("ravi", status=1)
+    assert ids(result["orders"]) == ["ORD-2025-001"]
+    assert result["indexed_orders"] == 3
+
+
+def test_order_write_returns_before_the_index_is_updated(mcp_server):
+    search = tool(mcp_server, "search_orders")
+    search("ravi")
+    mcp_server.backend["orders"][0] = order("ORD-2025-001", "Ravi Kumar", status=5, updated_at="2025-03-01T00:00:00Z")
+    mcp_server.backend["refetch"].clear()
+
+    started = time.perf_counter()
+    result = tool(mcp_server, "cancel_order_by_admin")("ORD-2025-001")
+
+    assert result["success"] is True
+    assert time.perf_counter() - started < 1
+    assert search("ravi kumar")["orders"][0]["status"] == 1
+    mcp_server.backend["refetch"].set()
+    wait_for(lambda: search("ravi kumar")["orders"][0]["status"] == 5)
+
+
+def test_failed_index_update_does_not_fail_the_write(mcp_server, capsys):
+    tool(mcp_server, "search_orders")("ravi")
+    mcp_server.backend["refetch_error"] = RuntimeError("index fetch failed")
+
+    result = tool(mcp_server, "cancel_order_by_admin")("ORD-2025-001")
+
+    assert result["success"] is True
+    wait_for(lambda: "Order index update after write failed" in capsys.readouterr().out)
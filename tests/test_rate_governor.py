@@ -0,0 +1,151 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import rate_governor
+from rate_governor import RateGovernor, RateLimitWait, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_governor.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_governor.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def governor(clock):
+    governor = RateGovernor(enabled=True, max_wait=15)
+    budget = governor.budget("openai", "gpt-test")
+    # 1 request/s and 10 tokens/s
+    budget.requests = TokenBucket(60)
+    budget.tokens = TokenBucket(600)
+    return governor
+
+
+def completion(total_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def acquire(governor, tokens):
+    return asyncio.run(governor.acquire("openai", "gpt-test", tokens))
+
+
+def test_calls_within_budget_are_not_held_back(governor, clock):
+    acquire(governor, 300)
+    acquire(governor, 300)
+
+    assert clock.sleeps == []
+    assert governor.budget("openai", "gpt-test").stats()["calls"] == 2
+
+
+def test_call_waits_until_its_tokens_are_covered(governor, clock):
+    acquire(governor, 600)
+    acquire(governor, 100)
+
+    assert clock.sleeps == [pytest.approx(10)]
+    stats = governor.budget("openai", "gpt-test").stats()
+    assert stats["waits"] == 1 and stats["wait_seconds"] == pytest.approx(10)
+
+
+def test_wait_beyond_max_wait_raises_and_refunds(governor, clock):
+    acquire(governor, 600)
+
+    with pytest.raises(RateLimitWait) as raised:
+        acquire(governor, 200)
+
+    assert raised.value.wait == pytest.approx(20)
+    assert clock.sleeps == []
+    # The refused reservation was given back: a smaller call only waits for its own tokens
+    acquire(governor, 100)
+    assert clock.sleeps == [pytest.approx(10)]
+
+
+def test_settle_returns_overestimated_tokens(governor, clock):
+    reservation = acquire(governor, 600)
+
+    governor.settle(reservation, completion(100))
+
+    assert governor.budget("openai", "gpt-test").tokens.level == pytest.approx(500)
+    acquire(governor, 500)
+    assert clock.sleeps == []
+
+
+def test_settle_takes_the_shortfall_of_underestimates(governor, clock):
+    reservation = acquire(governor, 100)
+
+    governor.settle(reservation, completion(700))
+
+    assert governor.budget("openai", "gpt-test").tokens.level == pytest.approx(-100)
+    acquire(governor, 1)
+    assert clock.sleeps == [pytest.approx(10.1)]
+
+
+def test_settle_learns_limits_from_headers(governor):
+    reservation = acquire(governor, 10)
+
+    governor.settle(reservation, headers={
+        "x-ratelimit-limit-tokens": "1200",
+        "x-ratelimit-remaining-tokens": "50",
+        "x-ratelimit-remaining-requests": "not-a-number",
+    })
+
+    budget = governor.budget("openai", "gpt-test")
+    assert budget.tokens.capacity == 1200
+    assert budget.tokens.level == 50
+    assert budget.requests.level == pytest.approx(59)
+
+
+def test_rate_limit_error_pauses_the_model(governor, clock):
+    reservation = acquire(governor, 10)
+    error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "4"}))
+
+    assert governor.on_rate_limited(reservation, error) == 4
+    acquire(governor, 10)
+
+    assert clock.sleeps == [pytest.approx(4)]
+
+
+def test_disabled_governor_never_waits(clock):
+    governor = RateGovernor(enabled=False)
+
+    for _ in range(5):
+        asyncio.run(governor.acquire("openai", "gpt-test", 10 ** 9))
+
+    assert clock.sleeps == []
+
+
+def test_rejected_oversized_call_refunds_only_what_it_was_charged(governor, clock):
+    acquire(governor, 600)
+
+    with pytest.raises(RateLimitWait):
+        acquire(governor, 5000)
+
+    assert governor.budget("openai", "gpt-test").tokens.level == pytest.approx(0)
+
+
+def test_wait_is_bounded_by_the_callers_max_wait(governor, clock):
+    acquire(governor, 600)
+
+    with pytest.raises(RateLimitWait):
+        asyncio.run(governor.acquire("openai", "gpt-test", 100, max_wait=2))
+
+    assert clock.sleeps == []
+    # A roomier deadline only waits as long as the bucket needs
+    asyncio.run(governor.acquire("openai", "gpt-test", 100, max_wait=12))
+    assert clock.sleeps == [pytest.approx(10)]
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+import server
+from auth_middleware import JWTPayload, get_current_user
+
+
+@pytest.fixture
+def http():
+    server.app.dependency_overrides[get_current_user] = lambda: JWTPayload(userId=1, email="admin@example.com", name="Admin", userCode="A1")
+    # No `with`: the lifespan (Redis/MCP warmup) is not needed to validate requests
+    yield TestClient(server.app, raise_server_exceptions=False)
+    server.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("path", ["/chat", "/chat/stream"])
+@pytest.mark.parametrize("body", [b"{not json", b'["a list"]', b'"text"'])
+def test_malformed_body_is_a_400(http, path, body):
+    response = http.post(path, content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+
+@pytest.mark.parametrize("path", ["/chat", "/chat/stream"])
+def test_missing_message_is_a_400(http, path):
+    response = http.post(path, json={"conversationId": "c"})
+    assert response.status_code == 400
+    assert response.json() == {"error": "Missing 'message' field"}
+
+
+def test_chat_does_not_log_message_or_history(http, monkeypatch, capsys):
+    class Assistant:
+        def get_history(self, conversation_id):
+            return [{"role": "user", "content": "my mobile is 9876543210"}]
+
+        async def chat(self, history, message, **kwargs):
+            return "ok"
+
+    monkeypatch.setattr(server, "turn_queue", None)
+    monkeypatch.setattr(type(server.runtime), "assistant", property(lambda self: Assistant()))
+    response = http.post("/chat", json={"message": "deliver to 12 Main St", "conversationId": "c"})
+    assert response.status_code == 200
+    out = capsys.readouterr().out
+    assert "12 Main St" not in out and "9876543210" not in out and "admin@example.com" not in out
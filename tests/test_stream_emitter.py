@@ -0,0 +1,106 @@
+import asyncio
+import zlib
+
+import pytest
+
+import stream_emitter
+from stream_emitter import StreamEmitter
+
+TEXT = " ".join(f"word{i}" for i in range(400))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def frame_text(frame):
+    if "data" in frame:
+        assert frame["encoding"] == "deflate"
+        return zlib.decompress(frame["data"]).decode()
+    return frame["chunk"]
+
+
+async def stream(chunks, **options):
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+    emitter = StreamEmitter(send, "conv-1", **options)
+    for chunk in chunks:
+        await emitter.write(chunk)
+    await emitter.close()
+    return emitter, frames
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_frames_are_sequenced_bounded_and_lossless(compress, monkeypatch):
+    monkeypatch.setattr(stream_emitter, "STREAM_COMPRESS_MIN_BYTES", 512)
+    emitter, frames = run(stream([TEXT[i:i + 7] for i in range(0, len(TEXT), 7)] + [TEXT],
+                                 window_ms=10_000, max_bytes=1024, compress=compress))
+
+    texts = [frame_text(f) for f in frames]
+    assert "".join(texts) == TEXT + TEXT
+    assert [f["seq"] for f in frames] == [f["index"] for f in frames] == list(range(len(frames)))
+    assert all(f["conversationId"] == "conv-1" for f in frames)
+    assert all(len(t.encode()) <= 1024 for t in texts)
+    assert emitter.frames == len(frames)
+    assert any("data" in f for f in frames) == compress
+
+
+def test_large_write_is_split_at_word_boundaries():
+    _, frames = run(stream([TEXT], window_ms=10_000, max_bytes=1024, compress=False))
+
+    texts = [f["chunk"] for f in frames]
+    assert len(texts) > 1 and "".join(texts) == TEXT
+    assert all(t.endswith(" ") and len(t) <= 1024 for t in texts[:-1])
+
+
+def test_small_frames_stay_uncompressed():
+    emitter, frames = run(stream(["short answer"], window_ms=10_000, compress=True))
+
+    assert frames == [{"seq": 0, "index": 0, "conversationId": "conv-1", "chunk": "short answer"}]
+    assert emitter.bytes_sent == len("short answer")
+
+
+def test_compressed_frames_count_their_deflated_size(monkeypatch):
+    monkeypatch.setattr(stream_emitter, "STREAM_COMPRESS_MIN_BYTES", 512)
+    emitter, frames = run(stream([TEXT[:1000]], window_ms=10_000, max_bytes=4096, compress=True))
+
+    assert len(frames) == 1
+    assert emitter.bytes_sent == len(frames[0]["data"]) < 1000
+
+
+def test_window_flushes_buffered_text_without_close():
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+
+    async def main():
+        emitter = StreamEmitter(send, "conv-1", window_ms=20, max_bytes=4096, compress=False)
+        await emitter.write("Hello ")
+        await emitter.write("world")
+        assert frames == []
+        await asyncio.sleep(0.1)
+        await emitter.write("!")
+        await emitter.close()
+
+    run(main())
+    assert [f["chunk"] for f in frames] == ["Hello world", "!"]
+
+
+def test_abort_drops_buffered_text():
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+
+    async def main():
+        emitter = StreamEmitter(send, "conv-1", window_ms=20)
+        await emitter.write("partial")
+        emitter.abort()
+        await asyncio.sleep(0.05)
+        await emitter.close()
+
+    run(main())
+    assert frames == []
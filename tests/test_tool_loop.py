@@ -0,0 +1,176 @@
+import asyncio
+from types import SimpleNamespace as NS
+import fakeredis
+import pytest
+import client as client_module
+from history_store import MemoryHistory
+from rate_governor import RateLimitWait, TokenBucket
+from turn_checkpoint import CheckpointStore
+from turn_deadline import Deadline
+from usage_tracker import UsageTracker
+
+TOOL = "admin_agent__create_stock_batch"
+SPECS = [{"name": TOOL, "description": "Create a stock batch", "inputSchema": {"type": "object", "properties": {}}}]
+
+
+class FakeMCP:
+    def __init__(self, tool_seconds=0.0, result='{"success": true}'):
+        self.tool_seconds = tool_seconds
+        self.result = result
+        self.calls = []
+        self.started = asyncio.Event()
+
+    async def get_all_tools_specs(self, *args, **kwargs):
+        return SPECS
+
+    async def get_client(self, name):
+        return self
+
+    async def call_tool(self, name, args, meta=None, timeout=None):
+        self.calls.append((name, args, meta, timeout))
+        self.started.set()
+        await asyncio.sleep(self.tool_seconds)
+        return NS(content=[NS(text=self.result)], structured_content=None, data=None, isError=False)
+
+
+class FakeCompletions:
+    """Asks for one tool call, then answers."""
+
+    def __init__(self):
+        self.with_raw_response = self
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if len(self.calls) == 1:
+            call = NS(id="call_1", type="function", function=NS(name=TOOL, arguments="{}"))
+            message = NS(content="", tool_calls=[call])
+        else:
+            message = NS(content="Batch created.", tool_calls=None)
+        response = NS(choices=[NS(message=message)], usage=None, model=kwargs["model"])
+        return NS(parse=lambda: response, headers={})
+
+
+@pytest.fixture
+def assistant(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("PREFETCH", "off")
+    a = client_module.TeluguVermiFarmsClient()
+    a.history = MemoryHistory()
+    a.usage = UsageTracker(client=fakeredis.FakeRedis())
+    a.checkpoints = CheckpointStore(client=fakeredis.FakeRedis())
+    a.completions = FakeCompletions()
+    a.providers._instances["openai"] = NS(client=NS(chat=NS(completions=a.completions)))
+    a.mcp = FakeMCP()
+
+    async def ensure_connected():
+        return a.mcp
+
+    a.mcp_orchestrator.ensure_connected = ensure_connected
+    return a
+
+
+def test_tool_turn_persists_calls_with_results(assistant):
+    answer = asyncio.run(assistant.chat([], "create a stock batch of 100 kg", conversation_id="c1"))
+    assert answer == "Batch created."
+    roles = [m["role"] for m in assistant.history.get_last_messages("c1")]
+    assert roles == ["user", "assistant", "tool", "assistant"]
+
+
+def test_answers_and_tool_payloads_are_not_logged(assistant, capsys):
+    assistant.mcp.result = '{"customer": "Ravi Kumar", "mobile": "9848012345"}'
+    asyncio.run(assistant.chat([], "create a stock batch of 100 kg", conversation_id="c5"))
+    out = capsys.readouterr().out
+    assert "Batch created." not in out
+    assert "9848012345" not in out
+
+
+def test_cancel_mid_batch_leaves_no_orphan_tool_calls(assistant):
+    assistant.mcp.tool_seconds = 30
+
+    async def run():
+        turn = asyncio.create_task(assistant.chat([], "create a stock batch of 100 kg", conversation_id="c2"))
+        await assistant.mcp.started.wait()
+        turn.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await turn
+
+    asyncio.run(run())
+    history = assistant.history.get_last_messages("c2")
+    assert not any(m.get("tool_calls") for m in history)
+
+
+@pytest.mark.parametrize("result", [
+    '{"error": "Backend temporarily unavailable: circuit open"}',
+    '{"error": "Request failed: 400 Client Error", "details": {"field": "quantity"}}',
+])
+def test_error_payload_escalates_to_a_stronger_model(assistant, result):
+    assistant.mcp.result = result
+    routes = record_routes(assistant)
+    asyncio.run(assistant.chat([], "create a stock batch of 100 kg", conversation_id="c3"))
+    assert routes[0].escalations == ["tool call failed"]
+
+
+def test_successful_tool_does_not_escalate(assistant):
+    routes = record_routes(assistant)
+    asyncio.run(assistant.chat([], "create a stock batch of 100 kg", conversation_id="c4"))
+    assert routes[0].escalations == []
+
+
+def record_routes(assistant):
+    routes = []
+    route = assistant.router.route
+
+    def recording(*args, **kwargs):
+        routes.append(route(*args, **kwargs))
+        return routes[-1]
+
+    assistant.router.route = recording
+    return routes
+
+
+def test_flagged_mcp_result_counts_as_error():
+    result = NS(content=[NS(text="tool crashed")], structured_content=None, data=None, is_error=True)
+    content = client_module._tool_result_content(result)
+    assert content == "Error: tool crashed"
+    assert client_module._is_tool_error(content)
+    assert client_module._is_tool_error('{"error": "Not found"}')
+    assert not client_module._is_tool_error('{"error": null, "rows": []}')
+    assert not client_module._is_tool_error('{"success": true}')
+
+
+def test_rate_governor_does_not_wait_past_the_turn_deadline(assistant):
+    budget = assistant.governor.budget("openai", "gpt-test")
+    budget.tokens = TokenBucket(600)
+    budget.tokens.level = 0
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return None, None
+
+    # 50 tokens need 5s of refill; the turn only has 1s left
+    with pytest.raises(RateLimitWait):
+        asyncio.run(assistant._governed_call("openai", "gpt-test", 50, call, deadline=Deadline.after(1)))
+    assert calls == []
+
+
+def test_prefetch_uses_the_turn_deadline_and_reports_to_the_usage_record(assistant, capsys):
+    specs = SPECS + [{"name": "admin_agent__fetch_best_sellers", "bare_name": "fetch_best_sellers",
+                      "description": "Best sellers", "inputSchema": {"type": "object", "properties": {}}}]
+
+    async def get_all_tools_specs(*args, **kwargs):
+        return specs
+
+    assistant.mcp.get_all_tools_specs = get_all_tools_specs
+    assistant.prefetcher.enabled = True
+    deadline = Deadline.after(60)
+
+    asyncio.run(assistant.chat([], "best sellers", conversation_id="c1", deadline=deadline))
+
+    prefetched = [call for call in assistant.mcp.calls if call[0] == "fetch_best_sellers"]
+    assert prefetched and prefetched[0][2] == {"conversationId": "c1", "deadline": deadline.at}
+    assert 0 < prefetched[0][3] <= 60
+    out = capsys.readouterr().out
+    assert '"prefetch": {"started": 1, "hits": 0, "wasted": 1, "failed": 0}' in out
+    assert "🔮" not in out
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace as NS
+
+from tool_prefetch import ToolPrefetcher
+from turn_deadline import Deadline
+
+SPECS = [{"name": "admin_agent__fetch_best_sellers", "bare_name": "fetch_best_sellers",
+          "inputSchema": {"type": "object", "properties": {"limit": {"type": "integer", "default": 10}}}}]
+
+
+class FakeMCP:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    async def get_client(self, name):
+        return self
+
+    async def call_tool(self, name, args, meta=None, timeout=None):
+        self.calls.append((name, args, meta, timeout))
+        if self.error:
+            raise self.error
+        return NS(content=[NS(text="[]")])
+
+
+def test_speculative_call_carries_the_turns_meta_and_timeout():
+    mcp = FakeMCP()
+    deadline = Deadline.after(30)
+
+    async def main():
+        session = ToolPrefetcher().start(mcp, "best sellers this month", SPECS, {"deadline": deadline.at}, deadline)
+        await asyncio.sleep(0)
+        return session.finish()
+
+    counts = asyncio.run(main())
+    [(name, args, meta, timeout)] = mcp.calls
+    assert (name, args, meta) == ("fetch_best_sellers", {}, {"deadline": deadline.at})
+    assert 0 < timeout <= 30
+    assert counts == {"started": 1, "hits": 0, "wasted": 1, "failed": 0}
+
+
+def test_turn_counts_go_to_stats_not_the_log(capsys):
+    prefetcher = ToolPrefetcher()
+
+    async def main():
+        session = prefetcher.start(FakeMCP(), "best sellers", SPECS)
+        # The model's call with the schema default spelled out still matches
+        hit = await session.take("admin_agent__fetch_best_sellers", {"limit": 10})
+        return hit, session.finish()
+
+    hit, counts = asyncio.run(main())
+    assert hit is not None
+    assert counts == {"started": 1, "hits": 1, "wasted": 0, "failed": 0}
+    assert prefetcher.stats()["hit_rate"] == 1.0
+    assert "🔮" not in capsys.readouterr().out
+
+
+def test_failed_prefetch_is_counted_and_not_served(capsys):
+    prefetcher = ToolPrefetcher()
+
+    async def main():
+        session = prefetcher.start(FakeMCP(error=RuntimeError("backend down")), "best sellers", SPECS)
+        return await session.take("admin_agent__fetch_best_sellers", {}), session.finish()
+
+    result, counts = asyncio.run(main())
+    assert result is None
+    assert counts == {"started": 1, "hits": 0, "wasted": 1, "failed": 1}
+    assert prefetcher.stats()["failed"] == prefetcher.stats()["wasted"] == 1
+    assert "🔮" not in capsys.readouterr().out
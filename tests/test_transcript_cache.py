@@ -0,0 +1,93 @@
+import pytest
+from history_store import FailoverHistory, MemoryHistory
+from redis_client import MAX_HISTORY_MESSAGES
+from transcript_cache import TranscriptCache
+
+
+def msg(text, role="user"):
+    return {"role": role, "content": text}
+
+
+@pytest.fixture(params=["redis", "memory"])
+def store(request, redis_history):
+    if request.param == "memory":
+        return MemoryHistory()
+    return FailoverHistory(primary=redis_history, fallback=MemoryHistory())
+
+
+@pytest.fixture
+def cache():
+    return TranscriptCache({"openai": lambda m: m})
+
+
+def persist(store, cache, text, conversation_id="c"):
+    version = store.add_message(msg(text), conversation_id)
+    cache.append(conversation_id, msg(text), version)
+
+
+def texts(messages):
+    return [m["content"] for m in messages]
+
+
+def test_own_writes_need_no_list_read(store, cache):
+    persist(store, cache, "before")
+    assert texts(cache.history("c", store)) == ["before"]
+    assert cache.full_reads == 1
+    persist(store, cache, "one")
+    persist(store, cache, "two")
+    assert texts(cache.history("c", store)) == ["before", "one", "two"]
+    assert (cache.full_reads, cache.delta_reads) == (1, 1)
+
+
+def test_other_writers_are_fetched_as_a_delta(store, cache):
+    cache.history("c", store)
+    persist(store, cache, "mine")
+    cache.history("c", store)
+    # Another worker's message, not seen by this cache
+    store.add_message(msg("theirs"), "c")
+    assert texts(cache.history("c", store)) == ["mine", "theirs"]
+    assert cache.full_reads == 1
+    # Our own next write continues from the version we caught up to
+    persist(store, cache, "mine again")
+    assert texts(cache.history("c", store)) == ["mine", "theirs", "mine again"]
+    assert cache.full_reads == 1
+
+
+def test_interleaved_write_forces_full_read(store, cache):
+    cache.history("c", store)
+    store.add_message(msg("theirs"), "c")
+    persist(store, cache, "mine")  # lands after theirs; the cache can't order them itself
+    assert texts(cache.history("c", store)) == ["theirs", "mine"]
+    assert cache.full_reads == 2
+
+
+def test_rewritten_history_forces_full_read(store, cache):
+    persist(store, cache, "one")
+    cache.history("c", store)
+    store.clear_history("c")
+    persist(store, cache, "fresh")
+    assert texts(cache.history("c", store)) == ["fresh"]
+    assert cache.full_reads == 2
+
+
+def test_trimmed_history_stays_in_step(store, cache):
+    cache.history("c", store)
+    for i in range(MAX_HISTORY_MESSAGES + 5):
+        store.add_message(msg(str(i)), "c")
+    history = cache.history("c", store)
+    assert len(history) == MAX_HISTORY_MESSAGES
+    assert history[-1]["content"] == str(MAX_HISTORY_MESSAGES + 4)
+    assert cache.full_reads == 2
+
+
+def test_transcript_rebuilds_for_a_different_history(store, cache):
+    persist(store, cache, "one")
+    history = cache.history("c", store)
+    assert cache.transcript("openai", "c", history) == [msg("one")]
+    assert cache.hits == 1
+    other = [msg("x"), msg("y")]
+    assert cache.transcript("openai", "c", other) == other
+    assert cache.rebuilds == 1
+    # Built from a caller's list, so the next history() reads the store in full
+    assert texts(cache.history("c", store)) == ["one"]
+    assert cache.full_reads == 2
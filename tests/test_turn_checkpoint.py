@@ -0,0 +1,151 @@
+import json
+
+import fakeredis
+import pytest
+from circuit_breaker import OPEN
+from turn_checkpoint import CheckpointStore, KEY_PREFIX
+
+
+@pytest.fixture
+def store():
+    return CheckpointStore(client=fakeredis.FakeRedis())
+
+
+def interrupted_turn(store, request_id="req-1"):
+    checkpoint = store.begin(request_id, "openai", "how many orders", "conv-1")
+    checkpoint.iteration = 1
+    checkpoint.llm_response([{"role": "user", "content": "how many orders"}], [{"id": "call-1", "name": "get_orders_count"}])
+    checkpoint.add_result("call-1", '{"count": 3}')
+    return checkpoint
+
+
+def test_retry_resumes_from_the_checkpoint(store):
+    interrupted_turn(store)
+
+    checkpoint = store.begin("req-1", "openai", "how many orders", "conv-1")
+
+    assert checkpoint.resumed
+    assert checkpoint.iteration == 1
+    assert checkpoint.pending == [{"id": "call-1", "name": "get_orders_count"}]
+    assert checkpoint.result("call-1") == '{"count": 3}'
+    assert store.stats()["resumed"] == 1
+
+
+@pytest.mark.parametrize("provider, message, conversation_id", [
+    ("gemini", "how many orders", "conv-1"),
+    ("openai", "how many products", "conv-1"),
+    ("openai", "how many orders", "conv-2"),
+])
+def test_checkpoint_of_another_turn_is_not_resumed(store, provider, message, conversation_id):
+    interrupted_turn(store)
+
+    checkpoint = store.begin("req-1", provider, message, conversation_id)
+
+    assert not checkpoint.resumed
+    assert checkpoint.iteration == 0 and checkpoint.transcript is None and checkpoint.pending == []
+    assert store.stats()["resumed"] == 0
+    # The new turn's first save replaces the stale checkpoint
+    checkpoint.llm_response([], [])
+    assert store.begin("req-1", provider, message, conversation_id).resumed
+
+
+def test_turn_that_ended_without_an_answer_starts_over(store):
+    interrupted_turn(store).finish(None)
+
+    checkpoint = store.begin("req-1", "openai", "how many orders", "conv-1")
+
+    assert not checkpoint.resumed
+    assert checkpoint.answer is None
+
+
+def test_finished_turn_replays_its_answer(store):
+    interrupted_turn(store).finish("There are **3** orders.")
+
+    checkpoint = store.begin("req-1", "openai", "how many orders", "conv-1")
+
+    assert checkpoint.answer == "There are **3** orders."
+    assert checkpoint.transcript is None and checkpoint.pending == []
+    assert store.stats()["replayed"] == 1 and store.stats()["resumed"] == 0
+
+
+def test_without_request_id_nothing_is_stored(store):
+    checkpoint = store.begin(None, "openai", "how many orders")
+    checkpoint.llm_response([{"role": "user", "content": "how many orders"}], [])
+
+    assert checkpoint.store is None
+    assert store.client.keys(KEY_PREFIX + "*") == []
+
+
+def test_redis_outage_starts_fresh_turns_and_opens_the_breaker(store, monkeypatch):
+    interrupted_turn(store)
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("redis down")
+    monkeypatch.setattr(store.client, "pipeline", fail)
+
+    checkpoint = store.begin("req-1", "openai", "how many orders", "conv-1")
+    checkpoint.llm_response([], [])
+
+    assert not checkpoint.resumed
+    assert store.breaker.state == OPEN
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """Records the size of every SET / HSET value, sent directly or in a pipeline."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = []
+
+    def _record(self, args):
+        if args[0] == "SET":
+            self.writes.append((args[1], len(args[2])))
+        elif args[0] == "HSET":
+            self.writes.append((args[1], len(args[3])))
+
+    def execute_command(self, *args, **options):
+        self._record(args)
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted_execute(*a, **kw):
+            for command_args, _ in pipe.command_stack:
+                self._record(command_args)
+            return execute(*a, **kw)
+        pipe.execute = counted_execute
+        return pipe
+
+
+def test_transcript_is_written_once_per_llm_response():
+    client = CountingRedis()
+    store = CheckpointStore(client=client)
+    transcript = [{"role": "user", "content": "x" * 10000}]
+    calls = [{"id": f"call-{i}", "name": "fetch_orders"} for i in range(5)]
+
+    checkpoint = store.begin("req-1", "openai", "how many orders", "conv-1")
+    checkpoint.llm_response(transcript, calls)
+    for call in calls:
+        checkpoint.add_result(call["id"], {"role": "tool", "tool_call_id": call["id"], "content": "[]"})
+    transcript.extend(checkpoint.result(call["id"]) for call in calls)
+    checkpoint.tools_done(transcript)
+
+    transcript_writes = [size for key, size in client.writes if key == KEY_PREFIX + "req-1"]
+    assert len(transcript_writes) == 1
+    # Results and the batch tail stay small however long the transcript is
+    assert sum(size for key, size in client.writes if key != KEY_PREFIX + "req-1") < 1000
+
+
+def test_resume_after_a_finished_batch_continues_after_its_messages(store):
+    checkpoint = interrupted_turn(store)
+    tool_message = {"role": "tool", "tool_call_id": "call-1", "content": '{"count": 3}'}
+    checkpoint.tools_done(checkpoint.transcript + [tool_message])
+
+    resumed = store.begin("req-1", "openai", "how many orders", "conv-1")
+
+    assert resumed.resumed
+    assert resumed.pending == [] and resumed.results == {}
+    assert resumed.transcript == [{"role": "user", "content": "how many orders"}, tool_message]
+    assert json.loads(store.client.get(KEY_PREFIX + "req-1"))["transcript"] == [{"role": "user", "content": "how many orders"}]
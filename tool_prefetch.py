@@ -0,0 +1,182 @@
+"""
+Speculative tool prefetch - starts likely read-only tool calls while the first LLM call is in flight
+
+When the model then asks for the same call (same tool, same arguments once schema defaults are
+applied), the prefetched result is served instead of calling the backend again. Prefetches the
+model never asks for are cancelled at the end of the turn and counted as wasted. Speculative
+calls carry the turn's _meta and deadline like the calls the model makes; each turn's hits and
+waste go into its usage record, the running totals into runtime status.
+"""
+import os
+import re
+import json
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from fast_path import ORDER_ID_PATTERN
+from turn_deadline import Deadline
+
+# Only side-effect free tools may be called speculatively
+READ_ONLY_TOOLS = {
+    "fetch_products", "get_products_count", "fetch_best_sellers", "fetch_stock_batches",
+    "fetch_orders", "get_orders_count", "fetch_order_details",
+    "fetch_all_enquiries", "get_enquiries_count", "resolve_products", "search_orders",
+    "sales_analytics",
+}
+
+_ORDER_ID = re.compile(r"\b(?P<id>" + ORDER_ID_PATTERN + r")\b", re.IGNORECASE)
+# Capitalised name after "orders of/for/by/from", e.g. "show orders for Ravi Kumar"
+_CUSTOMER = re.compile(r"\borders?\s+(?:of|for|by|from|placed by)\s+(?P<name>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)")
+_BEST_SELLERS = re.compile(r"\b(?:best[\s-]?sell(?:er|ers|ing)|top[\s-]?selling|most sold|popular products?)\b", re.IGNORECASE)
+_PRODUCTS = re.compile(r"\b(?:products?|catalog(?:ue)?|vermi\s*compost|price list)\b", re.IGNORECASE)
+_ORDERS = re.compile(r"\borders?\b", re.IGNORECASE)
+_ENQUIRIES = re.compile(r"\b(?:enquir(?:y|ies)|inquir(?:y|ies))\b", re.IGNORECASE)
+# Messages that ask for a change are left alone: the model's first call is rarely a plain read
+_WRITE_INTENT = re.compile(r"\b(?:create|place|add|update|edit|change|delete|remove|cancel|confirm|submit)\b", re.IGNORECASE)
+_STATUS_WORD = re.compile(r"\b(?:pending|confirmed|shipped|delivered|cancell?ed)\b", re.IGNORECASE)
+
+
+def _schema_defaults(spec: Dict[str, Any]) -> Dict[str, Any]:
+    props = (spec.get("inputSchema") or {}).get("properties") or {}
+    return {name: prop["default"] for name, prop in props.items() if isinstance(prop, dict) and prop.get("default") is not None}
+
+
+def _call_key(tool: str, args: Dict[str, Any], defaults: Dict[str, Any]) -> Tuple[str, str]:
+    """Canonical form of a call: schema defaults filled in, None values dropped, keys sorted."""
+    merged = {**defaults, **(args or {})}
+    canonical = {k: v for k, v in merged.items() if v is not None}
+    return tool, json.dumps(canonical, sort_keys=True, default=str)
+
+
+def _split_name(tool_name: str) -> Tuple[str, str]:
+    if "__" in tool_name:
+        server, bare = tool_name.split("__", 1)
+        return server, bare
+    return "admin_agent", tool_name
+
+
+class PrefetchSession:
+    """Prefetched calls for a single turn."""
+
+    def __init__(self, prefetcher: "ToolPrefetcher", defaults: Dict[str, Dict[str, Any]],
+                 meta: Optional[Dict[str, Any]] = None, deadline: Optional[Deadline] = None) -> None:
+        self.prefetcher = prefetcher
+        self.defaults = defaults
+        self.meta = meta
+        self.deadline = deadline
+        self.tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.started = 0
+        self.hits = 0
+        self.failed = 0
+
+    def _key(self, tool_name: str, args: Dict[str, Any]) -> Tuple[str, str]:
+        _, bare = _split_name(tool_name)
+        return _call_key(bare, args, self.defaults.get(bare, {}))
+
+    def start(self, orchestrator: Any, tool_name: str, args: Dict[str, Any]) -> None:
+        key = self._key(tool_name, args)
+        if key in self.tasks:
+            return
+        server, bare = _split_name(tool_name)
+
+        async def call():
+            client = await orchestrator.get_client(server)
+            return await client.call_tool(bare, args, meta=self.meta,
+                                          timeout=self.deadline.remaining() if self.deadline else None)
+
+        self.tasks[key] = asyncio.create_task(call())
+        self.started += 1
+
+    async def take(self, tool_name: str, args: Dict[str, Any]) -> Optional[Any]:
+        """Result of a matching prefetch, or None (no match, or the prefetch failed)."""
+        task = self.tasks.pop(self._key(tool_name, args), None)
+        if task is None:
+            return None
+        try:
+            result = await task
+        except Exception:
+            # Count as wasted; the caller makes the call itself and reports any error normally
+            self.failed += 1
+            self.prefetcher.failed += 1
+            self.prefetcher.wasted += 1
+            return None
+        self.hits += 1
+        self.prefetcher.hits += 1
+        return result
+
+    def finish(self) -> Dict[str, int]:
+        """Cancel prefetches the model never asked for; returns this turn's counts."""
+        wasted = len(self.tasks)
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+            else:
+                # Retrieve the outcome so a failed, unused prefetch doesn't log "exception never retrieved"
+                task.cancelled() or task.exception()
+        self.tasks.clear()
+        self.prefetcher.wasted += wasted
+        return {"started": self.started, "hits": self.hits, "wasted": self.started - self.hits, "failed": self.failed}
+
+
+class ToolPrefetcher:
+    """
+    Predicts the model's first read-only tool call(s) from the user message.
+
+    PREFETCH=off disables it; PREFETCH_MAX_CALLS caps the speculative calls per turn.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("PREFETCH", "on").lower() not in ("0", "off", "false")
+        self.max_calls = int(os.getenv("PREFETCH_MAX_CALLS", 2))
+        self.started = 0
+        self.hits = 0
+        self.wasted = 0
+        self.failed = 0
+
+    def predict(self, message: str) -> List[Tuple[str, Dict[str, Any]]]:
+        if not message or _WRITE_INTENT.search(message):
+            return []
+        predictions: List[Tuple[str, Dict[str, Any]]] = []
+        order_id = _ORDER_ID.search(message)
+        if order_id:
+            predictions.append(("fetch_order_details", {"order_unique_ids_csv": order_id.group("id")}))
+        customer = _CUSTOMER.search(message)
+        if customer:
+            predictions.append(("fetch_orders", {"customer_name": customer.group("name")}))
+        if _BEST_SELLERS.search(message):
+            predictions.append(("fetch_best_sellers", {}))
+        elif _PRODUCTS.search(message):
+            predictions.append(("fetch_products", {}))
+        # Plain "recent orders" style questions; filtered ones (status, dates) get other args
+        if _ORDERS.search(message) and not order_id and not customer and not _STATUS_WORD.search(message):
+            predictions.append(("fetch_orders", {}))
+        if _ENQUIRIES.search(message):
+            predictions.append(("fetch_all_enquiries", {}))
+        return predictions[: self.max_calls]
+
+    def start(self, orchestrator: Any, message: str, tools_specs: List[Dict[str, Any]],
+              meta: Optional[Dict[str, Any]] = None, deadline: Optional[Deadline] = None) -> PrefetchSession:
+        """
+        Kick off predicted calls for this turn; always returns a session (possibly empty).
+        `meta` and `deadline` are sent with each call the same way the tool loop sends them.
+        """
+        specs = {s["bare_name"]: s for s in tools_specs if s.get("bare_name") in READ_ONLY_TOOLS}
+        session = PrefetchSession(self, {name: _schema_defaults(spec) for name, spec in specs.items()}, meta, deadline)
+        if not self.enabled:
+            return session
+        for tool, args in self.predict(message):
+            spec = specs.get(tool)
+            if spec is None:
+                continue
+            session.start(orchestrator, spec["name"], args)
+        self.started += session.started
+        return session
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "failed": self.failed,
+            "hit_rate": round(self.hits / self.started, 3) if self.started else None,
+            "waste_rate": round(self.wasted / self.started, 3) if self.started else None,
+        }
@@ -0,0 +1,150 @@
+"""
+Per-conversation cache of provider-native transcripts (OpenAI `messages` / Gemini `contents`)
+
+Messages are converted once, when they are persisted, instead of on every turn. history()
+keeps the decoded messages together with the store's version of the conversation and asks
+the store only for entries written after it (usually none, or another worker's few), so a
+turn reads O(new messages) rather than the whole list. A full read happens on first use or
+when the store can't supply a clean delta (history rewritten or trimmed past the cursor,
+Redis outage). A transcript requested for some other history is rebuilt from it unless it
+matches the cached one (same length, same last message).
+"""
+import os
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from redis_client import MAX_HISTORY_MESSAGES, decode_message, encode_message
+
+# Converts one stored message to the provider's format, or None to leave it out
+Converter = Callable[[dict], Optional[Any]]
+
+
+def _fingerprint(msg: dict) -> str:
+    return json.dumps(msg, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class _Transcript:
+    def __init__(self) -> None:
+        self.messages: List[dict] = []
+        self.last: Optional[str] = None
+        # Store version the messages correspond to (None: unknown, read everything next time)
+        # and the newest stored entry, which anchors the next delta read
+        self.version: Optional[int] = None
+        self.last_entry: Optional[bytes] = None
+        # provider -> one converted item (or None) per stored message, built on first use
+        self.items: Dict[str, List[Optional[Any]]] = {}
+
+    @property
+    def count(self) -> int:
+        return len(self.messages)
+
+
+class TranscriptCache:
+    def __init__(self, converters: Dict[str, Converter], max_conversations: Optional[int] = None,
+                 max_messages: int = MAX_HISTORY_MESSAGES) -> None:
+        self.converters = converters
+        self.max_conversations = max_conversations or int(os.getenv("TRANSCRIPT_CACHE_CONVERSATIONS", 256))
+        self.max_messages = max_messages
+        self._entries: "OrderedDict[str, _Transcript]" = OrderedDict()
+        self.hits = 0
+        self.rebuilds = 0
+        self.delta_reads = 0
+        self.full_reads = 0
+
+    def _entry(self, conversation_id: Optional[str], create: bool = False) -> Optional[_Transcript]:
+        key = conversation_id or ""
+        entry = self._entries.get(key)
+        if entry is None and create:
+            entry = self._entries[key] = _Transcript()
+            while len(self._entries) > self.max_conversations:
+                self._entries.popitem(last=False)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _reset(self, entry: _Transcript, messages: List[dict], version: Optional[int],
+               last_entry: Optional[bytes]) -> None:
+        entry.messages = list(messages[-self.max_messages:])
+        entry.last = _fingerprint(messages[-1]) if messages else None
+        entry.version = version
+        entry.last_entry = last_entry
+        entry.items = {}
+
+    def _add(self, entry: _Transcript, raw: bytes) -> None:
+        # The stored form, so it compares equal to what the next read returns
+        stored = decode_message(raw)
+        entry.messages.append(stored)
+        if len(entry.messages) > self.max_messages:
+            del entry.messages[: len(entry.messages) - self.max_messages]
+        entry.last = _fingerprint(stored)
+        entry.last_entry = raw
+        for provider, items in entry.items.items():
+            items.append(self.converters[provider](stored))
+            if len(items) > self.max_messages:
+                del items[: len(items) - self.max_messages]
+
+    def history(self, conversation_id: Optional[str], store: Any) -> List[dict]:
+        """
+        The conversation's stored messages. `store` is a history backend with
+        get_entries_since / get_entries_versioned; only entries past the cached version are read.
+        """
+        entry = self._entry(conversation_id)
+        if entry is not None and entry.version is not None:
+            version, new = store.get_entries_since(conversation_id, entry.version, entry.last_entry)
+            if new is not None and version is not None:
+                self.delta_reads += 1
+                for raw in new:
+                    self._add(entry, raw)
+                entry.version = version
+                return list(entry.messages)
+        self.full_reads += 1
+        version, entries = store.get_entries_versioned(conversation_id)
+        entry = self._entry(conversation_id, create=True)
+        self._reset(entry, [decode_message(raw) for raw in entries], version, entries[-1] if entries else None)
+        return list(entry.messages)
+
+    def transcript(self, provider: str, conversation_id: Optional[str], history: List[dict],
+                   window: Optional[int] = None) -> List[Any]:
+        """Provider-native items for the last `window` messages of `history`."""
+        entry = self._entry(conversation_id)
+        valid = (
+            entry is not None
+            and entry.count == min(len(history), self.max_messages)
+            and (not history or entry.last == _fingerprint(history[-1]))
+        )
+        if not valid:
+            self.rebuilds += 1
+            entry = self._entry(conversation_id, create=True)
+            # Not read from the store, so there's no version to continue from
+            self._reset(entry, history, None, None)
+        else:
+            self.hits += 1
+        items = entry.items.get(provider)
+        if items is None:
+            convert = self.converters[provider]
+            items = entry.items[provider] = [convert(m) for m in entry.messages]
+        selected = items[-window:] if window else items
+        return [item for item in selected if item is not None]
+
+    def append(self, conversation_id: Optional[str], msg: dict, version: Optional[int] = None) -> None:
+        """Record a message just persisted to the conversation's history; `version` is the store's after that write."""
+        entry = self._entry(conversation_id)
+        if entry is None:
+            # Nothing cached yet; the next turn reads the history from the store
+            return
+        self._add(entry, encode_message(msg))
+        # Still in step with the store only if no other writer got in between
+        if version is None or entry.version is None or version != entry.version + 1:
+            entry.version = None
+        else:
+            entry.version = version
+
+    def stats(self) -> Dict[str, int]:
+        return {"conversations": len(self._entries), "hits": self.hits, "rebuilds": self.rebuilds,
+                "delta_reads": self.delta_reads, "full_reads": self.full_reads}
+
+    def invalidate(self, conversation_id: Optional[str] = None) -> None:
+        if conversation_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(conversation_id or "", None)
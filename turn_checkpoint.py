@@ -0,0 +1,196 @@
+"""
+Checkpoints of the agent's tool loop, keyed by request id, so a retried turn resumes
+
+After every LLM response the loop stores its transcript (OpenAI `messages` / Gemini `contents`),
+the number of LLM calls made and the tool calls the response asked for. Each tool result is
+then written on its own to a hash next to it, and a finished batch only adds the messages it
+appended, so a turn writes its transcript once per LLM response rather than once per tool. A turn re-run with the same request id (a client retry, or a queued turn
+redelivered after its worker died) continues from there: completed tool calls are not repeated
+and earlier LLM calls are not paid for again. A finished turn keeps its answer, so a retry after
+completion just returns it.
+"""
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional
+from circuit_breaker import CircuitBreaker
+from redis_client import RedisClient
+
+TURN_CHECKPOINTS = os.getenv("TURN_CHECKPOINTS", "on").lower() not in ("0", "off", "false", "no")
+TURN_CHECKPOINT_TTL_SECONDS = int(os.getenv("TURN_CHECKPOINT_TTL_SECONDS", 3600))
+KEY_PREFIX = "turn:checkpoint:"
+
+
+class TurnCheckpoint:
+    """Tool-loop state of one request (saves are no-ops without a store or request id)."""
+
+    def __init__(self, store: Optional["CheckpointStore"], request_id: Optional[str], provider: str, message: str,
+                 conversation_id: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> None:
+        data = data or {}
+        self.store = store if request_id else None
+        self.request_id = request_id
+        self.provider = provider
+        self.message = message
+        self.conversation_id = conversation_id
+        self.resumed = bool(data)
+        # LLM calls made so far
+        self.iteration: int = data.get("iteration", 0)
+        self.transcript: Optional[List[Any]] = data.get("transcript")
+        # Tool calls asked for by the last LLM response, and the results of those already run
+        self.pending: List[Dict[str, Any]] = data.get("pending", [])
+        self.results: Dict[str, Any] = data.get("results", {})
+        self.answer: Optional[str] = data.get("answer")
+        # Length of the transcript as last stored in full; tools_done() only stores what follows
+        self.stored_length = len(self.transcript or [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "provider": self.provider,
+            "message": self.message,
+            "conversation_id": self.conversation_id,
+            "iteration": self.iteration,
+            "transcript": self.transcript,
+            "pending": self.pending,
+            "answer": self.answer,
+            "saved_at": time.time(),
+        }
+
+    def save(self) -> None:
+        if self.store is not None:
+            self.store.save(self)
+
+    def llm_response(self, transcript: List[Any], pending: List[Dict[str, Any]]) -> None:
+        """The model asked for `pending` tool calls; `transcript` already includes its message."""
+        self.transcript = transcript
+        self.stored_length = len(transcript)
+        self.pending = pending
+        self.results = {}
+        self.save()
+
+    def result(self, call_id: str) -> Any:
+        return self.results.get(call_id)
+
+    def add_result(self, call_id: str, result: Any) -> None:
+        self.results[call_id] = result
+        if self.store is not None:
+            self.store.save_result(self, call_id, result)
+
+    def tools_done(self, transcript: List[Any]) -> None:
+        """The pending batch ran and its results were added to `transcript`."""
+        self.transcript = transcript
+        self.pending = []
+        self.results = {}
+        if self.store is not None:
+            self.store.save_tail(self, transcript[self.stored_length:])
+
+    def finish(self, answer: Optional[str]) -> None:
+        """Keep only the answer; the transcript is no longer needed."""
+        self.answer = answer
+        self.transcript = None
+        self.pending = []
+        self.results = {}
+        self.save()
+
+
+class CheckpointStore:
+    def __init__(self, client: Any = None) -> None:
+        self.enabled = TURN_CHECKPOINTS
+        self._client = client
+        # Checkpointing must never slow turns down while Redis is unreachable
+        self.breaker = CircuitBreaker("Turn checkpoints", failure_threshold=2, reset_timeout=30.0)
+        self.resumed = 0
+        self.replayed = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = RedisClient().client
+        return self._client
+
+    def _run(self, action, default=None):
+        if not self.enabled or not self.breaker.allow():
+            return default
+        try:
+            result = action(self.client)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            print(f"⚠️ Turn checkpoints unavailable: {e}")
+            return default
+        self.breaker.record_success()
+        return result
+
+    def _load(self, client, request_id: str) -> Optional[Dict[str, Any]]:
+        key = KEY_PREFIX + request_id
+        pipe = client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.hgetall(key + ":results")
+        pipe.get(key + ":tail")
+        raw, results, tail = pipe.execute()
+        if not raw:
+            return None
+        data = json.loads(raw)
+        if tail is not None:
+            # The batch finished (and was persisted); continue after its messages
+            data["transcript"] = (data.get("transcript") or []) + json.loads(tail)
+            data["pending"] = []
+        else:
+            data["results"] = {k.decode() if isinstance(k, bytes) else k: json.loads(v) for k, v in results.items()}
+        return data
+
+    def begin(self, request_id: Optional[str], provider: str, message: str,
+              conversation_id: Optional[str] = None) -> TurnCheckpoint:
+        """The request's checkpoint if an earlier attempt left one for the same message, else a fresh one."""
+        if not request_id or not self.enabled:
+            return TurnCheckpoint(None, None, provider, message, conversation_id)
+        data = self._run(lambda client: self._load(client, request_id))
+        if data and (data.get("provider") != provider or data.get("message") != message
+                     or data.get("conversation_id") != conversation_id):
+            print(f"⚠️ Checkpoint for request {request_id} is for another turn; starting over")
+            data = None
+        elif data and data.get("transcript") is None and data.get("answer") is None:
+            data = None  # the earlier attempt ended without an answer; nothing to resume
+        checkpoint = TurnCheckpoint(self, request_id, provider, message, conversation_id, data)
+        if checkpoint.answer is not None:
+            self.replayed += 1
+        elif checkpoint.resumed:
+            self.resumed += 1
+        return checkpoint
+
+    def save(self, checkpoint: TurnCheckpoint) -> None:
+        """Store the whole checkpoint; results and tail of the previous batch no longer apply."""
+        key = KEY_PREFIX + checkpoint.request_id
+        payload = json.dumps(checkpoint.to_dict(), ensure_ascii=False, default=str)
+
+        def write(client):
+            pipe = client.pipeline(transaction=True)
+            pipe.set(key, payload, ex=TURN_CHECKPOINT_TTL_SECONDS)
+            pipe.delete(key + ":results", key + ":tail")
+            pipe.execute()
+        self._run(write)
+
+    def save_result(self, checkpoint: TurnCheckpoint, call_id: str, result: Any) -> None:
+        key = KEY_PREFIX + checkpoint.request_id + ":results"
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+
+        def write(client):
+            pipe = client.pipeline(transaction=True)
+            pipe.hset(key, call_id, payload)
+            pipe.expire(key, TURN_CHECKPOINT_TTL_SECONDS)
+            pipe.execute()
+        self._run(write)
+
+    def save_tail(self, checkpoint: TurnCheckpoint, messages: List[Any]) -> None:
+        """The batch is done: keep the messages it added to the transcript, drop its results."""
+        key = KEY_PREFIX + checkpoint.request_id
+        payload = json.dumps(messages, ensure_ascii=False, default=str)
+
+        def write(client):
+            pipe = client.pipeline(transaction=True)
+            pipe.set(key + ":tail", payload, ex=TURN_CHECKPOINT_TTL_SECONDS)
+            pipe.delete(key + ":results")
+            pipe.execute()
+        self._run(write)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "resumed": self.resumed, "replayed": self.replayed, **self.breaker.stats()}
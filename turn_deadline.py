@@ -0,0 +1,56 @@
+"""
+Wall-clock deadline of one agent turn, handed down to every call the turn makes
+
+Each entry point starts a Deadline from its own budget (CHAT_DEADLINE_SECONDS for POST /chat,
+CHAT_STREAM_DEADLINE_SECONDS, SOCKET_DEADLINE_SECONDS; all default to TURN_DEADLINE_SECONDS).
+LLM calls and MCP tool calls are given the remaining time as their timeout, and the deadline
+travels to the MCP server in the tool call's _meta so backend HTTP calls, retries and backoff
+stop there too. Once less than TURN_DEADLINE_RESERVE_SECONDS is left, the tool loop runs no
+more tools and asks the model for a best-effort answer from what it already has.
+
+The deadline is an epoch timestamp (not monotonic) so it means the same thing in a queue worker
+or the MCP server process.
+"""
+import os
+import time
+from typing import Optional
+from admission import TURN_DEADLINE_SECONDS
+
+ENDPOINT_DEADLINE_SECONDS = {
+    "chat": float(os.getenv("CHAT_DEADLINE_SECONDS", TURN_DEADLINE_SECONDS)),
+    "chat_stream": float(os.getenv("CHAT_STREAM_DEADLINE_SECONDS", TURN_DEADLINE_SECONDS)),
+    "socket": float(os.getenv("SOCKET_DEADLINE_SECONDS", TURN_DEADLINE_SECONDS)),
+}
+# Time kept back for the final answer once the loop stops running tools
+TURN_DEADLINE_RESERVE_SECONDS = float(os.getenv("TURN_DEADLINE_RESERVE_SECONDS", 15))
+# A tool call is not started with less time than this left
+TOOL_MIN_SECONDS = float(os.getenv("TOOL_MIN_SECONDS", 1))
+
+
+class Deadline:
+    def __init__(self, at: float, budget: Optional[float] = None) -> None:
+        self.at = at
+        self.budget = budget if budget is not None else max(0.0, at - time.time())
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.time() + seconds, seconds)
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str) -> "Deadline":
+        return cls.after(ENDPOINT_DEADLINE_SECONDS.get(endpoint, TURN_DEADLINE_SECONDS))
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.time())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def running_low(self) -> bool:
+        """Too little time left for another round of tools; answer with what there is."""
+        # Short budgets keep at most a third of themselves back
+        return self.remaining() < min(TURN_DEADLINE_RESERVE_SECONDS, self.budget / 3)
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.remaining():.1f}s of {self.budget:.0f}s left)"
@@ -0,0 +1,161 @@
+"""
+Redis Streams work queue for agent turns - decouples the socket/HTTP tier from the agent tier
+
+Web tier: enqueue() a turn, then relay its events() (status/chunk/complete/error) to the client.
+Status and tool events arrive while the turn runs; chunk events carry the final answer and are
+published when the turn has finished.
+Agent tier (agent_worker.py): consume turns through a consumer group, run the assistant and
+publish events back. Delivery is at-least-once; entries left pending by a dead worker are
+reclaimed with XAUTOCLAIM after TURN_CLAIM_IDLE_MS.
+"""
+import os
+import json
+import uuid
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+TURNS_STREAM = "agent:turns"
+TURNS_GROUP = "agent-workers"
+EVENTS_STREAM_PREFIX = "agent:turn-events:"
+DONE_KEY_PREFIX = "agent:turn-done:"
+
+# Event streams only need to outlive the relay reading them
+EVENTS_TTL_SECONDS = int(os.getenv("TURN_EVENTS_TTL_SECONDS", 3600))
+TERMINAL_EVENTS = ("complete", "error")
+
+
+def queue_enabled() -> bool:
+    """TURN_EXECUTION=queue hands turns to agent_worker.py instead of running them in-process."""
+    return os.getenv("TURN_EXECUTION", "inline").lower() == "queue"
+
+
+def queue_redis_url() -> str:
+    return os.getenv("TURN_QUEUE_REDIS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0"
+
+
+def _decode(fields: Dict[Any, Any]) -> Dict[str, str]:
+    return {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+
+
+class QueuedTurnError(Exception):
+    def __init__(self, message: str, code: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class TurnQueue:
+    def __init__(self, redis_url: Optional[str] = None) -> None:
+        import redis.asyncio as aioredis
+        self.redis = aioredis.from_url(redis_url or queue_redis_url())
+        self.max_len = int(os.getenv("TURN_QUEUE_MAXLEN", 10000))
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+    # ---- Web tier ----
+
+    async def enqueue(self, payload: Dict[str, Any], turn_id: Optional[str] = None) -> str:
+        turn_id = turn_id or uuid.uuid4().hex
+        await self.redis.xadd(
+            TURNS_STREAM,
+            {"turn_id": turn_id, "payload": json.dumps(payload)},
+            maxlen=self.max_len,
+            approximate=True,
+        )
+        return turn_id
+
+    async def run(self, payload: Dict[str, Any], turn_id: Optional[str] = None,
+                  on_event: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None) -> Optional[str]:
+        """
+        Enqueue a turn and wait for its outcome, passing non-terminal events to `on_event`.
+        Returns the full response (None if the agent produced none); a worker-side timeout
+        raises asyncio.TimeoutError and other worker errors raise QueuedTurnError.
+        """
+        turn_id = await self.enqueue(payload, turn_id)
+        async for event in self.events(turn_id):
+            event_type = event.get("type")
+            if event_type == "complete":
+                return event.get("fullResponse")
+            if event_type == "error":
+                if event.get("code") == "timeout":
+                    raise asyncio.TimeoutError()
+                if event.get("code") == "empty":
+                    return None
+                raise QueuedTurnError(event.get("message") or "Queued turn failed", event.get("code"))
+            if on_event is not None:
+                await on_event(event)
+        return None
+
+    async def events(self, turn_id: str, block_ms: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a turn's events in order until a terminal (complete/error) event."""
+        stream = EVENTS_STREAM_PREFIX + turn_id
+        last_id = "0-0"
+        while True:
+            response = await self.redis.xread({stream: last_id}, block=block_ms, count=100)
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    event = json.loads(_decode(fields)["event"])
+                    yield event
+                    if event.get("type") in TERMINAL_EVENTS:
+                        return
+
+    # ---- Agent tier ----
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(TURNS_STREAM, TURNS_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, consumer: str, count: int = 1, block_ms: int = 5000) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Claim new turns for `consumer`. Returns [(entry_id, turn_id, payload)]."""
+        response = await self.redis.xreadgroup(TURNS_GROUP, consumer, {TURNS_STREAM: ">"}, count=count, block=block_ms)
+        return [self._parse(entry_id, fields) for _, entries in response or [] for entry_id, fields in entries]
+
+    async def reclaim(self, consumer: str, min_idle_ms: int, count: int = 10) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Take over turns left pending by consumers that died mid-turn."""
+        result = await self.redis.xautoclaim(TURNS_STREAM, TURNS_GROUP, consumer, min_idle_time=min_idle_ms, start_id="0-0", count=count)
+        entries = result[1] if result else []
+        return [self._parse(entry_id, fields) for entry_id, fields in entries if fields]
+
+    def _parse(self, entry_id: Any, fields: Dict[Any, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        data = _decode(fields)
+        entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+        return entry_id, data["turn_id"], json.loads(data["payload"])
+
+    async def ack(self, entry_id: str) -> None:
+        # Delete as well: entries carry user tokens and shouldn't linger once handled
+        await self.redis.xack(TURNS_STREAM, TURNS_GROUP, entry_id)
+        await self.redis.xdel(TURNS_STREAM, entry_id)
+
+    async def mark_done(self, turn_id: str) -> bool:
+        """Record completion; False if another delivery of this turn already completed it."""
+        return bool(await self.redis.set(DONE_KEY_PREFIX + turn_id, "1", nx=True, ex=EVENTS_TTL_SECONDS))
+
+    async def is_done(self, turn_id: str) -> bool:
+        return bool(await self.redis.exists(DONE_KEY_PREFIX + turn_id))
+
+    async def publish(self, turn_id: str, event_type: str, **data: Any) -> None:
+        stream = EVENTS_STREAM_PREFIX + turn_id
+        await self.redis.xadd(stream, {"event": json.dumps({"type": event_type, **data})})
+        await self.redis.expire(stream, EVENTS_TTL_SECONDS)
+
+
+def split_chunks(text: str, max_chars: int = 80) -> List[str]:
+    """Split an answer into word-aligned chunks of at most ~max_chars for streaming."""
+    chunks: List[str] = []
+    current = ""
+    for word in text.split(" "):
+        piece = word + " "
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
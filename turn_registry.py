@@ -0,0 +1,125 @@
+"""
+Registry of in-flight chat turns, one task per conversation, with cross-worker cancellation
+"""
+import os
+import json
+import uuid
+import asyncio
+from typing import Awaitable, Dict, Optional, Set
+
+CANCEL_CHANNEL = "agent:turn-cancel"
+
+
+class TurnRegistry:
+    """
+    Tracks the running turn task for each conversation key.
+
+    Starting a turn cancels the previous one for the same key. When a Redis URL is
+    configured, the cancel is also published so a turn running on another worker
+    (or node) for the same conversation stops as well.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None) -> None:
+        self.redis_url = redis_url
+        self.worker_id = uuid.uuid4().hex
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._turn_ids: Dict[str, Optional[str]] = {}
+        self._sid_turns: Dict[str, Set[str]] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start_listener(self) -> None:
+        if not self.redis_url or self._listener is not None:
+            return
+        import redis.asyncio as aioredis
+        self._redis = aioredis.from_url(self.redis_url)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("worker") != self.worker_id:
+                        self._on_remote_cancel(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Turn cancel listener error: {e}; resubscribing")
+                await asyncio.sleep(1)
+
+    def _on_remote_cancel(self, payload: dict) -> None:
+        key = payload.get("key", "")
+        local_turn = self._turn_ids.get(key)
+        if "keep" in payload:
+            # Supersede: cancel whatever runs for this key unless it *is* the newer turn
+            if local_turn is None or local_turn != payload["keep"]:
+                self._cancel_local(key, "superseded on another worker")
+        elif payload.get("turn") is not None and payload.get("turn") == local_turn:
+            self._cancel_local(key, "cancelled on another worker")
+
+    def _cancel_local(self, key: str, reason: str) -> None:
+        task = self._tasks.get(key)
+        if task and not task.done():
+            print(f"🛑 Cancelling in-flight turn for {key} ({reason})")
+            task.cancel()
+
+    def _forget(self, sid: str, key: str, task: asyncio.Task) -> None:
+        # Only drop the entry if it still points at this task (a newer turn may have replaced it)
+        if self._tasks.get(key) is task:
+            self._tasks.pop(key, None)
+            self._turn_ids.pop(key, None)
+            keys = self._sid_turns.get(sid)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    self._sid_turns.pop(sid, None)
+
+    async def _publish(self, payload: dict) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(CANCEL_CHANNEL, json.dumps({**payload, "worker": self.worker_id}))
+        except Exception as e:
+            print(f"⚠️ Could not publish turn cancel for {payload.get('key')}: {e}")
+
+    async def start(self, sid: str, key: str, coro: Awaitable, turn_id: Optional[str] = None) -> asyncio.Task:
+        """Run `coro` as the current turn for `key`, superseding any earlier turn."""
+        self._cancel_local(key, "superseded")
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+        self._turn_ids[key] = turn_id
+        self._sid_turns.setdefault(sid, set()).add(key)
+        task.add_done_callback(lambda t: self._forget(sid, key, t))
+        await self._publish({"key": key, "keep": turn_id})
+        return task
+
+    async def cancel_remote(self, key: str, turn_id: str) -> None:
+        """Ask whichever worker runs `turn_id` for `key` to stop it (e.g. its listener went away)."""
+        await self._publish({"key": key, "turn": turn_id})
+
+    def cancel_sid(self, sid: str, reason: str = "disconnect") -> None:
+        for key in list(self._sid_turns.pop(sid, set())):
+            self._cancel_local(key, reason)
+
+    def active(self) -> int:
+        return sum(1 for t in self._tasks.values() if not t.done())
+
+
+def socketio_redis_url() -> Optional[str]:
+    """Redis URL for the Socket.IO client manager, or None for single-process mode."""
+    if os.getenv("SOCKETIO_MANAGER", "memory").lower() != "redis":
+        return None
+    return os.getenv("SOCKETIO_REDIS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0"
@@ -0,0 +1,275 @@
+"""
+LLM usage and cost accounting - per call, aggregated per turn, conversation and user in Redis
+
+Every LLM call records prompt / cached / completion tokens, model and latency on the turn's
+TurnUsage. When the turn ends it is priced and added to hourly Redis buckets per user and
+globally (summed into rolling windows on read), to the conversation's totals, and to the
+conversation's list of recent turns. Optional per-user budgets over USAGE_BUDGET_WINDOW_HOURS
+either downgrade the turn to the lite model tier or reject it (BUDGET_ACTION).
+"""
+import os
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from circuit_breaker import CircuitBreaker
+from redis_client import RedisClient
+
+USAGE_TRACKING = os.getenv("USAGE_TRACKING", "on").lower() not in ("0", "off", "false", "no")
+USAGE_RETENTION_HOURS = int(os.getenv("USAGE_RETENTION_HOURS", 8 * 24))
+# Recent turn records kept per conversation
+USAGE_TURNS_PER_CONVERSATION = int(os.getenv("USAGE_TURNS_PER_CONVERSATION", 50))
+USAGE_BUDGET_WINDOW_HOURS = int(os.getenv("USAGE_BUDGET_WINDOW_HOURS", 24))
+# 0 disables the corresponding budget
+USER_TOKEN_BUDGET = int(os.getenv("USER_TOKEN_BUDGET", 0))
+USER_COST_BUDGET_USD = float(os.getenv("USER_COST_BUDGET_USD", 0))
+BUDGET_ACTION = os.getenv("BUDGET_ACTION", "downgrade").lower()  # downgrade | reject
+
+# USD per 1M tokens: (input, cached input, output). Override/extend with
+# LLM_PRICES="gpt-4o=2.5/1.25/10,gemini-2.5-flash=0.3/0.075/2.5"
+PRICES: Dict[str, tuple] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gemini-2.5-pro": (1.25, 0.31, 10.00),
+    "gemini-2.5-flash": (0.30, 0.075, 2.50),
+    "gemini-flash-latest": (0.30, 0.075, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.025, 0.40),
+    "gemini-2.0-flash": (0.10, 0.025, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.075, 0.30),
+}
+for _item in (os.getenv("LLM_PRICES") or "").split(","):
+    _model, _, _value = _item.partition("=")
+    try:
+        PRICES[_model.strip()] = tuple(float(p) for p in _value.split("/"))[:3]
+    except ValueError:
+        continue
+
+COUNTERS = ("turns", "calls", "prompt_tokens", "cached_tokens", "completion_tokens", "latency_ms")
+
+
+class BudgetExceeded(Exception):
+    """Raised for a turn whose user is over budget when BUDGET_ACTION=reject."""
+
+    def __init__(self, user_id: Any, usage: Dict[str, Any]) -> None:
+        super().__init__("You have reached your assistant usage limit for now. Please try again later.")
+        self.user_id = user_id
+        self.usage = usage
+
+
+def call_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    # Unknown models are counted at zero cost (tokens are still tracked)
+    input_price, cached_price, output_price = (tuple(PRICES.get(model) or ()) + (0.0, 0.0, 0.0))[:3]
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+def call_usage(provider: str, model: str, response: Any, latency_ms: float) -> Dict[str, Any]:
+    """Token usage of one OpenAI completion or Gemini result (zeros where the provider reports none)."""
+    prompt = cached = completion = 0
+    usage = getattr(response, "usage", None)
+    metadata = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None:
+            cached = getattr(details, "cached_tokens", 0) or 0
+    elif metadata is not None:
+        prompt = getattr(metadata, "prompt_token_count", 0) or 0
+        cached = getattr(metadata, "cached_content_token_count", 0) or 0
+        # Thinking tokens are billed as output
+        completion = (getattr(metadata, "candidates_token_count", 0) or 0) + (getattr(metadata, "thoughts_token_count", 0) or 0)
+    return {
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": int(prompt),
+        "cached_tokens": int(cached),
+        "completion_tokens": int(completion),
+        "latency_ms": round(latency_ms, 1),
+        "cost_usd": call_cost(model, prompt, cached, completion),
+    }
+
+
+class TurnUsage:
+    """LLM calls and tool names of one chat turn."""
+
+    def __init__(self, user_id: Any = None, conversation_id: Optional[str] = None) -> None:
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.started = time.time()
+        self.calls: List[Dict[str, Any]] = []
+        self.tools: List[str] = []
+        self.downgraded = False
+        # Speculative tool calls of the turn (started / hits / wasted / failed), if any ran
+        self.prefetch: Optional[Dict[str, int]] = None
+
+    def add_call(self, call: Dict[str, Any]) -> None:
+        self.calls.append(call)
+
+    def totals(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {name: 0 for name in COUNTERS}
+        totals["turns"] = 1
+        totals["calls"] = len(self.calls)
+        totals["cost_usd"] = 0.0
+        for call in self.calls:
+            for name in ("prompt_tokens", "cached_tokens", "completion_tokens", "latency_ms", "cost_usd"):
+                totals[name] += call[name]
+        totals["latency_ms"] = round(totals["latency_ms"])
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "userId": self.user_id,
+            "conversationId": self.conversation_id,
+            "at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            **self.totals(),
+            "downgraded": self.downgraded,
+            "tools": self.tools,
+            "prefetch": self.prefetch,
+            "llm_calls": self.calls,
+        }
+
+
+def _hour(at: datetime) -> str:
+    return at.strftime("%Y%m%d%H")
+
+
+def _sum_buckets(buckets: List[Dict[bytes, bytes]]) -> Dict[str, Any]:
+    totals: Dict[str, Any] = {name: 0 for name in COUNTERS}
+    totals["cost_usd"] = 0.0
+    models: Dict[str, Dict[str, float]] = {}
+    for bucket in buckets:
+        for raw_field, raw_value in (bucket or {}).items():
+            field = raw_field.decode() if isinstance(raw_field, bytes) else raw_field
+            value = float(raw_value)
+            if field.startswith("model:"):
+                # model:<name>:<counter>
+                model, counter = field[len("model:"):].rsplit(":", 1)
+                models.setdefault(model, {})
+                models[model][counter] = models[model].get(counter, 0) + value
+            elif field == "cost_usd":
+                totals["cost_usd"] += value
+            elif field in totals:
+                totals[field] += int(value)
+    totals["cost_usd"] = round(totals["cost_usd"], 6)
+    totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+    totals["models"] = models
+    return totals
+
+
+class UsageTracker:
+    def __init__(self, client: Any = None) -> None:
+        self.enabled = USAGE_TRACKING
+        self._client = client
+        # Accounting must never slow turns down while Redis is unreachable
+        self.breaker = CircuitBreaker("Usage accounting", failure_threshold=2, reset_timeout=30.0)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = RedisClient().client
+        return self._client
+
+    def _run(self, action, default=None):
+        if not self.enabled or not self.breaker.allow():
+            return default
+        try:
+            result = action(self.client)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            print(f"⚠️ Usage accounting unavailable: {e}")
+            return default
+        self.breaker.record_success()
+        return result
+
+    def record_turn(self, turn: TurnUsage) -> Dict[str, Any]:
+        """Log the turn's usage and add it to the user, global and conversation aggregates."""
+        record = turn.to_dict()
+        print(f"💰 Turn usage: {json.dumps({k: v for k, v in record.items() if k != 'llm_calls'}, ensure_ascii=False)}")
+        if not turn.calls:
+            return record
+        totals = turn.totals()
+        hour = _hour(datetime.now(timezone.utc))
+        retention = USAGE_RETENTION_HOURS * 3600
+
+        def write(client):
+            pipe = client.pipeline(transaction=False)
+            keys = [f"usage:all:{hour}"]
+            if turn.user_id is not None:
+                keys.append(f"usage:user:{turn.user_id}:{hour}")
+            if turn.conversation_id:
+                keys.append(f"usage:conv:{turn.conversation_id}")
+            for key in keys:
+                for name in COUNTERS:
+                    if totals[name]:
+                        pipe.hincrby(key, name, totals[name])
+                pipe.hincrbyfloat(key, "cost_usd", totals["cost_usd"])
+                for call in turn.calls:
+                    pipe.hincrby(key, f"model:{call['model']}:tokens", call["prompt_tokens"] + call["completion_tokens"])
+                    pipe.hincrbyfloat(key, f"model:{call['model']}:cost_usd", call["cost_usd"])
+                pipe.expire(key, retention)
+            if turn.conversation_id:
+                conv_key = f"usage:conv:{turn.conversation_id}"
+                if turn.user_id is not None:
+                    pipe.hset(conv_key, "user", str(turn.user_id))
+                turns_key = f"usage:turns:{turn.conversation_id}"
+                pipe.rpush(turns_key, json.dumps(record, ensure_ascii=False))
+                pipe.ltrim(turns_key, -USAGE_TURNS_PER_CONVERSATION, -1)
+                pipe.expire(turns_key, retention)
+            pipe.execute()
+
+        self._run(write)
+        return record
+
+    def _window(self, prefix: str, hours: int) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        hours = max(1, min(hours, USAGE_RETENTION_HOURS))
+
+        def read(client):
+            pipe = client.pipeline(transaction=False)
+            for offset in range(hours):
+                pipe.hgetall(f"{prefix}:{_hour(now - timedelta(hours=offset))}")
+            return pipe.execute()
+
+        totals = _sum_buckets(self._run(read, default=[]))
+        totals["window_hours"] = hours
+        return totals
+
+    def user_window(self, user_id: Any, hours: int = USAGE_BUDGET_WINDOW_HOURS) -> Dict[str, Any]:
+        return self._window(f"usage:user:{user_id}", hours)
+
+    def global_window(self, hours: int = 24) -> Dict[str, Any]:
+        return self._window("usage:all", hours)
+
+    def conversation(self, conversation_id: str, recent_turns: int = 10) -> Dict[str, Any]:
+        def read(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.hgetall(f"usage:conv:{conversation_id}")
+            pipe.lrange(f"usage:turns:{conversation_id}", -recent_turns, -1)
+            return pipe.execute()
+
+        bucket, turns = self._run(read, default=[{}, []])
+        owner = (bucket or {}).pop(b"user", None) or (bucket or {}).pop("user", None)
+        totals = _sum_buckets([bucket])
+        totals["conversationId"] = conversation_id
+        totals["userId"] = owner.decode() if isinstance(owner, bytes) else owner
+        totals["recent_turns"] = [json.loads(t) for t in turns or []]
+        return totals
+
+    def check_budget(self, user_id: Any) -> Optional[str]:
+        """None if the user is within budget, "downgrade" if over it; raises BudgetExceeded when BUDGET_ACTION=reject."""
+        if user_id is None or not (USER_TOKEN_BUDGET or USER_COST_BUDGET_USD):
+            return None
+        usage = self.user_window(user_id)
+        over_tokens = USER_TOKEN_BUDGET and usage["total_tokens"] >= USER_TOKEN_BUDGET
+        over_cost = USER_COST_BUDGET_USD and usage["cost_usd"] >= USER_COST_BUDGET_USD
+        if not (over_tokens or over_cost):
+            return None
+        print(f"💸 User {user_id} over budget ({usage['total_tokens']} tokens, ${usage['cost_usd']:.4f} "
+              f"in {usage['window_hours']}h): {BUDGET_ACTION}")
+        if BUDGET_ACTION == "reject":
+            raise BudgetExceeded(user_id, usage)
+        return "downgrade"
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, **self.breaker.stats()}